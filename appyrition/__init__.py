@@ -12,8 +12,33 @@ Please refer to the documentation provided in the README.md, which can be found
 at the Assimilate Dev Github page: https://github.com/assimilate-dev/appyrition
 """
 
-from .appyrition import Ghost
 import logging
 from logging import NullHandler
+from importlib import import_module
 
 logging.getLogger(__name__).addHandler(NullHandler())
+
+# the clients are imported on first access so that `import appyrition` does
+# not pay for requests, aiohttp and their dependencies up front
+_lazy = {
+  "Ghost": ".appyrition",
+  "AsyncGhost": ".aio"
+}
+
+__all__ = list(_lazy)
+
+
+def __getattr__(name):
+  if name not in _lazy:
+    raise AttributeError(
+      "module {!r} has no attribute {!r}".format(__name__, name)
+    )
+
+  value = getattr(import_module(_lazy[name], __name__), name)
+  globals()[name] = value
+
+  return value
+
+
+def __dir__():
+  return sorted(set(globals()) | set(_lazy))
@@ -0,0 +1,1231 @@
+# aio.py
+
+import json
+import time
+import asyncio
+import logging
+
+try:
+  import aiohttp
+except ImportError:
+  aiohttp = None
+
+from .error import GhostException, AppyException
+from .auth import (
+  generate_base_url,
+  generate_session_headers,
+  TokenAuth
+)
+from .helpers import url_join
+from .image import guess_mime_type
+from .image_store import ImageStore
+from .render import Renderer
+from .retry import RetryPolicy
+from .metrics import Metrics, endpoint
+from .catalog import Catalog, _RESOURCE_TYPES
+from .webhook import receive_webhooks
+from .post_and_page import (
+  _get_url,
+  _merge_update,
+  _optimistic_update,
+  _is_empty_update,
+  _fetch_params,
+  _field_digests,
+  _record,
+  _resolve,
+  _list_params,
+  _next_page
+)
+from .deploy import (
+  get_singular,
+  get_dir_structure,
+  _read_resource,
+  _find_images,
+  _replace_images,
+  _read_stats,
+  _write_back,
+  _is_unchanged,
+  _known_updated_at,
+  _known_fields,
+  _resolve_id,
+  _record_deploy,
+  _render
+)
+
+
+class AsyncTransport(object):
+
+  """
+  A connection-pooled, non-blocking HTTP transport built on aiohttp
+
+  The aiohttp session is created lazily on first use so that it is bound to
+  the running event loop. Response bodies are read before the response is
+  returned, so `status`, `headers` and `json()` remain usable afterwards.
+
+  Request hooks work as in `appyrition.transport.Transport`; `kwargs` passed
+  to before-request hooks are those of `aiohttp.ClientSession.request`.
+
+  Attributes
+  ----------
+  pool_size : int
+    Maximum number of simultaneous connections
+  keep_alive : bool
+    If false, connections are closed after every request
+  timeout : float
+    Total timeout in seconds for every request, None to wait forever
+  auth : appyrition.auth.TokenAuth
+    Optional authentication applied to every request
+  retry : appyrition.retry.RetryPolicy
+    Optional policy for retrying failed requests
+  before_request : list
+    Hooks called before every request is sent
+  after_request : list
+    Hooks called after every request has finished or failed
+  """
+
+  def __init__(
+    self,
+    pool_size=100,
+    keep_alive=True,
+    timeout=None,
+    auth=None,
+    retry=None
+  ):
+
+    """
+    Parameters
+    ----------
+    pool_size : int, optional
+      Maximum number of simultaneous connections
+    keep_alive : bool, optional
+      If false, connections are closed after every request
+    timeout : float, optional
+      Total timeout in seconds for every request
+    auth : appyrition.auth.TokenAuth, optional
+      Authentication applied to every request
+    retry : appyrition.retry.RetryPolicy, optional
+      Policy for retrying failed requests, None to never retry
+    """
+
+    if aiohttp is None:
+      raise AppyException(
+        "AsyncGhost requires aiohttp: pip install appyrition[async]"
+      )
+
+    self.pool_size = pool_size
+    self.keep_alive = keep_alive
+    self.timeout = timeout
+    self.auth = auth
+    self.retry = retry
+    self.before_request = []
+    self.after_request = []
+    self._session = None
+
+
+  def _get_session(self):
+    if self._session is None or self._session.closed:
+      connector = aiohttp.TCPConnector(
+        limit = self.pool_size,
+        force_close = not self.keep_alive
+      )
+      self._session = aiohttp.ClientSession(
+        connector = connector,
+        timeout = aiohttp.ClientTimeout(total = self.timeout),
+        cookie_jar = aiohttp.CookieJar(unsafe = True)
+      )
+      logging.debug("Created async transport with pool size %s", self.pool_size)
+
+    return self._session
+
+
+  @property
+  def cookies(self):
+    return self._get_session().cookie_jar
+
+
+  async def _send(self, method, url, attempt, data, kwargs):
+    session = self._get_session()
+
+    if callable(data):
+      data = data()
+    if data is not None:
+      kwargs = dict(kwargs, data = data)
+
+    if self.auth is not None:
+      headers = dict(kwargs.get("headers") or {})
+      headers["Authorization"] = self.auth.header()
+      kwargs = dict(kwargs, headers = headers)
+
+    for hook in self.before_request:
+      hook(method, url, kwargs)
+
+    response = None
+    error = None
+    body = b""
+    start = time.perf_counter()
+
+    try:
+      async with session.request(method, url, **kwargs) as response:
+        body = await response.read()
+
+      return response
+    except Exception as e:
+      error = e
+      raise
+    finally:
+      if self.after_request:
+        event = {
+          "method": method,
+          "url": url,
+          "endpoint": endpoint(method, url),
+          "attempt": attempt,
+          "status": response.status if response is not None else None,
+          "elapsed": time.perf_counter() - start,
+          "bytes_sent": 0,
+          "bytes_received": len(body or b""),
+          "response": response,
+          "error": error
+        }
+
+        if response is not None:
+          event["bytes_sent"] = int(
+            response.request_info.headers.get("Content-Length", 0)
+          )
+
+        for hook in self.after_request:
+          hook(event)
+
+
+  async def request(self, method, url, idempotent=None, data=None, **kwargs):
+
+    """
+    Send a request through the pooled session and read the response body,
+    retrying it according to the retry policy.
+
+    Parameters
+    ----------
+    method : str
+      HTTP method
+    url : str
+      Request URL
+    idempotent : bool, optional
+      Whether the request may be repeated safely, None to decide by method
+    data : optional
+      Request body, or a callable returning a fresh body for every attempt
+      when the body cannot be sent twice
+    **kwargs
+      Passed through to `aiohttp.ClientSession.request`
+    """
+
+    if self.retry is None:
+      return await self._send(method, url, 0, data, kwargs)
+
+    attempt = 0
+    while True:
+      try:
+        response = await self._send(method, url, attempt, data, kwargs)
+      except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+        sent = not isinstance(e, aiohttp.ClientConnectorError)
+        if (
+          attempt >= self.retry.max_retries or
+          not self.retry.is_retryable(method, idempotent, sent = sent)
+        ):
+          raise
+        wait = self.retry.backoff(attempt)
+        reason = repr(e)
+      else:
+        if (
+          attempt >= self.retry.max_retries or
+          not self.retry.is_retryable(method, idempotent, response.status)
+        ):
+          return response
+        wait = self.retry.backoff(attempt, response.headers)
+        reason = response.status
+
+      logging.info(
+        "{method} {url} failed ({reason}); retrying in {wait:.2f}s".format(
+          method = method,
+          url = url,
+          reason = reason,
+          wait = wait
+        )
+      )
+      await asyncio.sleep(wait)
+
+      attempt += 1
+
+
+  async def get(self, url, **kwargs):
+    return await self.request("GET", url, **kwargs)
+
+
+  async def post(self, url, **kwargs):
+    return await self.request("POST", url, **kwargs)
+
+
+  async def put(self, url, **kwargs):
+    return await self.request("PUT", url, **kwargs)
+
+
+  async def delete(self, url, **kwargs):
+    return await self.request("DELETE", url, **kwargs)
+
+
+  async def close(self):
+
+    """
+    Close all pooled connections.
+    """
+
+    if self._session is not None:
+      await self._session.close()
+      self._session = None
+
+
+async def _run(function, *args):
+  # run blocking file I/O, hashing or rendering on the default executor so
+  # that the event loop keeps serving every other coroutine meanwhile
+  return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+
+async def _json(response):
+  return await response.json(content_type = None)
+
+
+async def _check(response, status_code):
+  if response.status != status_code:
+    raise GhostException(
+      response.status,
+      (await _json(response)).get("errors", [])
+    )
+
+
+async def _get(resource, search_type, params, base_url, transport, resource_type):
+  url = _get_url(resource, search_type, base_url, resource_type)
+
+  response = await transport.get(url, params = params)
+  await _check(response, 200)
+
+  return await _json(response)
+
+
+async def _iter(list_params, base_url, transport, resource_type, prefetch = True):
+  # async counterpart of post_and_page._iter
+  async def fetch(page):
+    page_params = dict(list_params)
+    page_params["page"] = page
+    return await _get(None, "id", page_params, base_url, transport, resource_type)
+
+  upcoming = None
+
+  try:
+    response = await fetch(1)
+
+    while True:
+      next_page = _next_page(response)
+
+      if next_page is not None and prefetch:
+        upcoming = asyncio.ensure_future(fetch(next_page))
+
+      for resource_json in response[resource_type]:
+        yield resource_json
+
+      if next_page is None:
+        break
+
+      if upcoming is not None:
+        response = await upcoming
+        upcoming = None
+      else:
+        response = await fetch(next_page)
+
+  finally:
+    if upcoming is not None:
+      upcoming.cancel()
+
+
+async def _create(resource_json, base_url, transport, resource_type, catalog=None):
+  url = url_join(base_url, resource_type)
+  params = {"source": "html"}
+  body = {resource_type: [resource_json]}
+
+  response = await transport.post(url, params = params, json = body)
+  await _check(response, 201)
+
+  return await _run(_record, catalog, resource_type, await _json(response))
+
+
+async def _update(
+  new_resource_json,
+  resource,
+  search_type,
+  base_url,
+  transport,
+  resource_type,
+  updated_at=None,
+  diff=False,
+  baseline=None,
+  catalog=None
+):
+  # async counterpart of post_and_page._update
+  resource, search_type, updated_at = await _run(
+    _resolve,
+    catalog,
+    new_resource_json,
+    resource,
+    search_type,
+    resource_type,
+    updated_at
+  )
+  optimistic = None
+
+  if not diff or baseline is not None:
+    optimistic = _optimistic_update(
+      new_resource_json,
+      resource,
+      search_type,
+      base_url,
+      resource_type,
+      updated_at,
+      baseline if diff else None
+    )
+
+  if optimistic is not None:
+    url, body = optimistic
+
+    if _is_empty_update(body, resource_type):
+      logging.info("No fields changed on {}; skipping update".format(resource))
+      return body
+
+    response = await transport.put(url, params = {"source": "html"}, json = body)
+
+    if response.status == 200:
+      return await _run(_record, catalog, resource_type, await _json(response))
+
+    if response.status != 409:
+      await _check(response, 200)
+
+    logging.info(
+      "Update collision on {resource}; retrying with fetched {resource_type}".format(
+        resource = resource,
+        resource_type = resource_type
+      )
+    )
+    new_resource_json = dict(new_resource_json)
+    new_resource_json.pop("updated_at", None)
+
+  response = await _get(
+    resource,
+    search_type,
+    _fetch_params(new_resource_json, diff),
+    base_url,
+    transport,
+    resource_type
+  )
+
+  url, body = _merge_update(
+    new_resource_json,
+    response,
+    resource,
+    search_type,
+    base_url,
+    resource_type,
+    diff
+  )
+
+  if body is None:
+    logging.info("No fields changed on {}; skipping update".format(resource))
+    return await _run(_record, catalog, resource_type, response)
+
+  response = await transport.put(url, params = {"source": "html"}, json = body)
+  await _check(response, 200)
+
+  return await _run(_record, catalog, resource_type, await _json(response))
+
+
+async def _delete(post, base_url, transport, resource_type, catalog=None):
+  url = url_join(base_url, resource_type, post)
+
+  response = await transport.delete(url)
+
+  if catalog is not None and response.status in (204, 404):
+    await _run(catalog.remove, resource_type, post)
+
+  return response
+
+
+async def _upload_image(file, ref, base_url, transport):
+  url = url_join(base_url, "images", "upload")
+
+  mime_type = guess_mime_type(file)
+  logging.debug("Using image mime type %s", mime_type)
+
+  def form():
+    # a form and its file are closed once sent, so every attempt builds a
+    # new one
+    form = aiohttp.FormData(quote_fields = False)
+    form.add_field(
+      "file",
+      open(file, "rb"),
+      filename = file,
+      content_type = mime_type
+    )
+    form.add_field("ref", ref)
+    return form
+
+  response = await transport.post(url, data = form)
+
+  await _check(response, 201)
+
+  return response
+
+
+async def _upload_images(images, base_url, transport, workers, image_store = None):
+  # async counterpart of deploy._upload_images: the first failure cancels all
+  # other in-flight uploads
+  semaphore = asyncio.Semaphore(max(1, workers))
+
+  async def upload(image):
+    async with semaphore:
+      if image_store is not None:
+        digest, image_url = await _run(image_store.lookup, image["abs_path"])
+
+        if image_url is not None:
+          logging.info("Image unchanged, reusing: {}".format(image["image"]))
+          return image_url
+
+      response = await _upload_image(
+        image["abs_path"],
+        image["ref"],
+        base_url,
+        transport
+      )
+      logging.info("Image uploaded: {}".format(image["image"]))
+      image_url = (await _json(response)).get("images")[0].get("url")
+
+      if image_store is not None:
+        image_store.add(digest, image_url, image["ref"])
+
+      return image_url
+
+  tasks = [asyncio.ensure_future(upload(image)) for image in images]
+
+  try:
+    return await asyncio.gather(*tasks)
+  except BaseException:
+    for task in tasks:
+      task.cancel()
+    await asyncio.gather(*tasks, return_exceptions = True)
+    raise
+  finally:
+    if image_store is not None:
+      await _run(image_store.save)
+
+
+async def _deploy(
+  resource_dir,
+  resource_type,
+  base_url,
+  transport,
+  update=False,
+  image_workers=4,
+  image_store=None,
+  force=False,
+  renderer=None,
+  diff=False,
+  catalog=None
+):
+  singular = get_singular(resource_type)
+
+  logging.info(
+    "Using {resource_dir} as {singular} directory".format(
+      resource_dir = resource_dir,
+      singular = singular
+    )
+  )
+
+  # reading and hashing the directory, rendering and writing back all run
+  # on the executor
+  dir_str = await _run(get_dir_structure, resource_dir)
+
+  read = await _run(_read_stats, dir_str)
+
+  if not force and await _run(_is_unchanged, dir_str, resource_type):
+    logging.info(
+      "{} unchanged since last deploy; skipping".format(dir_str["abs_path"])
+    )
+    return None
+
+  resource, text = await _run(_read_resource, dir_str)
+
+  if update:
+    await _run(_resolve_id, resource, resource_type, catalog)
+
+  # upload images
+  images = _find_images(dir_str, resource, text, singular)
+  urls = await _upload_images(
+    images,
+    base_url,
+    transport,
+    image_workers,
+    image_store
+  )
+
+  text = _replace_images(images, urls, resource, text)
+
+  html = await _run(_render, text, renderer)
+  resource.update({"html": html})
+
+  if not update:
+    response = await _create(
+      resource,
+      base_url,
+      transport,
+      resource_type,
+      catalog
+    )
+  else:
+    updated_at = await _run(_known_updated_at, dir_str, resource)
+    known_fields = None
+    if diff:
+      known_fields = await _run(_known_fields, dir_str, resource)
+
+    response = await _update(
+      resource,
+      resource["id"],
+      "id",
+      base_url,
+      transport,
+      resource_type,
+      updated_at,
+      diff,
+      known_fields,
+      catalog
+    )
+
+  fields = await _run(_field_digests, resource)
+
+  clean = await _run(
+    _write_back,
+    dir_str,
+    resource,
+    text,
+    response,
+    resource_type,
+    read
+  )
+  await _run(_record_deploy, dir_str, resource_type, response, fields, clean)
+
+  logging.info("Post successfully created")
+
+  return response
+
+
+class AsyncGhost(object):
+
+  """
+  A class used to represent a Ghost Administrator API session on asyncio
+
+  Mirrors the methods of `appyrition.Ghost` as coroutines built on a single
+  non-blocking aiohttp session, so that many requests can be in flight from
+  one event loop. Requires the optional `aiohttp` dependency.
+
+  ```
+  async with AsyncGhost(site_url, "v3", client_id, client_secret, auth="token") as gh:
+    posts = await asyncio.gather(*[gh.get_post(p) for p in post_ids])
+  ```
+
+  Attributes
+  ----------
+  version : str
+    API version: currently only supports 'v3'
+  site_url : str
+    URL of your Ghost instance
+  base_url : str
+    Base URL for all Admin API requests to your Ghost instance
+  client_id : str
+    Admin API client ID
+  client_secret : str
+    Admin API client secret
+  auth_token : str
+    JSON web authorization token created using jwt.encode from pyjwt
+  token_auth : appyrition.auth.TokenAuth
+    Admin API key authentication minting fresh tokens on demand
+  username : str
+    Login user name to create session
+  password : str
+    Login password to create session
+  transport : appyrition.aio.AsyncTransport
+    Connection-pooled, non-blocking HTTP transport shared by every API call
+  image_store : appyrition.image_store.ImageStore
+    Manifest of uploaded images used to skip re-uploading unchanged images
+  renderer : appyrition.render.Renderer
+    Markdown renderer with reusable converters and a rendered-HTML cache
+  metrics : appyrition.metrics.Metrics
+    Registry of per-endpoint request metrics, None if disabled
+  catalog : appyrition.catalog.Catalog
+    Local mirror of the site's post and page identifiers, None if disabled
+  """
+
+  def __init__(
+    self,
+    site_url,
+    version,
+    client_id,
+    client_secret,
+    pool_size=100,
+    keep_alive=True,
+    timeout=None,
+    image_store=None,
+    auth="session",
+    renderer=None,
+    retry=True,
+    metrics=True,
+    catalog=None
+  ):
+
+    """
+    Parameters
+    ----------
+    site_url : str
+      URL of your Ghost instance
+    version : str
+      API version: currently only supports 'v3'
+    client_id : str
+      Admin API client ID
+    client_secret : str
+      Admin API client secret
+    pool_size : int, optional
+      Maximum number of simultaneous connections to the Ghost host
+    keep_alive : bool, optional
+      If false, connections are closed after every request
+    timeout : float, optional
+      Total timeout in seconds for every request
+    image_store : str or appyrition.image_store.ImageStore, optional
+      Path to a manifest file of uploaded images; deploys skip uploading any
+      image whose bytes are already in the manifest
+    auth : str, optional
+      'session' to authenticate with a user session created by `login`, or
+      'token' to authenticate every request with an Admin API key token
+    renderer : str or appyrition.render.Renderer, optional
+      Renderer used to convert Markdown to HTML, or a directory in which a
+      default `Renderer` caches rendered HTML on disk; by default rendered
+      HTML is cached in memory only
+    retry : bool or appyrition.retry.RetryPolicy, optional
+      Retry rate-limited, failed and dropped requests with capped exponential
+      backoff; True uses a default `RetryPolicy`, False never retries
+    metrics : bool or appyrition.metrics.Metrics, optional
+      Record per-endpoint request metrics, returned by `stats()`; True uses
+      a new `Metrics` registry, which may instead be shared between clients
+    catalog : str or appyrition.catalog.Catalog, optional
+      Path to a SQLite database mirroring the site's post and page
+      identifiers; updates and deploys resolve ids, slugs and `updated_at`
+      from it instead of fetching them
+    """
+
+    self.version = version
+    self.site_url = site_url
+    self.base_url = generate_base_url(site_url, version)
+
+    self.client_id = client_id
+    self.client_secret = client_secret
+
+    if auth not in ("session", "token"):
+      raise AppyException("auth must be one of 'session' or 'token'")
+
+    # the token is minted on first use
+    self.token_auth = TokenAuth(client_id, client_secret, version)
+
+    self.username = None
+    self.password = None
+
+    if retry is True:
+      retry = RetryPolicy()
+    elif retry is False:
+      retry = None
+
+    self.transport = AsyncTransport(
+      pool_size = pool_size,
+      keep_alive = keep_alive,
+      timeout = timeout,
+      auth = self.token_auth if auth == "token" else None,
+      retry = retry
+    )
+
+    if metrics is True:
+      metrics = Metrics()
+    elif metrics is False:
+      metrics = None
+    self.metrics = metrics
+
+    if metrics is not None:
+      self.transport.after_request.append(metrics.record)
+
+    if isinstance(image_store, str):
+      image_store = ImageStore(image_store, site_url)
+    self.image_store = image_store
+
+    if renderer is None or isinstance(renderer, str):
+      renderer = Renderer(cache_dir = renderer)
+    self.renderer = renderer
+
+    if isinstance(catalog, str):
+      catalog = Catalog(catalog, site_url)
+    self.catalog = catalog
+
+
+  @property
+  def auth_token(self):
+    return self.token_auth.token()
+
+
+  async def __aenter__(self):
+    return self
+
+
+  async def __aexit__(self, *exc):
+    await self.close()
+
+
+  async def close(self):
+
+    """
+    Close all pooled connections held by the transport and shut down the
+    renderer's worker processes.
+    """
+
+    await self.transport.close()
+    self.renderer.close()
+
+
+  def add_hook(self, before=None, after=None):
+
+    """
+    Register hooks called around every request the client sends.
+
+    See `Ghost.add_hook`.
+    """
+
+    if before is not None:
+      self.transport.before_request.append(before)
+    if after is not None:
+      self.transport.after_request.append(after)
+
+
+  def stats(self):
+
+    """
+    Returns per-endpoint request metrics.
+
+    See `appyrition.metrics.Metrics.stats`.
+    """
+
+    if self.metrics is None:
+      raise AppyException("Metrics are disabled for this client")
+
+    return self.metrics.stats()
+
+
+  async def login(self, username, password):
+
+    """
+    Creates a user session cookie used for all subsequent API calls.
+
+    See `Ghost.login`.
+    """
+
+    url = url_join(self.base_url, "session")
+
+    payload = {
+      "username": username,
+      "password": password
+    }
+
+    headers = generate_session_headers(
+      self.token_auth.token(),
+      self.client_secret,
+      self.version,
+      self.site_url
+    )
+
+    response = await self.transport.post(url, data = payload, headers = headers)
+    await _check(response, 201)
+
+    self.username = username
+    self.password = password
+
+    cookie = json.dumps({k: v.value for k, v in response.cookies.items()})
+    logging.debug("Using session cookies: %s", cookie)
+
+    return response
+
+
+  async def get_post(self, post=None, search_type="id", params=dict()):
+
+    """
+    Returns all posts or a filtered list of posts as JSON.
+
+    See `Ghost.get_post`.
+    """
+
+    return await _get(
+      post,
+      search_type,
+      params,
+      self.base_url,
+      self.transport,
+      resource_type = "posts"
+    )
+
+
+  def iter_posts(
+    self,
+    filter=None,
+    fields=None,
+    formats=None,
+    order=None,
+    limit=100,
+    params=dict(),
+    prefetch=True
+  ):
+
+    """
+    Asynchronously iterates over every post on the site.
+
+    With `prefetch` true the next response is fetched by a task on the event
+    loop while the current one is consumed; with `prefetch` false it is
+    only requested once the current one is exhausted. See `Ghost.iter_posts`.
+    """
+
+    list_params = _list_params(filter, fields, formats, order, limit, params)
+
+    return _iter(
+      list_params,
+      self.base_url,
+      self.transport,
+      resource_type = "posts",
+      prefetch = prefetch
+    )
+
+
+  async def create_post(self, post_json):
+
+    """
+    Create a post.
+
+    See `Ghost.create_post`.
+    """
+
+    return await _create(
+      post_json,
+      self.base_url,
+      self.transport,
+      resource_type = "posts",
+      catalog = self.catalog
+    )
+
+
+  async def update_post(
+    self,
+    new_post_json,
+    post,
+    search_type="id",
+    updated_at=None,
+    diff=False
+  ):
+
+    """
+    Update a post in place.
+
+    See `Ghost.update_post`.
+    """
+
+    return await _update(
+      new_post_json,
+      post,
+      search_type,
+      self.base_url,
+      self.transport,
+      resource_type = "posts",
+      updated_at = updated_at,
+      diff = diff,
+      catalog = self.catalog
+    )
+
+
+  async def delete_post(self, post):
+
+    """
+    Remove a post by post ID.
+
+    See `Ghost.delete_post`.
+    """
+
+    return await _delete(
+      post,
+      self.base_url,
+      self.transport,
+      resource_type = "posts",
+      catalog = self.catalog
+    )
+
+
+  async def deploy_post(
+    self,
+    post_dir=".",
+    update=False,
+    image_workers=4,
+    force=False,
+    diff=False
+  ):
+
+    """
+    Create or update a post from markdown and config files in a directory.
+
+    See `Ghost.deploy_post`.
+    """
+
+    return await _deploy(
+      post_dir,
+      "posts",
+      self.base_url,
+      self.transport,
+      update,
+      image_workers,
+      self.image_store,
+      force,
+      self.renderer,
+      diff,
+      self.catalog
+    )
+
+
+  async def get_page(self, page=None, search_type="id", params=dict()):
+
+    """
+    Returns all pages or a filtered list of pages as JSON.
+
+    See `Ghost.get_page`.
+    """
+
+    return await _get(
+      page,
+      search_type,
+      params,
+      self.base_url,
+      self.transport,
+      resource_type = "pages"
+    )
+
+
+  def iter_pages(
+    self,
+    filter=None,
+    fields=None,
+    formats=None,
+    order=None,
+    limit=100,
+    params=dict(),
+    prefetch=True
+  ):
+
+    """
+    Asynchronously iterates over every page on the site.
+
+    With `prefetch` true the next response is fetched by a task on the event
+    loop while the current one is consumed; with `prefetch` false it is
+    only requested once the current one is exhausted. See `Ghost.iter_pages`.
+    """
+
+    list_params = _list_params(filter, fields, formats, order, limit, params)
+
+    return _iter(
+      list_params,
+      self.base_url,
+      self.transport,
+      resource_type = "pages",
+      prefetch = prefetch
+    )
+
+
+  async def create_page(self, page_json):
+
+    """
+    Create a page.
+
+    See `Ghost.create_page`.
+    """
+
+    return await _create(
+      page_json,
+      self.base_url,
+      self.transport,
+      resource_type = "pages",
+      catalog = self.catalog
+    )
+
+
+  async def update_page(
+    self,
+    new_page_json,
+    page,
+    search_type="id",
+    updated_at=None,
+    diff=False
+  ):
+
+    """
+    Update a page in place.
+
+    See `Ghost.update_page`.
+    """
+
+    return await _update(
+      new_page_json,
+      page,
+      search_type,
+      self.base_url,
+      self.transport,
+      resource_type = "pages",
+      updated_at = updated_at,
+      diff = diff,
+      catalog = self.catalog
+    )
+
+
+  async def delete_page(self, page):
+
+    """
+    Remove a page by page ID.
+
+    See `Ghost.delete_page`.
+    """
+
+    return await _delete(
+      page,
+      self.base_url,
+      self.transport,
+      resource_type = "pages",
+      catalog = self.catalog
+    )
+
+
+  async def deploy_page(
+    self,
+    page_dir=".",
+    update=False,
+    image_workers=4,
+    force=False,
+    diff=False
+  ):
+
+    """
+    Create or update a page from markdown and config files in a directory.
+
+    See `Ghost.deploy_page`.
+    """
+
+    return await _deploy(
+      page_dir,
+      "pages",
+      self.base_url,
+      self.transport,
+      update,
+      image_workers,
+      self.image_store,
+      force,
+      self.renderer,
+      diff,
+      self.catalog
+    )
+
+
+  async def upload_image(self, file, ref):
+
+    """
+    Upload an image to be referenced by URL.
+
+    See `Ghost.upload_image`.
+    """
+
+    return await _upload_image(file, ref, self.base_url, self.transport)
+
+
+  async def refresh_catalog(self, resource_types=_RESOURCE_TYPES, full=False):
+
+    """
+    Pull the posts and pages updated on the site since the last refresh into
+    the catalog.
+
+    See `Ghost.refresh_catalog`.
+    """
+
+    if self.catalog is None:
+      raise AppyException("No catalog configured")
+
+    pulled = {}
+
+    for resource_type in resource_types:
+      if resource_type not in _RESOURCE_TYPES:
+        raise AppyException("resource_type must be one of 'posts' or 'pages'")
+
+      seen = set() if full else None
+      latest = None
+      pulled[resource_type] = 0
+      cursor = self.catalog._cursor(resource_type, full)
+
+      while not cursor.done:
+        response = await _get(
+          None,
+          "id",
+          cursor.params(),
+          self.base_url,
+          self.transport,
+          resource_type
+        )
+
+        ids, latest = await _run(
+          self.catalog._apply,
+          resource_type,
+          cursor.advance(response),
+          latest
+        )
+        pulled[resource_type] += len(ids)
+        if seen is not None:
+          seen.update(ids)
+
+      await _run(self.catalog._finish, resource_type, latest, seen)
+
+    return pulled
+
+
+  def receive_webhooks(
+    self,
+    host="127.0.0.1",
+    port=0,
+    secret=None,
+    on_event=None
+  ):
+
+    """
+    Serve Ghost webhooks on a background thread, keeping the catalog up to
+    date without polling.
+
+    See `Ghost.receive_webhooks`.
+    """
+
+    return receive_webhooks(self, host, port, secret, on_event)
+
+
+  async def get_site(self):
+
+    """
+    Get basic site information.
+    """
+
+    url = url_join(self.base_url, "site")
+
+    response = await self.transport.get(url)
+    await _check(response, 200)
+
+    return response
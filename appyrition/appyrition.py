@@ -1,13 +1,22 @@
 # appyrition.py
 
 import json
-import requests
 import logging
-from jwt import decode
 
-from .error import GhostException
-from .auth import generate_base_url, generate_auth_token
+from .error import GhostException, AppyException
+from .auth import (
+  generate_base_url,
+  generate_session_headers,
+  TokenAuth
+)
 from .helpers import url_join
+from .transport import Transport
+from .image_store import ImageStore
+from .cache import ResponseCache
+from .render import Renderer
+from .retry import RetryPolicy
+from .metrics import Metrics
+from .catalog import Catalog
 
 
 class Ghost(object):
@@ -29,21 +38,37 @@ class Ghost(object):
     Admin API client secret
   auth_token : str
     JSON web authorization token created using jwt.encode from pyjwt
+  token_auth : appyrition.auth.TokenAuth
+    Admin API key authentication minting fresh tokens on demand
   username : str
     Login user name to create session
   password : str
     Login password to create session
   session : requests.cookies.RequestsCookieJar
     Session cookie for the login
+  transport : appyrition.transport.Transport
+    Connection-pooled HTTP transport shared by every API call
+  image_store : appyrition.image_store.ImageStore
+    Manifest of uploaded images used to skip re-uploading unchanged images
+  renderer : appyrition.render.Renderer
+    Markdown renderer with reusable converters and a rendered-HTML cache
+  metrics : appyrition.metrics.Metrics
+    Registry of per-endpoint request metrics, None if disabled
+  catalog : appyrition.catalog.Catalog
+    Local mirror of the site's post and page identifiers, None if disabled
 
   Methods
   -------
   login(username, password)
-    Creates a user session used for all subsequent API calls
+    Creates a user session used for all subsequent API calls; not needed
+    when the client uses `auth="token"`
 
   get_post(post=None, search_type="id")
     Returns all posts or a filtered list of posts as JSON
 
+  iter_posts(filter=None, fields=None, formats=None, order=None)
+    Iterates over every post, following pagination
+
   create_post(post)
     Uploads a post as a draft
 
@@ -53,15 +78,65 @@ class Ghost(object):
   upload_image(file, ref)
     Upload an image to be referenced by URL
 
+  verify_images()
+    Evict image store entries whose URLs no longer exist
+
+  refresh_catalog(resource_types=("posts", "pages"), full=False)
+    Pull posts and pages updated since the last refresh into the catalog
+
+  receive_webhooks(host="127.0.0.1", port=0, secret=None)
+    Keeps cached responses and the catalog up to date from Ghost webhooks
+
+  batch(workers=8)
+    Queues API calls in a `with` block and runs them concurrently on exit
+
+  deploy_many(root, resource_type="posts")
+    Deploys every post or page directory under a root directory concurrently
+
   deploy(resource_dir)
     Gathers post text, config, and images from a directory and uploads the post
+
+  export_site(root, resource_types=("posts", "pages"))
+    Writes every post and page to directories that can be deployed again
+
+  watch(roots, resource_type="posts")
+    Redeploys post or page directories whenever they change
+
+  stats()
+    Returns per-endpoint request metrics
+
+  add_hook(before=None, after=None)
+    Register hooks called around every request
+
+  close()
+    Close all pooled connections and render processes
   """
 
   # imported methods
-  from .post import get_post, create_post, delete_post, update_post, deploy_post
-  from .page import get_page, create_page, delete_page, update_page, deploy_page
-  from .image import upload_image
+  from .post import (
+    get_post,
+    iter_posts,
+    create_post,
+    delete_post,
+    update_post,
+    deploy_post
+  )
+  from .page import (
+    get_page,
+    iter_pages,
+    create_page,
+    delete_page,
+    update_page,
+    deploy_page
+  )
+  from .image import upload_image, verify_images
   from .site import get_site
+  from .deploy import deploy_many
+  from .batch import batch
+  from .catalog import refresh_catalog
+  from .export import export_site
+  from .watch import watch
+  from .webhook import receive_webhooks
 
 
   def __init__(
@@ -69,7 +144,17 @@ class Ghost(object):
     site_url,
     version,
     client_id,
-    client_secret
+    client_secret,
+    pool_size=10,
+    keep_alive=True,
+    timeout=None,
+    image_store=None,
+    cache=None,
+    auth="session",
+    renderer=None,
+    retry=True,
+    metrics=True,
+    catalog=None
   ):
 
     """
@@ -83,6 +168,35 @@ class Ghost(object):
       Admin API client ID
     client_secret : str
       Admin API client secret
+    pool_size : int, optional
+      Maximum number of pooled connections kept open to the Ghost host
+    keep_alive : bool, optional
+      If false, connections are closed after every request
+    timeout : float, optional
+      Default timeout in seconds for every request
+    image_store : str or appyrition.image_store.ImageStore, optional
+      Path to a manifest file of uploaded images; deploys skip uploading any
+      image whose bytes are already in the manifest
+    cache : bool or appyrition.cache.ResponseCache, optional
+      Cache GET responses for posts, pages and site info, revalidating them
+      with ETag/Last-Modified; True uses a default `ResponseCache`
+    auth : str, optional
+      'session' to authenticate with a user session created by `login`, or
+      'token' to authenticate every request with an Admin API key token
+    renderer : str or appyrition.render.Renderer, optional
+      Renderer used to convert Markdown to HTML, or a directory in which a
+      default `Renderer` caches rendered HTML on disk; by default rendered
+      HTML is cached in memory only
+    retry : bool or appyrition.retry.RetryPolicy, optional
+      Retry rate-limited, failed and dropped requests with capped exponential
+      backoff; True uses a default `RetryPolicy`, False never retries
+    metrics : bool or appyrition.metrics.Metrics, optional
+      Record per-endpoint request metrics, returned by `stats()`; True uses
+      a new `Metrics` registry, which may instead be shared between clients
+    catalog : str or appyrition.catalog.Catalog, optional
+      Path to a SQLite database mirroring the site's post and page
+      identifiers; updates and deploys resolve ids, slugs and `updated_at`
+      from it instead of fetching them
     """
 
     self.version = version
@@ -94,13 +208,61 @@ class Ghost(object):
     self.client_id = client_id
     self.client_secret = client_secret
     
-    auth_token = generate_auth_token(client_id, client_secret)
-    self.auth_token = auth_token
+    if auth not in ("session", "token"):
+      raise AppyException("auth must be one of 'session' or 'token'")
+
+    # the token is minted on first use
+    self.token_auth = TokenAuth(client_id, client_secret, version)
 
     self.username = None
     self.password = None
     self.session = None
 
+    if cache is True:
+      cache = ResponseCache()
+    elif cache is False:
+      cache = None
+
+    if retry is True:
+      retry = RetryPolicy()
+    elif retry is False:
+      retry = None
+
+    self.transport = Transport(
+      pool_size = pool_size,
+      keep_alive = keep_alive,
+      timeout = timeout,
+      cache = cache,
+      auth = self.token_auth if auth == "token" else None,
+      retry = retry
+    )
+
+    if metrics is True:
+      metrics = Metrics()
+    elif metrics is False:
+      metrics = None
+    self.metrics = metrics
+
+    if metrics is not None:
+      self.transport.after_request.append(metrics.record)
+
+    if isinstance(image_store, str):
+      image_store = ImageStore(image_store, site_url)
+    self.image_store = image_store
+
+    if renderer is None or isinstance(renderer, str):
+      renderer = Renderer(cache_dir = renderer)
+    self.renderer = renderer
+
+    if isinstance(catalog, str):
+      catalog = Catalog(catalog, site_url)
+    self.catalog = catalog
+
+
+  @property
+  def auth_token(self):
+    return self.token_auth.token()
+
 
   def login(self, username, password):
 
@@ -125,19 +287,14 @@ class Ghost(object):
       "password": password
     }
 
-    headers = {
-      "Authorization": "Ghost {}".format(
-        decode(
-          self.auth_token,
-          bytes.fromhex(self.client_secret),
-          algorithms=["HS256"],
-          audience=["/{}/admin/".format(self.version)]
-        )
-      ),
-      "Origin": "{}".format(self.site_url)
-    }
+    headers = generate_session_headers(
+      self.token_auth.token(),
+      self.client_secret,
+      self.version,
+      self.site_url
+    )
 
-    response = requests.post(url, data = payload, headers = headers)
+    response = self.transport.post(url, data = payload, headers = headers)
 
     if response.status_code != 201:
       raise GhostException(
@@ -147,9 +304,57 @@ class Ghost(object):
 
     self.username = username
     self.password = password
-    self.session = response.cookies
+    # the transport keeps the session cookie for all subsequent calls
+    self.session = self.transport.cookies
 
     cookie = json.dumps(dict(response.cookies))
     logging.debug("Using session cookies: %s", cookie)
 
     return response
+
+
+  def add_hook(self, before=None, after=None):
+
+    """
+    Register hooks called around every request the client sends.
+
+    See `appyrition.transport.Transport` for the hook signatures and the
+    fields of the event passed to `after`.
+
+    Parameters
+    ----------
+    before : callable, optional
+      Called as `before(method, url, kwargs)` before each request is sent
+    after : callable, optional
+      Called as `after(event)` once each request has finished or failed
+    """
+
+    if before is not None:
+      self.transport.before_request.append(before)
+    if after is not None:
+      self.transport.after_request.append(after)
+
+
+  def stats(self):
+
+    """
+    Returns per-endpoint request metrics.
+
+    See `appyrition.metrics.Metrics.stats`.
+    """
+
+    if self.metrics is None:
+      raise AppyException("Metrics are disabled for this client")
+
+    return self.metrics.stats()
+
+
+  def close(self):
+
+    """
+    Close all pooled connections held by the transport and shut down the
+    renderer's worker processes.
+    """
+
+    self.transport.close()
+    self.renderer.close()
@@ -1,8 +1,12 @@
 # auth.py
 
-from jwt import encode
+import threading
+
 from datetime import datetime as date
 
+# jwt and its cryptography backend are imported on the first token operation
+# to keep `import appyrition` fast
+
 
 def generate_base_url(site_url, version):
   base_url = "{site_url}/ghost/api/{version}/admin/".format(
@@ -15,21 +19,36 @@ def generate_base_url(site_url, version):
 
 def generate_auth_header(
   client_id,
-  iat = int(date.now().timestamp())
+  iat = None,
+  version = "v3",
+  lifetime = 5 * 60
 ):
+  # iat defaults to now at call time; Ghost rejects tokens that live longer
+  # than five minutes
+  if iat is None:
+    iat = int(date.now().timestamp())
+
   header = {"alg": "HS256", "typ": "JWT", "kid": client_id}
 
   payload = {
     "iat": iat,
-    "exp": iat + 5 * 60,
-    "aud": "/v3/admin/"
+    "exp": iat + lifetime,
+    "aud": "/{}/admin/".format(version)
   }
 
   return header, payload
 
 
-def generate_auth_token(client_id, client_secret):
-  header, payload = generate_auth_header(client_id)
+def generate_auth_token(
+  client_id,
+  client_secret,
+  iat = None,
+  version = "v3",
+  lifetime = 5 * 60
+):
+  from jwt import encode
+
+  header, payload = generate_auth_header(client_id, iat, version, lifetime)
 
   token = encode(
     payload,
@@ -39,3 +58,113 @@ def generate_auth_token(client_id, client_secret):
   )
 
   return token
+
+
+def generate_session_headers(auth_token, client_secret, version, site_url):
+  from jwt import decode
+
+  headers = {
+    "Authorization": "Ghost {}".format(
+      decode(
+        auth_token,
+        bytes.fromhex(client_secret),
+        algorithms=["HS256"],
+        audience=["/{}/admin/".format(version)]
+      )
+    ),
+    "Origin": "{}".format(site_url)
+  }
+
+  return headers
+
+
+class TokenAuth(object):
+
+  """
+  Admin API key authentication with a cached, auto-refreshing token
+
+  The JWT is minted on first use, cached, and minted again `refresh_margin`
+  seconds before it expires, so long-running clients never send an expired
+  token. Safe to share between threads.
+
+  Instances can be used as a `requests` auth callable: each request gets an
+  `Authorization: Ghost <token>` header.
+
+  Attributes
+  ----------
+  client_id : str
+    Admin API client ID
+  client_secret : str
+    Admin API client secret
+  version : str
+    API version the token is minted for
+  lifetime : int
+    Seconds each token is valid for, at most five minutes
+  refresh_margin : int
+    Seconds before expiry at which a new token is minted
+  """
+
+  def __init__(
+    self,
+    client_id,
+    client_secret,
+    version = "v3",
+    lifetime = 5 * 60,
+    refresh_margin = 30
+  ):
+
+    """
+    Parameters
+    ----------
+    client_id : str
+      Admin API client ID
+    client_secret : str
+      Admin API client secret
+    version : str, optional
+      API version the token is minted for
+    lifetime : int, optional
+      Seconds each token is valid for, at most five minutes
+    refresh_margin : int, optional
+      Seconds before expiry at which a new token is minted
+    """
+
+    self.client_id = client_id
+    self.client_secret = client_secret
+    self.version = version
+    self.lifetime = lifetime
+    self.refresh_margin = refresh_margin
+
+    self._token = None
+    self._expires_at = 0
+    self._lock = threading.Lock()
+
+
+  def token(self):
+
+    """
+    Returns a token valid for at least `refresh_margin` seconds.
+    """
+
+    now = int(date.now().timestamp())
+
+    with self._lock:
+      if self._token is None or now >= self._expires_at - self.refresh_margin:
+        self._token = generate_auth_token(
+          self.client_id,
+          self.client_secret,
+          iat = now,
+          version = self.version,
+          lifetime = self.lifetime
+        )
+        self._expires_at = now + self.lifetime
+
+      return self._token
+
+
+  def header(self):
+    return "Ghost {}".format(self.token())
+
+
+  def __call__(self, request):
+    request.headers["Authorization"] = self.header()
+    return request
@@ -0,0 +1,280 @@
+# batch.py
+
+import logging
+import threading
+
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+from .error import AppyException
+
+
+class Batch(object):
+
+  """
+  A queue of Admin API calls run concurrently when the batch is closed
+
+  Every queued call returns a `concurrent.futures.Future` at once. When the
+  `with` block exits, the calls run on a pool of `workers` threads sharing
+  the client's connection pool; the block returns once all of them have
+  finished.
+
+  A call runs only after every future it depends on has succeeded. Futures
+  given in `after`, or passed directly as arguments, are dependencies;
+  arguments that are futures are replaced by their results. If a dependency
+  fails, the call is not made and its future raises the same exception.
+  Failures are kept in the futures rather than raised on exit.
+
+  ```
+  with gh.batch(workers = 8) as b:
+    image = b.upload_image("images/logo.png", "images/logo.png")
+    post = b.create_post(post_json, after = [image])
+    b.delete_post("5f1e...")
+
+  post.result()
+  ```
+
+  Attributes
+  ----------
+  ghost : appyrition.Ghost
+    Client the calls are made with
+  workers : int
+    Maximum number of calls in flight at once
+  futures : list
+    Futures of the queued calls, in queue order
+  """
+
+  def __init__(self, ghost, workers = 8):
+
+    """
+    Parameters
+    ----------
+    ghost : appyrition.Ghost
+      Client the calls are made with
+    workers : int, optional
+      Maximum number of calls in flight at once
+    """
+
+    self.ghost = ghost
+    self.workers = workers
+    self.futures = []
+
+    self._calls = []
+    self._closed = False
+
+
+  def __enter__(self):
+    return self
+
+
+  def __exit__(self, exc_type, exc, tb):
+    if exc_type is not None:
+      self._closed = True
+      for call in self._calls:
+        call["future"].cancel()
+      return False
+
+    self.run()
+    return False
+
+
+  def call(self, fn, *args, after = (), **kwargs):
+
+    """
+    Queue `fn(*args, **kwargs)`.
+
+    Parameters
+    ----------
+    fn : callable
+      Function to call
+    after : iterable, optional
+      Futures that must succeed before the call is made
+    *args, **kwargs
+      Arguments of the call; futures are replaced by their results
+
+    Returns
+    -------
+    concurrent.futures.Future
+      Future of the call's return value
+    """
+
+    if self._closed:
+      raise AppyException("Batch has already run")
+
+    deps = list(after)
+    deps += [a for a in args if isinstance(a, Future)]
+    deps += [v for v in kwargs.values() if isinstance(v, Future)]
+
+    future = Future()
+    self._calls.append({
+      "fn": fn,
+      "args": args,
+      "kwargs": kwargs,
+      "deps": deps,
+      "future": future
+    })
+    self.futures.append(future)
+
+    return future
+
+
+  def _method(self, name, *args, after = (), **kwargs):
+    return self.call(getattr(self.ghost, name), *args, after = after, **kwargs)
+
+
+  def create_post(self, post_json, after = ()):
+    return self._method("create_post", post_json, after = after)
+
+
+  def update_post(
+    self,
+    new_post_json,
+    post,
+    search_type = "id",
+    updated_at = None,
+    diff = False,
+    after = ()
+  ):
+    return self._method(
+      "update_post",
+      new_post_json,
+      post,
+      search_type,
+      updated_at,
+      diff,
+      after = after
+    )
+
+
+  def delete_post(self, post, after = ()):
+    return self._method("delete_post", post, after = after)
+
+
+  def create_page(self, page_json, after = ()):
+    return self._method("create_page", page_json, after = after)
+
+
+  def update_page(
+    self,
+    new_page_json,
+    page,
+    search_type = "id",
+    updated_at = None,
+    diff = False,
+    after = ()
+  ):
+    return self._method(
+      "update_page",
+      new_page_json,
+      page,
+      search_type,
+      updated_at,
+      diff,
+      after = after
+    )
+
+
+  def delete_page(self, page, after = ()):
+    return self._method("delete_page", page, after = after)
+
+
+  def upload_image(self, file, ref, after = ()):
+    return self._method("upload_image", file, ref, after = after)
+
+
+  def run(self):
+
+    """
+    Run every queued call and wait for all of them to finish.
+
+    Called when the `with` block exits; the batch cannot be used afterwards.
+
+    Returns
+    -------
+    list
+      Futures of the queued calls, in queue order
+    """
+
+    self._closed = True
+
+    if len(self._calls) == 0:
+      return self.futures
+
+    logging.info("Running batch of {} calls".format(len(self._calls)))
+
+    executor = ThreadPoolExecutor(max_workers = max(1, self.workers))
+
+    try:
+      for call in self._calls:
+        self._schedule(call, executor)
+
+      wait(self.futures)
+    finally:
+      executor.shutdown(wait = True)
+
+    return self.futures
+
+
+  def _schedule(self, call, executor):
+    # submit the call once its last dependency has finished
+    deps = call["deps"]
+    remaining = [len(deps)]
+    lock = threading.Lock()
+
+    def on_dep_done(dep):
+      with lock:
+        remaining[0] -= 1
+        ready = remaining[0] == 0
+
+      if ready:
+        executor.submit(_execute, call)
+
+    if len(deps) == 0:
+      executor.submit(_execute, call)
+
+    for dep in deps:
+      dep.add_done_callback(on_dep_done)
+
+
+def _resolve(value):
+  return value.result() if isinstance(value, Future) else value
+
+
+def _execute(call):
+  future = call["future"]
+
+  if not future.set_running_or_notify_cancel():
+    return
+
+  for dep in call["deps"]:
+    if dep.cancelled():
+      error = AppyException("Dependency was cancelled")
+    else:
+      error = dep.exception()
+
+    if error is not None:
+      future.set_exception(error)
+      return
+
+  try:
+    args = [_resolve(a) for a in call["args"]]
+    kwargs = {k: _resolve(v) for k, v in call["kwargs"].items()}
+    future.set_result(call["fn"](*args, **kwargs))
+  except Exception as e:
+    future.set_exception(e)
+
+
+def batch(self, workers = 8):
+
+  """
+  Returns a batch that queues API calls and runs them concurrently when its
+  `with` block exits.
+
+  See `appyrition.batch.Batch` and README for more details.
+
+  Parameters
+  ----------
+  workers : int, optional
+    Maximum number of calls in flight at once
+  """
+
+  return Batch(self, workers)
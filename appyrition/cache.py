@@ -0,0 +1,223 @@
+# cache.py
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from requests import Request
+
+
+class ResponseCache(object):
+
+  """
+  A size and age bounded LRU cache of GET responses with conditional revalidation
+
+  Cached responses that carry an `ETag` or `Last-Modified` header are
+  revalidated with `If-None-Match`/`If-Modified-Since`; a `304 Not Modified`
+  answer reuses the cached body instead of downloading it again. Responses
+  younger than `max_age` are served without contacting the server at all.
+
+  Every entry is tagged with the resources found in its body, so a create,
+  update or delete through the client evicts every cached response that
+  contains that resource along with every cached listing of its type.
+
+  Attributes
+  ----------
+  max_entries : int
+    Maximum number of cached responses
+  ttl : float
+    Seconds after which an entry is evicted, regardless of validators
+  max_age : float
+    Seconds during which an entry is served without revalidation
+  hits : int
+    Number of responses served from the cache, including 304 revalidations
+  misses : int
+    Number of responses downloaded in full
+  """
+
+  def __init__(self, max_entries = 256, ttl = 300, max_age = 0):
+
+    """
+    Parameters
+    ----------
+    max_entries : int, optional
+      Maximum number of cached responses
+    ttl : float, optional
+      Seconds after which an entry is evicted
+    max_age : float, optional
+      Seconds during which an entry is served without revalidation
+    """
+
+    self.max_entries = max_entries
+    self.ttl = ttl
+    self.max_age = max_age
+    self.hits = 0
+    self.misses = 0
+
+    self._entries = OrderedDict()
+    self._lock = threading.Lock()
+
+
+  def __len__(self):
+    return len(self._entries)
+
+
+  @staticmethod
+  def _key(url, params):
+    return Request("GET", url, params = params).prepare().url
+
+
+  @staticmethod
+  def _tags(response):
+    # (resource_type, id) for every resource in the body, plus
+    # (resource_type, None) if the body is a listing
+    tags = set()
+
+    try:
+      body = response.json()
+    except ValueError:
+      return tags
+
+    if not isinstance(body, dict):
+      return tags
+
+    is_list = "meta" in body
+
+    for resource_type, value in body.items():
+      if isinstance(value, list):
+        if is_list:
+          tags.add((resource_type, None))
+        for resource_json in value:
+          if isinstance(resource_json, dict) and "id" in resource_json:
+            tags.add((resource_type, resource_json["id"]))
+      elif isinstance(value, dict):
+        tags.add((resource_type, None))
+
+    return tags
+
+
+  def _count(self, counter):
+    # the cache is shared by every thread using the transport
+    with self._lock:
+      setattr(self, counter, getattr(self, counter) + 1)
+
+
+  def _lookup(self, key):
+    with self._lock:
+      entry = self._entries.get(key)
+
+      if entry is None:
+        return None
+
+      if time.monotonic() - entry["stored_at"] > self.ttl:
+        del self._entries[key]
+        return None
+
+      self._entries.move_to_end(key)
+      return entry
+
+
+  def _store(self, key, response):
+    entry = {
+      "response": response,
+      "tags": self._tags(response),
+      "stored_at": time.monotonic()
+    }
+
+    with self._lock:
+      self._entries[key] = entry
+      self._entries.move_to_end(key)
+
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last = False)
+
+
+  def get(self, transport, url, params = None, headers = None, **kwargs):
+
+    """
+    Send a GET request through `transport`, answering it from the cache if
+    possible.
+
+    Parameters
+    ----------
+    transport : appyrition.transport.Transport
+      Transport used for requests that cannot be answered from the cache
+    url : str
+      Request URL
+    params : dict, optional
+      Query params
+    headers : dict, optional
+      Request headers
+    **kwargs
+      Passed through to `Transport.request`
+    """
+
+    key = self._key(url, params)
+    entry = self._lookup(key)
+    headers = dict(headers or {})
+
+    if entry is not None:
+      cached = entry["response"]
+
+      if time.monotonic() - entry["stored_at"] <= self.max_age:
+        self._count("hits")
+        return cached
+
+      if "ETag" in cached.headers:
+        headers["If-None-Match"] = cached.headers["ETag"]
+      if "Last-Modified" in cached.headers:
+        headers["If-Modified-Since"] = cached.headers["Last-Modified"]
+
+    response = transport.request(
+      "GET",
+      url,
+      params = params,
+      headers = headers,
+      **kwargs
+    )
+
+    if response.status_code == 304 and entry is not None:
+      logging.debug("Cached response still valid for %s", key)
+      with self._lock:
+        entry["stored_at"] = time.monotonic()
+      self._count("hits")
+      return entry["response"]
+
+    self._count("misses")
+
+    if response.status_code == 200:
+      self._store(key, response)
+
+    return response
+
+
+  def invalidate(self, resource_type, resource_id = None):
+
+    """
+    Evict cached listings of `resource_type` and every cached response that
+    contains the resource `resource_id`.
+
+    Parameters
+    ----------
+    resource_type : str
+      e.g. 'posts' or 'pages'
+    resource_id : str, optional
+      ID of the created, updated or deleted resource
+    """
+
+    stale = {(resource_type, None), (resource_type, resource_id)}
+
+    with self._lock:
+      for key in [k for k, e in self._entries.items() if e["tags"] & stale]:
+        del self._entries[key]
+
+
+  def clear(self):
+
+    """
+    Evict every entry.
+    """
+
+    with self._lock:
+      self._entries.clear()
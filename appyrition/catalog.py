@@ -0,0 +1,517 @@
+# catalog.py
+
+import sqlite3
+import logging
+import threading
+
+from .error import AppyException
+from .post_and_page import _get, _list_params, _next_page, _digest
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS resources (
+  site_url TEXT NOT NULL,
+  resource_type TEXT NOT NULL,
+  id TEXT NOT NULL,
+  uuid TEXT,
+  slug TEXT,
+  status TEXT,
+  updated_at TEXT,
+  content_hash TEXT,
+  PRIMARY KEY (site_url, resource_type, id)
+);
+CREATE INDEX IF NOT EXISTS resources_slug
+  ON resources (site_url, resource_type, slug);
+CREATE TABLE IF NOT EXISTS syncs (
+  site_url TEXT NOT NULL,
+  resource_type TEXT NOT NULL,
+  updated_at TEXT,
+  PRIMARY KEY (site_url, resource_type)
+);
+"""
+
+_COLUMNS = ("id", "uuid", "slug", "status", "updated_at", "content_hash")
+
+_RESOURCE_TYPES = ("posts", "pages")
+
+
+def _content_hash(resource_json):
+  # digest of whichever content formats the resource was returned with
+  content = {
+    key: resource_json[key]
+    for key in ("mobiledoc", "lexical", "html")
+    if key in resource_json
+  }
+
+  return _digest(content) if content else None
+
+
+def _filter_time(updated_at):
+  # Ghost filters compare timestamps as 'YYYY-MM-DD HH:MM:SS'
+  return updated_at.replace("T", " ")[:19]
+
+
+class _RefreshCursor(object):
+  # keyset pagination over resources ordered by updated_at: every request
+  # filters from the last second seen rather than asking for the next offset,
+  # so a resource edited during the refresh moves to the end of the listing
+  # without shifting the ones not pulled yet. Ids already pulled within that
+  # second are skipped, since Ghost filters only compare to the second.
+  def __init__(self, resource_type, synced_at, limit = 100):
+    self.resource_type = resource_type
+    self.since = None if synced_at is None else _filter_time(synced_at)
+    self.limit = limit
+    self.page = 1
+    self.done = False
+
+    # ids pulled so far whose updated_at falls within `since`
+    self._pulled = set()
+
+
+  def params(self):
+    return _list_params(
+      filter = (
+        None if self.since is None
+        # inclusive, as Ghost timestamps are only precise to the second
+        else "updated_at:>='{}'".format(self.since)
+      ),
+      fields = None,
+      formats = None,
+      order = "updated_at asc",
+      limit = self.limit,
+      params = {"page": self.page}
+    )
+
+
+  def advance(self, response):
+    # returns the resources of `response` not pulled yet and moves past them
+    resources = response[self.resource_type]
+    fresh = [r for r in resources if r["id"] not in self._pulled]
+
+    if _next_page(response) is None or len(resources) == 0:
+      self.done = True
+      return fresh
+
+    last = _filter_time(resources[-1]["updated_at"])
+
+    if last == self.since:
+      # a whole response within one second cannot move the filter forward,
+      # so step through that second by offset instead
+      self.page += 1
+    else:
+      self.since = last
+      self.page = 1
+      self._pulled = set()
+
+    self._pulled.update(
+      r["id"] for r in resources
+      if _filter_time(r["updated_at"]) == self.since
+    )
+
+    return fresh
+
+
+class Catalog(object):
+
+  """
+  A local SQLite mirror of the posts and pages of a Ghost site
+
+  Keeps the id, slug, uuid, status, `updated_at` and a content hash of every
+  post and page, indexed by id and slug, so that identifiers can be resolved
+  and existence checked without a request to the site. One database file may
+  be shared by several sites; rows are kept separately for each `site_url`.
+
+  `refresh` pulls only resources updated since the previous refresh. Creates,
+  updates and deletes made through a client with the catalog are recorded as
+  they happen. Resources deleted on the site by anyone else are only dropped
+  by a full refresh.
+
+  Attributes
+  ----------
+  db_file : str
+    Path to the SQLite database file
+  site_url : str
+    URL of the Ghost instance mirrored
+
+  Methods
+  -------
+  get(resource_type, resource, search_type="id")
+    Returns the catalog entry of a post or page, if any
+
+  ids(resource_type, slugs)
+    Resolves many slugs to ids at once
+
+  refresh(transport, base_url, resource_types=("posts", "pages"), full=False)
+    Pull resources updated on the site since the last refresh
+
+  record(resource_type, resource_json)
+    Add or update the entry of a resource
+
+  remove(resource_type, resource_id)
+    Remove the entry of a deleted resource
+  """
+
+  def __init__(self, db_file, site_url):
+
+    """
+    Parameters
+    ----------
+    db_file : str
+      Path to the SQLite database file, created if missing
+    site_url : str
+      URL of the Ghost instance mirrored
+    """
+
+    self.db_file = db_file
+    self.site_url = site_url
+    self._lock = threading.Lock()
+
+    # one connection shared by every thread, serialized by the lock
+    self._db = sqlite3.connect(db_file, check_same_thread = False)
+    self._db.row_factory = sqlite3.Row
+
+    with self._lock, self._db:
+      self._db.executescript(_SCHEMA)
+
+
+  def __len__(self):
+    with self._lock:
+      row = self._db.execute(
+        "SELECT count(*) FROM resources WHERE site_url = ?",
+        (self.site_url,)
+      ).fetchone()
+
+    return row[0]
+
+
+  def get(self, resource_type, resource, search_type = "id"):
+
+    """
+    Returns the catalog entry of a post or page.
+
+    Parameters
+    ----------
+    resource_type : str
+      One of 'posts' or 'pages'
+    resource : str
+      ID or slug of the resource
+    search_type : str, optional
+      Indicator for an ID search or a slug search
+
+    Returns
+    -------
+    dict
+      Keys `id`, `uuid`, `slug`, `status`, `updated_at` and `content_hash`,
+      or None if the resource is not in the catalog
+    """
+
+    if search_type not in ("id", "slug"):
+      raise ValueError("search_type must be 'id' or 'slug'")
+
+    # several ids may briefly share a slug if a resource was deleted and its
+    # slug reused on the site; the most recently updated one wins
+    with self._lock:
+      row = self._db.execute(
+        "SELECT {} FROM resources"
+        " WHERE site_url = ? AND resource_type = ? AND {} = ?"
+        " ORDER BY updated_at DESC LIMIT 1".format(
+          ", ".join(_COLUMNS),
+          search_type
+        ),
+        (self.site_url, resource_type, resource)
+      ).fetchone()
+
+    return dict(row) if row is not None else None
+
+
+  def ids(self, resource_type, slugs):
+
+    """
+    Resolves slugs to ids in a single query.
+
+    Parameters
+    ----------
+    resource_type : str
+      One of 'posts' or 'pages'
+    slugs : iterable
+      Slugs to resolve
+
+    Returns
+    -------
+    dict
+      Maps every slug found in the catalog to its id
+    """
+
+    slugs = list(slugs)
+    found = {}
+
+    with self._lock:
+      # stay under SQLite's limit on bound parameters
+      for start in range(0, len(slugs), 500):
+        chunk = slugs[start:start + 500]
+        rows = self._db.execute(
+          "SELECT slug, id FROM resources"
+          " WHERE site_url = ? AND resource_type = ? AND slug IN ({})"
+          " ORDER BY updated_at".format(", ".join("?" * len(chunk))),
+          [self.site_url, resource_type] + chunk
+        )
+        found.update((row["slug"], row["id"]) for row in rows)
+
+    return found
+
+
+  def _row(self, resource_type, resource_json):
+    return (
+      self.site_url,
+      resource_type,
+      resource_json["id"],
+      resource_json.get("uuid"),
+      resource_json.get("slug"),
+      resource_json.get("status"),
+      resource_json.get("updated_at"),
+      _content_hash(resource_json)
+    )
+
+
+  def _upsert(self, rows):
+    self._db.executemany(
+      "INSERT OR REPLACE INTO resources"
+      " (site_url, resource_type, {}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)".format(
+        ", ".join(_COLUMNS)
+      ),
+      rows
+    )
+
+
+  def record(self, resource_type, resource_json):
+
+    """
+    Add or update the entry of a resource.
+
+    Parameters
+    ----------
+    resource_type : str
+      One of 'posts' or 'pages'
+    resource_json : dict
+      Post or page JSON as returned by Ghost
+    """
+
+    with self._lock, self._db:
+      self._upsert([self._row(resource_type, resource_json)])
+
+
+  def remove(self, resource_type, resource_id):
+
+    """
+    Remove the entry of a deleted resource.
+
+    Parameters
+    ----------
+    resource_type : str
+      One of 'posts' or 'pages'
+    resource_id : str
+      ID of the resource
+    """
+
+    with self._lock, self._db:
+      self._db.execute(
+        "DELETE FROM resources"
+        " WHERE site_url = ? AND resource_type = ? AND id = ?",
+        (self.site_url, resource_type, resource_id)
+      )
+
+
+  def synced_at(self, resource_type):
+
+    """
+    Returns the latest `updated_at` seen by a refresh, or None if the
+    resource type was never refreshed.
+
+    Parameters
+    ----------
+    resource_type : str
+      One of 'posts' or 'pages'
+    """
+
+    with self._lock:
+      row = self._db.execute(
+        "SELECT updated_at FROM syncs WHERE site_url = ? AND resource_type = ?",
+        (self.site_url, resource_type)
+      ).fetchone()
+
+    return row[0] if row is not None else None
+
+
+  def _cursor(self, resource_type, full):
+    # the watermark comes from refreshes only: a write recorded through the
+    # client says nothing about what else changed on the site
+    synced_at = None if full else self.synced_at(resource_type)
+
+    return _RefreshCursor(resource_type, synced_at)
+
+
+  def _apply(self, resource_type, resources, latest = None):
+    # upsert one page of pulled resources; returns their ids and the latest
+    # updated_at seen so far
+    rows = [self._row(resource_type, r) for r in resources]
+
+    with self._lock, self._db:
+      self._upsert(rows)
+
+    latest = max(
+      (u for u in [latest] + [r[6] for r in rows] if u is not None),
+      default = None
+    )
+
+    return [r[2] for r in rows], latest
+
+
+  def _finish(self, resource_type, latest, seen = None):
+    # advance the watermark and, after a full refresh, drop every entry the
+    # site no longer has
+    with self._lock, self._db:
+      if seen is not None:
+        known = self._db.execute(
+          "SELECT id FROM resources WHERE site_url = ? AND resource_type = ?",
+          (self.site_url, resource_type)
+        )
+        gone = [
+          (self.site_url, resource_type, row[0])
+          for row in known.fetchall()
+          if row[0] not in seen
+        ]
+
+        self._db.executemany(
+          "DELETE FROM resources"
+          " WHERE site_url = ? AND resource_type = ? AND id = ?",
+          gone
+        )
+
+      if latest is not None:
+        self._db.execute(
+          "INSERT INTO syncs (site_url, resource_type, updated_at)"
+          " VALUES (?, ?, ?)"
+          " ON CONFLICT (site_url, resource_type) DO UPDATE"
+          " SET updated_at = max(updated_at, excluded.updated_at)",
+          (self.site_url, resource_type, latest)
+        )
+
+
+  def refresh(
+    self,
+    transport,
+    base_url,
+    resource_types = _RESOURCE_TYPES,
+    full = False
+  ):
+
+    """
+    Pull the posts and pages updated on the site since the last refresh.
+
+    The first refresh of each resource type, and every `full` refresh, pulls
+    every resource of that type. Each request lists from the last
+    `updated_at` seen rather than by page number, so resources edited on the
+    site during a refresh are pulled without skipping any other.
+
+    Parameters
+    ----------
+    transport : appyrition.transport.Transport
+      Transport used to list the resources
+    base_url : str
+      Base URL for all Admin API requests to the Ghost instance
+    resource_types : iterable, optional
+      Any of 'posts' and 'pages'
+    full : bool, optional
+      If true, pull every resource and drop entries the site no longer has
+
+    Returns
+    -------
+    dict
+      Number of resources pulled for each resource type
+    """
+
+    pulled = {}
+
+    for resource_type in resource_types:
+      if resource_type not in _RESOURCE_TYPES:
+        raise AppyException("resource_type must be one of 'posts' or 'pages'")
+
+      seen = set() if full else None
+      latest = None
+      pulled[resource_type] = 0
+      cursor = self._cursor(resource_type, full)
+
+      # applied a response at a time so that content is never all held at once
+      while not cursor.done:
+        response = _get(
+          None,
+          "id",
+          cursor.params(),
+          base_url,
+          transport,
+          resource_type
+        )
+
+        ids, latest = self._apply(resource_type, cursor.advance(response), latest)
+        pulled[resource_type] += len(ids)
+        if seen is not None:
+          seen.update(ids)
+
+      self._finish(resource_type, latest, seen)
+      logging.info("Catalog pulled {} {}".format(
+        pulled[resource_type],
+        resource_type
+      ))
+
+    return pulled
+
+
+  def clear(self):
+
+    """
+    Remove every entry for this site.
+    """
+
+    with self._lock, self._db:
+      for table in ("resources", "syncs"):
+        self._db.execute(
+          "DELETE FROM {} WHERE site_url = ?".format(table),
+          (self.site_url,)
+        )
+
+
+  def close(self):
+
+    """
+    Close the database connection.
+    """
+
+    with self._lock:
+      self._db.close()
+
+
+def refresh_catalog(self, resource_types = _RESOURCE_TYPES, full = False):
+
+  """
+  Pull the posts and pages updated on the site since the last refresh into
+  the catalog.
+
+  See `appyrition.catalog.Catalog` and README for more details.
+
+  Parameters
+  ----------
+  resource_types : iterable, optional
+    Any of 'posts' and 'pages'
+  full : bool, optional
+    If true, pull every resource and drop entries the site no longer has
+  """
+
+  if self.catalog is None:
+    raise AppyException("No catalog configured")
+
+  return self.catalog.refresh(
+    self.transport,
+    self.base_url,
+    resource_types,
+    full
+  )
@@ -1,14 +1,21 @@
 # deploy.py
 
+import re
 import logging
 import json
+import hashlib
+import threading
 
-from markdown import markdown
-from os import listdir, path
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+
+from os import path, replace, stat, walk
+
+from urllib.parse import quote
 
 from .error import AppyException
-from .post_and_page import _create, _update
+from .post_and_page import _create, _update, _field_digests
 from .image import _upload_image
+from .image_store import hash_file
 
 
 def get_singular(resource_type):
@@ -73,6 +80,12 @@ def get_dir_structure(resource_dir):
   else:
     logging.info("Found md file")
 
+  # record of the last deploy
+  dir_str["state_file"] = os_normpath_join(
+    resource_dir,
+    dir_str["base_name"] + ".deployed"
+  )
+
   # image file paths
   dir_str["image_dir"] = os_normpath_join(resource_dir, "images")
   if not path.exists(dir_str["image_dir"]):
@@ -81,29 +94,12 @@ def get_dir_structure(resource_dir):
   else:
     logging.info("Found image directory")
     dir_str["image_dir_exists"] = True
-    dir_str["images"] = listdir(dir_str["image_dir"])
+    dir_str["images"] = _list_images(dir_str["image_dir"])
 
   return dir_str
 
 
-def _deploy(
-  resource_dir,
-  resource_type,
-  base_url,
-  session,
-  update=False
-):
-  singular = get_singular(resource_type)
-
-  logging.info(
-    "Using {resource_dir} as {singular} directory".format(
-      resource_dir = resource_dir,
-      singular = singular
-    )
-  )
-
-  dir_str = get_dir_structure(resource_dir)
-
+def _read_resource(dir_str):
   # read config
   with open(dir_str["config_file"], encoding = "utf8") as c:
     try:
@@ -130,80 +126,651 @@ def _deploy(
         )
       )
 
-  # upload images
-  # in addition to uploading the images to ghost
-  # this code will replace local references (image/image_name.jpg) in both the
-  # markdown and the feature image with the image url
-  if dir_str["image_dir_exists"]:
-    if len(dir_str["images"]) > 0:
-      for image in dir_str["images"]:
-        local_image_path = "/".join(["images", image])
-
-        in_text = local_image_path in text
-        has_feature_image = "feature_image" in resource.keys()
-        is_feature_image = resource["feature_image"] == local_image_path
-        in_config = has_feature_image & is_feature_image
-
-        if in_text | in_config:
-          abs_path_image = os_normpath_join(dir_str["image_dir"], image)
-          upload = _upload_image(
-            abs_path_image,
-            "/".join(["images", dir_str["base_name"], image]),
-            base_url,
-            session
-          )
-          logging.info("Image uploaded: {}".format(image))
-
-          image_meta = upload.json().get("images")[0]
-          image_url = image_meta.get("url")
-          logging.info("Image available at {}".format(image_url))
-
-        if in_text:
-          text = text.replace(local_image_path, image_url)
-
-        if in_config:
-          resource["feature_image"] = resource["feature_image"].replace(
-            local_image_path, image_url
-          )
-
-        if not in_text and not in_config:
-          logging.warn(
-            "Image {path} in directory but not referenced in {singular}".format(
-              path = local_image_path,
-              singular = singular
-            )
-          )
+  return resource, text
+
+
+# config fields that may hold a local image
+_IMAGE_FIELDS = ("feature_image", "og_image", "twitter_image")
+
+
+def _list_images(image_dir):
+  # every file under the images folder, as paths relative to it
+  images = []
+
+  for dir_path, dir_names, file_names in walk(image_dir):
+    dir_names.sort()
+    relative = path.relpath(dir_path, image_dir).replace(path.sep, "/")
+
+    for file_name in file_names:
+      if relative == ".":
+        images.append(file_name)
+      else:
+        images.append(relative + "/" + file_name)
+
+  return images
+
+
+def _image_references(images):
+  # a pattern matching images/<name> or ./images/<name> for any of
+  # `images` in a markdown link, an HTML attribute or plain text, but not
+  # within another URL's path, and the image each name stands for. Names are
+  # the file paths, spaces and parentheses included, or their percent-encoded
+  # form, tried longest first; trailing punctuation is not part of a name
+  names = {}
+
+  for image in images:
+    names.setdefault(quote(image), image)
+    names[image] = image
+
+  alternatives = sorted(names, key = len, reverse = True)
+  pattern = re.compile(
+    r"(?<![\w/.-])(?:\./)?images/({})(?![\w/-]|[.,;:!?]+[\w/-])".format(
+      "|".join(re.escape(name) for name in alternatives)
+    )
+  )
+
+  return pattern, names
+
+
+def _config_image(value, names):
+  # the image a config field names; the whole value must be the reference
+  if not isinstance(value, str):
+    return None
+
+  if value.startswith("./"):
+    value = value[2:]
+
+  if not value.startswith("images/"):
+    return None
+
+  return names.get(value[len("images/"):])
+
+
+def _find_images(dir_str, resource, text, singular):
+  # collect, in a single scan of the markdown and the config's image fields,
+  # the images in the images folder that are referenced, warning about any
+  # that are not
+  found = []
+
+  if not dir_str["image_dir_exists"]:
+    return found
+
+  if len(dir_str["images"]) == 0:
+    logging.warn(
+      "Images folder found but no images present; skipping image upload"
+    )
+    return found
+
+  files = set(dir_str["images"])
+  pattern, names = _image_references(files)
+
+  in_text = {names[match.group(1)] for match in pattern.finditer(text)}
+
+  in_config = {}
+  for field in _IMAGE_FIELDS:
+    image = _config_image(resource.get(field), names)
 
+    if image is not None:
+      in_config.setdefault(image, []).append(field)
+
+  # sorted so that uploads and url substitution are deterministic
+  for image in sorted(files):
+    local_image_path = "/".join(["images", image])
+
+    if image in in_text or image in in_config:
+      found.append({
+        "image": image,
+        "local_path": local_image_path,
+        "abs_path": os_normpath_join(dir_str["image_dir"], image),
+        "ref": "/".join(["images", dir_str["base_name"], image]),
+        "in_text": image in in_text,
+        "in_config": in_config.get(image, [])
+      })
     else:
       logging.warn(
-        "Images folder found but no images present; skipping image upload"
+        "Image {path} in directory but not referenced in {singular}".format(
+          path = local_image_path,
+          singular = singular
+        )
       )
 
+  return found
+
+
+def _replace_images(images, urls, resource, text):
+  # replace every local reference to an uploaded image in the markdown, in a
+  # single pass, and in the config's image fields with the image's url
+  by_image = {}
+
+  for image, image_url in zip(images, urls):
+    logging.info("Image available at {}".format(image_url))
+    by_image[image["image"]] = image_url
+
+    for field in image["in_config"]:
+      resource[field] = image_url
+
+  if any(image["in_text"] for image in images):
+    pattern, names = _image_references(by_image)
+    text = pattern.sub(lambda match: by_image[names[match.group(1)]], text)
+
+  return text
+
+
+def _image_url(upload):
+  return upload.json().get("images")[0].get("url")
+
+
+def _upload_one(image, base_url, transport, image_store):
+  # upload a single image unless the image store already holds its bytes
+  if image_store is not None:
+    digest, image_url = image_store.lookup(image["abs_path"])
+
+    if image_url is not None:
+      logging.info("Image unchanged, reusing: {}".format(image["image"]))
+      return image_url
+
+  upload = _upload_image(image["abs_path"], image["ref"], base_url, transport)
+  logging.info("Image uploaded: {}".format(image["image"]))
+
+  image_url = _image_url(upload)
+
+  if image_store is not None:
+    image_store.add(digest, image_url, image["ref"])
+
+  return image_url
+
+
+def _upload_images(images, base_url, transport, workers, image_store = None):
+  # upload images concurrently on a bounded pool and return their urls in the
+  # same order as `images`; the first failure cancels every upload that has
+  # not started yet and is re-raised once the running uploads have finished
+  if len(images) == 0:
+    return []
+
+  executor = ThreadPoolExecutor(max_workers = max(1, workers))
+
+  try:
+    futures = [
+      executor.submit(_upload_one, image, base_url, transport, image_store)
+      for image in images
+    ]
+
+    done, _ = wait(futures, return_when = FIRST_EXCEPTION)
+
+    for future in futures:
+      if future in done and future.exception() is not None:
+        raise future.exception()
+
+    urls = [future.result() for future in futures]
+
+  finally:
+    executor.shutdown(wait = True, cancel_futures = True)
+
+    # keep whatever was uploaded, even if the deploy failed
+    if image_store is not None:
+      image_store.save()
+
+  return urls
+
+
+def _render(text, renderer = None):
+  # render through the client's renderer, falling back to a one-off
+  # conversion when there is none
+  if renderer is None:
+    from markdown import markdown
+    return markdown(text)
+
+  return renderer.render(text)
+
+
+def _atomic_write(file, write):
+  # write to a temporary file next to `file` and move it into place so that
+  # readers never see a partially written file
+  tmp_file = "{}.{}.tmp".format(file, threading.get_ident())
+
+  with open(tmp_file, "w", encoding = "utf8") as f:
+    write(f)
+
+  replace(tmp_file, file)
+
+
+def _read_stats(dir_str):
+  # modification time and size of the config and markdown
+  stats = {}
+
+  for key in ("config_file", "md_file"):
+    file_stat = stat(dir_str[key])
+    stats[key] = [file_stat.st_mtime_ns, file_stat.st_size]
+
+  return stats
+
+
+def _write_back(dir_str, resource, text, response, resource_type, read = None):
+  # rewrite the markdown with image urls and the config with the new id,
+  # except for a file edited since the deploy read it (`read` holds the stats
+  # taken then), whose edit is kept; returns false if an edit was kept
+  resource_id = response[resource_type][0]["id"]
+  current = _read_stats(dir_str)
+  clean = True
+
+  if read is None or current["md_file"] == read["md_file"]:
+    _atomic_write(dir_str["md_file"], lambda m: m.write(text))
+  else:
+    logging.warn("{} changed during deploy; keeping the edit".format(
+      dir_str["md_file"]
+    ))
+    clean = False
+
+  if read is None or current["config_file"] == read["config_file"]:
+    resource.update({"id": resource_id})
+    resource.pop("html", None)
+
+    _atomic_write(
+      dir_str["config_file"],
+      lambda c: json.dump(resource, c, indent=4, sort_keys=True)
+    )
+    return clean
+
+  logging.warn("{} changed during deploy; keeping the edit".format(
+    dir_str["config_file"]
+  ))
+
+  # the edited config still needs the id, so the next deploy updates the
+  # resource instead of creating another
+  with open(dir_str["config_file"], encoding = "utf8") as c:
+    try:
+      edited = json.load(c)
+    except ValueError:
+      logging.error("Add id {} to {} before deploying it again".format(
+        resource_id,
+        dir_str["config_file"]
+      ))
+      return False
+
+  if edited.get("id") != resource_id:
+    edited["id"] = resource_id
+    _atomic_write(
+      dir_str["config_file"],
+      lambda c: json.dump(edited, c, indent=4, sort_keys=True)
+    )
+
+  return False
+
+
+def _fingerprint(dir_str, resource_type):
+  # hash of everything a deploy publishes: the config, the markdown source
+  # and the name and bytes of every image
+  digest = hashlib.sha256(resource_type.encode("utf8"))
+  digest.update(hash_file(dir_str["config_file"]).encode("utf8"))
+  digest.update(hash_file(dir_str["md_file"]).encode("utf8"))
+
+  if dir_str["image_dir_exists"]:
+    for image in sorted(dir_str["images"]):
+      abs_path_image = os_normpath_join(dir_str["image_dir"], image)
+
+      if path.isfile(abs_path_image):
+        digest.update(image.encode("utf8"))
+        digest.update(hash_file(abs_path_image).encode("utf8"))
+
+  return digest.hexdigest()
+
+
+def _read_state(dir_str):
+  if not path.exists(dir_str["state_file"]):
+    return {}
+
+  with open(dir_str["state_file"], encoding = "utf8") as s:
+    try:
+      return json.load(s)
+    except ValueError:
+      logging.warn("Ignoring invalid deploy record {}".format(
+        dir_str["state_file"]
+      ))
+      return {}
+
+
+def _is_unchanged(dir_str, resource_type):
+  # true if the directory is exactly what the last deploy published
+  state = _read_state(dir_str)
+
+  if state.get("fingerprint") is None:
+    return False
+
+  return state["fingerprint"] == _fingerprint(dir_str, resource_type)
+
+
+def _known_updated_at(dir_str, resource):
+  # updated_at returned by the last deploy of this resource, if any
+  state = _read_state(dir_str)
+
+  if state.get("id") is None or state.get("id") != resource.get("id"):
+    return None
+
+  return state.get("updated_at")
+
+
+def _resolve_id(resource, resource_type, catalog):
+  # a config without an id is updated by its slug, if the catalog knows it
+  if "id" in resource:
+    return
+
+  known = None
+  if catalog is not None and resource.get("slug") is not None:
+    known = catalog.get(resource_type, resource["slug"], "slug")
+
+  if known is None:
+    raise AppyException(
+      "Cannot update a resource without an id in its config"
+    )
+
+  resource["id"] = known["id"]
+
+
+def _known_fields(dir_str, resource):
+  # field digests of what the last deploy of this resource sent, if any
+  state = _read_state(dir_str)
+
+  if state.get("id") is None or state.get("id") != resource.get("id"):
+    return None
+
+  return state.get("fields")
+
+
+def _record_deploy(dir_str, resource_type, response, fields = None, clean = True):
+  # written after the config and markdown write-back so the fingerprint
+  # matches the files as they are left on disk. Without a clean write-back,
+  # or if the files change while they are hashed, no fingerprint is kept so
+  # that the next deploy publishes the edit
+  published = response[resource_type][0]
+
+  written = _read_stats(dir_str)
+  fingerprint = _fingerprint(dir_str, resource_type) if clean else None
+
+  if _read_stats(dir_str) != written:
+    fingerprint = None
+
+  state = _read_state(dir_str)
+  state.update({
+    "fingerprint": fingerprint,
+    "id": published.get("id"),
+    "updated_at": published.get("updated_at"),
+    "fields": fields,
+    # the config and markdown as the deploy left them
+    "written": written if fingerprint is not None else None
+  })
+
+  _atomic_write(
+    dir_str["state_file"],
+    lambda s: json.dump(state, s, indent=4, sort_keys=True)
+  )
+
+
+def _deploy(
+  resource_dir,
+  resource_type,
+  base_url,
+  transport,
+  update=False,
+  image_workers=4,
+  image_store=None,
+  force=False,
+  renderer=None,
+  diff=False,
+  catalog=None
+):
+  singular = get_singular(resource_type)
+
+  logging.info(
+    "Using {resource_dir} as {singular} directory".format(
+      resource_dir = resource_dir,
+      singular = singular
+    )
+  )
+
+  dir_str = get_dir_structure(resource_dir)
+
+  # taken before anything reads the files, to tell edits made during the
+  # deploy from its own write-back
+  read = _read_stats(dir_str)
+
+  if not force and _is_unchanged(dir_str, resource_type):
+    logging.info(
+      "{} unchanged since last deploy; skipping".format(dir_str["abs_path"])
+    )
+    return None
+
+  resource, text = _read_resource(dir_str)
+
+  if update:
+    _resolve_id(resource, resource_type, catalog)
 
-  html = markdown(text)
+  # upload images
+  images = _find_images(dir_str, resource, text, singular)
+  urls = _upload_images(
+    images,
+    base_url,
+    transport,
+    image_workers,
+    image_store
+  )
+
+  text = _replace_images(images, urls, resource, text)
+
+  html = _render(text, renderer)
   resource.update({"html": html})
 
   if not update:
-    response = _create(resource, base_url, session, resource_type)
+    response = _create(resource, base_url, transport, resource_type, catalog)
   else:
     response = _update(
       resource,
       resource["id"],
       "id",
       base_url,
-      session,
-      resource_type
+      transport,
+      resource_type,
+      _known_updated_at(dir_str, resource),
+      diff,
+      _known_fields(dir_str, resource) if diff else None,
+      catalog
     )
 
-  with open(dir_str["md_file"], "w", encoding = "utf8") as m:
-    m.write(text)
+  # digests of the full resource as sent, before write-back drops the html
+  fields = _field_digests(resource)
 
-  resource.update({"id": response[resource_type][0]["id"]})
-  resource.pop("html", None)
+  clean = _write_back(dir_str, resource, text, response, resource_type, read)
+  _record_deploy(dir_str, resource_type, response, fields, clean)
 
-  with open(dir_str["config_file"], "w", encoding = "utf8") as c:
-    json.dump(resource, c, indent=4, sort_keys=True)
-  
   logging.info("Post successfully created")
 
   return response
+
+
+def find_resource_dirs(root):
+
+  """
+  Returns every post or page directory under `root`.
+
+  A directory is a post or page directory if it contains `<name>.config` and
+  `<name>.md`, where `<name>` is the directory's own name (see
+  `get_dir_structure`). Directories below a post or page directory are not
+  searched.
+
+  Parameters
+  ----------
+  root : str
+    Directory to search
+  """
+
+  resource_dirs = []
+
+  for dir_path, dir_names, file_names in walk(path.abspath(root)):
+    base_name = path.basename(dir_path)
+
+    if (
+      base_name + ".config" in file_names and
+      base_name + ".md" in file_names
+    ):
+      resource_dirs.append(path.normpath(dir_path))
+      dir_names[:] = []
+    else:
+      dir_names.sort()
+
+  return resource_dirs
+
+
+def _deploy_one(
+  resource_dir,
+  resource_type,
+  base_url,
+  transport,
+  update,
+  image_workers,
+  image_store,
+  force,
+  renderer,
+  diff,
+  catalog
+):
+  # deploy a single directory and capture the outcome instead of raising
+  result = {
+    "dir": resource_dir,
+    "ok": False,
+    "skipped": False,
+    "response": None,
+    "error": None
+  }
+
+  try:
+    if update is None:
+      with open(
+        os_normpath_join(resource_dir, path.basename(resource_dir) + ".config"),
+        encoding = "utf8"
+      ) as c:
+        config = json.load(c)
+
+      resource_update = "id" in config or (
+        catalog is not None and
+        config.get("slug") is not None and
+        catalog.get(resource_type, config["slug"], "slug") is not None
+      )
+    else:
+      resource_update = update
+
+    result["response"] = _deploy(
+      resource_dir,
+      resource_type,
+      base_url,
+      transport,
+      resource_update,
+      image_workers,
+      image_store,
+      force,
+      renderer,
+      diff,
+      catalog
+    )
+    result["skipped"] = result["response"] is None
+    result["ok"] = True
+  except Exception as e:
+    logging.error("Deploy of {} failed: {}".format(resource_dir, e))
+    result["error"] = e
+
+  return result
+
+
+def deploy_many(
+  self,
+  root = ".",
+  resource_type = "posts",
+  update = None,
+  workers = 4,
+  image_workers = 4,
+  force = False,
+  diff = False,
+  git = False
+):
+
+  """
+  Create or update every post or page directory under a root directory.
+
+  Directories are found with `find_resource_dirs` and deployed concurrently
+  on a pool of `workers` threads sharing the client's connection pool. A
+  failed directory does not stop the others.
+
+  See README for more details.
+
+  Parameters
+  ----------
+  root : str
+    Directory containing post or page directories at any depth
+  resource_type : str
+    One of 'posts' or 'pages'
+  update : bool, optional
+    If true, update existing resources. If false, create new resources. If
+    None, update resources whose config already has an `id`, or whose slug
+    is in the client's catalog, and create the rest.
+  workers : int, optional
+    Maximum number of directories deployed concurrently
+  image_workers : int, optional
+    Maximum number of images uploaded concurrently by each deploy
+  force : bool, optional
+    If true, deploy directories that are unchanged since their last deploy
+  diff : bool, optional
+    If true, updates send only the fields that changed; see `update_post`
+  git : bool, optional
+    If true, deploy only the directories that git reports as changed since
+    the commit they were last deployed from; `root` must be in a git
+    repository
+
+  Returns
+  -------
+  list
+    One dict per directory deployed, in path order, with keys `dir`, `ok`,
+    `skipped`, `response` and `error`
+  """
+
+  get_singular(resource_type)
+
+  if git:
+    # imported here as git.py builds on this module
+    from .git import _select, _record
+
+    selection = _select(root)
+    resource_dirs = selection["selected"]
+  else:
+    resource_dirs = find_resource_dirs(root)
+
+  logging.info(
+    "Deploying {n} {resource_type} under {root}".format(
+      n = len(resource_dirs),
+      resource_type = resource_type,
+      root = root
+    )
+  )
+
+  with ThreadPoolExecutor(max_workers = max(1, workers)) as executor:
+    futures = [
+      executor.submit(
+        _deploy_one,
+        resource_dir,
+        resource_type,
+        self.base_url,
+        self.transport,
+        update,
+        image_workers,
+        self.image_store,
+        force,
+        self.renderer,
+        diff,
+        self.catalog
+      )
+      for resource_dir in resource_dirs
+    ]
+
+  results = [future.result() for future in futures]
+
+  if git:
+    _record(selection, results)
+
+  return results
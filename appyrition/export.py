@@ -0,0 +1,463 @@
+# export.py
+
+import re
+import json
+import hashlib
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+from os import makedirs, path, replace
+from urllib.parse import urlsplit
+
+from .error import GhostException, AppyException
+from .post_and_page import _get, _iter, _list_params
+from .deploy import (
+  get_singular,
+  get_dir_structure,
+  os_normpath_join,
+  _atomic_write,
+  _record_deploy
+)
+
+
+# fields Ghost manages itself, or that the directory holds elsewhere
+_EXCLUDED = (
+  "html",
+  "mobiledoc",
+  "lexical",
+  "plaintext",
+  "uuid",
+  "comment_id",
+  "url",
+  "excerpt",
+  "reading_time",
+  "created_at",
+  "updated_at",
+  "primary_author",
+  "primary_tag"
+)
+
+# index of what the previous export wrote, kept in each resource type's
+# directory
+_INDEX_FILE = ".export.json"
+
+# resources per page of the listing that decides what to export
+_LISTING_LIMIT = 100
+
+
+def _read_index(type_root):
+  index_file = os_normpath_join(type_root, _INDEX_FILE)
+
+  if not path.exists(index_file):
+    return {}
+
+  with open(index_file, encoding = "utf8") as i:
+    try:
+      return json.load(i)
+    except ValueError:
+      logging.warn("Ignoring invalid export index {}".format(index_file))
+      return {}
+
+
+def _write_index(type_root, index):
+  _atomic_write(
+    os_normpath_join(type_root, _INDEX_FILE),
+    lambda i: json.dump(index, i, indent=4, sort_keys=True)
+  )
+
+
+def _source(resource_json):
+  # the markdown of a post written as a single markdown card, otherwise its
+  # html, which markdown passes through untouched
+  try:
+    mobiledoc = json.loads(resource_json.get("mobiledoc") or "null")
+  except ValueError:
+    mobiledoc = None
+
+  if (
+    isinstance(mobiledoc, dict) and
+    mobiledoc.get("sections") == [[10, 0]] and
+    len(mobiledoc.get("cards", [])) == 1 and
+    mobiledoc["cards"][0][0] in ("markdown", "card-markdown")
+  ):
+    return mobiledoc["cards"][0][1].get("markdown", "")
+
+  return resource_json.get("html") or ""
+
+
+def _image_pattern(site_url):
+  # URLs of images uploaded to the site
+  return re.compile(
+    re.escape(site_url.rstrip("/")) + r"/content/images/[^\s\"'()<>\[\]]+"
+  )
+
+
+def _find_remote_images(site_url, text, resource):
+  # map every image uploaded to the site that the text or the feature image
+  # references to a file name in the images folder
+  pattern = _image_pattern(site_url)
+
+  urls = pattern.findall(text)
+  if resource.get("feature_image") and pattern.fullmatch(resource["feature_image"]):
+    urls.append(resource["feature_image"])
+
+  images = {}
+  taken = set()
+
+  for url in sorted(set(urls)):
+    name = path.basename(urlsplit(url).path)
+
+    # resized variants share their original's name
+    if name in taken or not name:
+      name = "{}-{}".format(
+        hashlib.sha256(url.encode("utf8")).hexdigest()[:8],
+        name or "image"
+      )
+
+    taken.add(name)
+    images[url] = name
+
+  return images
+
+
+def _download_image(url, file, transport):
+  response = transport.request("GET", url, stream = True)
+
+  try:
+    if response.status_code != 200:
+      raise GhostException(response.status_code, [])
+
+    tmp_file = file + ".tmp"
+
+    with open(tmp_file, "wb") as f:
+      for chunk in response.iter_content(64 * 1024):
+        f.write(chunk)
+
+    replace(tmp_file, file)
+  finally:
+    response.close()
+
+
+def _download_images(images, image_dir, transport, workers, force):
+  # download concurrently every image not already in the images folder;
+  # uploaded images never change under the same URL
+  missing = [
+    (url, os_normpath_join(image_dir, name))
+    for url, name in images.items()
+    if force or not path.exists(os_normpath_join(image_dir, name))
+  ]
+
+  if len(missing) == 0:
+    return
+
+  with ThreadPoolExecutor(max_workers = max(1, workers)) as executor:
+    futures = [
+      executor.submit(_download_image, url, file, transport)
+      for url, file in missing
+    ]
+
+  for future in futures:
+    future.result()
+
+
+def _move(old_dir, new_dir):
+  # follow a slug change: move the directory and rename its files so that
+  # downloaded images are kept
+  old_name = path.basename(old_dir)
+  new_name = path.basename(new_dir)
+
+  replace(old_dir, new_dir)
+
+  for extension in (".config", ".md", ".deployed"):
+    old_file = os_normpath_join(new_dir, old_name + extension)
+
+    if path.exists(old_file):
+      replace(old_file, os_normpath_join(new_dir, new_name + extension))
+
+
+def _export_one(
+  resource_json,
+  resource_type,
+  type_root,
+  site_url,
+  transport,
+  image_workers,
+  force,
+  previous
+):
+  resource_dir = os_normpath_join(type_root, resource_json["slug"])
+
+  if previous is not None and previous["slug"] != resource_json["slug"]:
+    old_dir = os_normpath_join(type_root, previous["slug"])
+
+    if path.isdir(old_dir) and not path.exists(resource_dir):
+      logging.info("Moving {} to {}".format(old_dir, resource_dir))
+      _move(old_dir, resource_dir)
+
+  text = _source(resource_json)
+  resource = {k: v for k, v in resource_json.items() if k not in _EXCLUDED}
+
+  images = _find_remote_images(site_url, text, resource)
+
+  if len(images) > 0:
+    image_dir = os_normpath_join(resource_dir, "images")
+    makedirs(image_dir, exist_ok = True)
+    _download_images(images, image_dir, transport, image_workers, force)
+  else:
+    makedirs(resource_dir, exist_ok = True)
+
+  # replaced in a single pass over the same matches that were found, so a
+  # URL that another URL starts with never rewrites part of the longer one
+  text = _image_pattern(site_url).sub(
+    lambda match: "/".join(["images", images[match.group(0)]]),
+    text
+  )
+
+  if resource.get("feature_image") in images:
+    resource["feature_image"] = "/".join([
+      "images",
+      images[resource["feature_image"]]
+    ])
+
+  base_name = path.basename(resource_dir)
+
+  _atomic_write(
+    os_normpath_join(resource_dir, base_name + ".md"),
+    lambda m: m.write(text)
+  )
+  _atomic_write(
+    os_normpath_join(resource_dir, base_name + ".config"),
+    lambda c: json.dump(resource, c, indent=4, sort_keys=True)
+  )
+
+  # the directory now matches the site, so deploys skip it until it changes
+  _record_deploy(
+    get_dir_structure(resource_dir),
+    resource_type,
+    {resource_type: [resource_json]}
+  )
+
+  return resource_dir
+
+
+def _export_batch(
+  ids,
+  resource_type,
+  type_root,
+  base_url,
+  site_url,
+  transport,
+  image_workers,
+  force,
+  index
+):
+  # fetch the content of a batch of resources in one request and export
+  # them one by one, capturing each outcome instead of raising
+  results = []
+
+  try:
+    params = _list_params(
+      filter = "id:[{}]".format(",".join(ids)),
+      fields = None,
+      formats = ["html", "mobiledoc"],
+      order = None,
+      limit = len(ids),
+      params = dict()
+    )
+    resources = _get(None, "id", params, base_url, transport, resource_type)
+    resources = resources[resource_type]
+  except Exception as e:
+    logging.error("Fetching {} {} failed: {}".format(len(ids), resource_type, e))
+    return [
+      {"dir": None, "id": i, "ok": False, "skipped": False, "error": e}
+      for i in ids
+    ]
+
+  for resource_json in resources:
+    result = {
+      "dir": None,
+      "id": resource_json["id"],
+      "ok": False,
+      "skipped": False,
+      "error": None
+    }
+
+    try:
+      result["dir"] = _export_one(
+        resource_json,
+        resource_type,
+        type_root,
+        site_url,
+        transport,
+        image_workers,
+        force,
+        index.get(resource_json["id"])
+      )
+      result["ok"] = True
+    except Exception as e:
+      logging.error("Export of {} failed: {}".format(resource_json["slug"], e))
+      result["error"] = e
+
+    results.append(result)
+
+  # deleted on the site since it was listed
+  fetched = set(r["id"] for r in resources)
+  for resource_id in ids:
+    if resource_id not in fetched:
+      error = AppyException("{} {} was not returned by the site".format(
+        get_singular(resource_type),
+        resource_id
+      ))
+      logging.warn("{}; skipping".format(error))
+      results.append({
+        "dir": None,
+        "id": resource_id,
+        "ok": False,
+        "skipped": True,
+        "error": error
+      })
+
+  return results
+
+
+def export_site(
+  self,
+  root = ".",
+  resource_types = ("posts", "pages"),
+  workers = 8,
+  image_workers = 4,
+  force = False
+):
+
+  """
+  Write every post and page of the site to directories that `deploy_post`,
+  `deploy_page` and `deploy_many` can deploy.
+
+  Each resource is written to `<root>/<resource_type>/<slug>/` as
+  `<slug>.config`, `<slug>.md` and the images it references under `images/`.
+  Only resources whose `updated_at` changed since the previous export are
+  fetched again, in batches, on a pool of `workers` threads.
+
+  See README for more details.
+
+  Parameters
+  ----------
+  root : str
+    Directory to export into
+  resource_types : iterable, optional
+    Any of 'posts' and 'pages'
+  workers : int, optional
+    Maximum number of batches of resources exported concurrently
+  image_workers : int, optional
+    Maximum number of images downloaded concurrently for each resource
+  force : bool, optional
+    If true, export and download everything again
+
+  Returns
+  -------
+  list
+    One dict per resource with keys `dir`, `id`, `ok`, `skipped` and `error`;
+    a resource deleted between the listing and its fetch is skipped but not
+    ok
+  """
+
+  results = []
+
+  for resource_type in resource_types:
+    get_singular(resource_type)
+
+    type_root = os_normpath_join(path.abspath(root), resource_type)
+    makedirs(type_root, exist_ok = True)
+    index = _read_index(type_root)
+
+    listing = list(_iter(
+      _list_params(
+        filter = None,
+        fields = ["id", "slug", "updated_at"],
+        formats = None,
+        order = None,
+        limit = _LISTING_LIMIT,
+        params = dict()
+      ),
+      self.base_url,
+      self.transport,
+      resource_type
+    ))
+
+    changed = []
+    for resource_json in listing:
+      previous = index.get(resource_json["id"])
+      resource_dir = os_normpath_join(type_root, resource_json["slug"])
+
+      if (
+        force or
+        previous is None or
+        previous != {
+          "slug": resource_json["slug"],
+          "updated_at": resource_json["updated_at"]
+        } or
+        not path.isdir(resource_dir)
+      ):
+        changed.append(resource_json["id"])
+      else:
+        results.append({
+          "dir": resource_dir,
+          "id": resource_json["id"],
+          "ok": True,
+          "skipped": True,
+          "error": None
+        })
+
+    removed = set(index) - set(r["id"] for r in listing)
+    for resource_id in removed:
+      logging.warn("{} {} no longer exists on the site; leaving {}".format(
+        get_singular(resource_type),
+        resource_id,
+        os_normpath_join(type_root, index.pop(resource_id)["slug"])
+      ))
+
+    logging.info("Exporting {} of {} {}".format(
+      len(changed),
+      len(listing),
+      resource_type
+    ))
+
+    # small enough batches to keep every worker busy, and few enough
+    # resources per batch to hold their content in memory
+    size = max(1, min(100, -(-len(changed) // max(1, workers))))
+    batches = [changed[i:i + size] for i in range(0, len(changed), size)]
+    listed = {r["id"]: r for r in listing}
+
+    try:
+      with ThreadPoolExecutor(max_workers = max(1, workers)) as executor:
+        futures = [
+          executor.submit(
+            _export_batch,
+            batch,
+            resource_type,
+            type_root,
+            self.base_url,
+            self.site_url,
+            self.transport,
+            image_workers,
+            force,
+            index
+          )
+          for batch in batches
+        ]
+
+      for future in futures:
+        for result in future.result():
+          results.append(result)
+
+          # the listed updated_at is never newer than what was written, so
+          # a resource changed mid-export is fetched again next time
+          if result["ok"]:
+            index[result["id"]] = {
+              "slug": listed[result["id"]]["slug"],
+              "updated_at": listed[result["id"]]["updated_at"]
+            }
+    finally:
+      _write_index(type_root, index)
+
+  return results
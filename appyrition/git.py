@@ -0,0 +1,238 @@
+# git.py
+
+import json
+import logging
+import subprocess
+
+from os import path
+
+from .error import AppyException
+from .image_store import hash_file
+from .deploy import find_resource_dirs, os_normpath_join, _atomic_write
+
+
+# commit each directory under a root was last deployed from, and the digests
+# of its files that differed from that commit, kept in the root
+_COMMITS_FILE = ".deployed-commits.json"
+
+
+def _git(cwd, *args):
+  try:
+    result = subprocess.run(
+      ["git"] + list(args),
+      cwd = cwd,
+      capture_output = True,
+      text = True,
+      check = True
+    )
+  except FileNotFoundError:
+    raise AppyException("git is not installed")
+  except subprocess.CalledProcessError as e:
+    raise AppyException(
+      "git {} failed: {}".format(args[0], e.stderr.strip())
+    )
+
+  return result.stdout
+
+
+def _paths(output):
+  return [p for p in output.split("\0") if p]
+
+
+def _is_resource_dir(resource_dir):
+  base_name = path.basename(resource_dir)
+
+  return (
+    path.isfile(path.join(resource_dir, base_name + ".config")) and
+    path.isfile(path.join(resource_dir, base_name + ".md"))
+  )
+
+
+def _owning_dir(root, file_path):
+  # the post or page directory holding a changed file, if it still exists;
+  # records written by deploys are not changes
+  if file_path.endswith((".deployed", ".tmp", _COMMITS_FILE)):
+    return None
+
+  parts = file_path.split("/")[:-1]
+
+  while parts:
+    resource_dir = os_normpath_join(root, "/".join(parts))
+    if _is_resource_dir(resource_dir):
+      return resource_dir
+    parts.pop()
+
+  return None
+
+
+def _owning_dirs(root, paths):
+  found = set(_owning_dir(root, file_path) for file_path in paths)
+  found.discard(None)
+
+  return found
+
+
+def _digest(root, file_path):
+  file = os_normpath_join(root, file_path)
+  return hash_file(file) if path.isfile(file) else None
+
+
+def _read_commits(root):
+  # every directory's record as {"commit": ..., "files": {path: digest}};
+  # older records held only the commit
+  commits_file = os_normpath_join(root, _COMMITS_FILE)
+
+  if not path.exists(commits_file):
+    return {}
+
+  with open(commits_file, encoding = "utf8") as c:
+    try:
+      records = json.load(c)
+    except ValueError:
+      logging.warn("Ignoring invalid commit record {}".format(commits_file))
+      return {}
+
+  return {
+    resource_dir: (
+      record if isinstance(record, dict)
+      else {"commit": record, "files": {}}
+    )
+    for resource_dir, record in records.items()
+  }
+
+
+def _uncommitted(root):
+  # tracked files that differ from HEAD, and untracked files, in the working
+  # tree the deploy reads
+  untracked = _paths(_git(
+    root, "ls-files", "-z", "--others", "--exclude-standard"
+  ))
+  modified = _paths(_git(
+    root, "diff", "--name-only", "--relative", "-z", "HEAD"
+  ))
+
+  return untracked, modified
+
+
+def _is_commit(root, commit):
+  try:
+    _git(root, "cat-file", "-e", commit + "^{commit}")
+  except AppyException:
+    return False
+
+  return True
+
+
+def _select(root):
+
+  """
+  Returns the directories under `root` that changed since they were last
+  deployed, along with what `_record` needs afterwards.
+
+  A file changed since a directory's recorded commit is not a change if it
+  still has the content it was deployed with. That covers the config and
+  markdown a deploy writes back, and edits deployed before they were
+  committed. Every directory is selected when no commit is recorded yet, or
+  when a recorded commit is no longer known to git, e.g. after a shallow
+  clone.
+  """
+
+  root = path.abspath(root)
+  head = _git(root, "rev-parse", "HEAD").strip()
+  records = _read_commits(root)
+
+  bases = set(r["commit"] for r in records.values() if r["commit"] is not None)
+
+  if len(records) == 0 or not all(_is_commit(root, c) for c in bases):
+    logging.info("No usable deployed commits; selecting every directory")
+    selected = set(find_resource_dirs(root))
+  else:
+    untracked, _ = _uncommitted(root)
+    changed = set(untracked)
+    for base in bases:
+      changed.update(_paths(_git(
+        root, "diff", "--name-only", "--relative", "-z", base
+      )))
+
+    deployed = {}
+    for record in records.values():
+      deployed.update(record["files"])
+
+    # a deployed file also changed if it has since been reverted to the
+    # committed version
+    changed.update(deployed)
+    changed = [
+      file_path for file_path in changed
+      if file_path not in deployed or
+      _digest(root, file_path) != deployed[file_path]
+    ]
+
+    selected = _owning_dirs(root, changed)
+    selected |= set(
+      os_normpath_join(root, d)
+      for d, r in records.items()
+      if r["commit"] is None
+    )
+    selected = set(d for d in selected if _is_resource_dir(d))
+
+  return {
+    "root": root,
+    "head": head,
+    "records": records,
+    "selected": sorted(selected)
+  }
+
+
+def _record(selection, results):
+
+  """
+  Record the commit every directory under the root is now deployed from,
+  with the digests of its files that differ from that commit.
+
+  A failed directory keeps its previous record. Directories that were not
+  selected had no changes, so they move up to HEAD.
+  """
+
+  root = selection["root"]
+  head = selection["head"]
+  previous = selection["records"]
+
+  # read after the deploys wrote back their config and markdown
+  untracked, modified = _uncommitted(root)
+  uncommitted = {}
+  for file_path in untracked + modified:
+    resource_dir = _owning_dir(root, file_path)
+    if resource_dir is not None:
+      uncommitted.setdefault(resource_dir, []).append(file_path)
+
+  records = {}
+
+  for resource_dir, record in previous.items():
+    if _is_resource_dir(os_normpath_join(root, resource_dir)):
+      still = set(uncommitted.get(os_normpath_join(root, resource_dir), []))
+      records[resource_dir] = {
+        "commit": head,
+        "files": {p: d for p, d in record["files"].items() if p in still}
+      }
+
+  for result in results:
+    resource_dir = path.relpath(result["dir"], root).replace(path.sep, "/")
+
+    if not result["ok"]:
+      records[resource_dir] = previous.get(
+        resource_dir,
+        {"commit": None, "files": {}}
+      )
+    else:
+      records[resource_dir] = {
+        "commit": head,
+        "files": {
+          file_path: _digest(root, file_path)
+          for file_path in uncommitted.get(result["dir"], [])
+        }
+      }
+
+  _atomic_write(
+    os_normpath_join(root, _COMMITS_FILE),
+    lambda c: json.dump(records, c, indent=4, sort_keys=True)
+  )
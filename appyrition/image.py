@@ -1,21 +1,170 @@
 # image.py
 
-import requests
+import uuid
 import logging
+from os import fstat
 from mimetypes import MimeTypes
-from .error import GhostException
+from .error import GhostException, AppyException
 from .helpers import url_join
 
 
-def _upload_image(file, ref, base_url, session):
+# building a MimeTypes database reads the system mime.types files, so a single
+# table is built on the first upload and shared by every later one
+_mime_types = None
+
+
+def guess_mime_type(file):
+  global _mime_types
+
+  if _mime_types is None:
+    _mime_types = MimeTypes()
+
+  return _mime_types.guess_type(file)[0]
+
+
+class MultipartFile(object):
+
+  """
+  A multipart/form-data body that streams a file from disk
+
+  The form fields and part headers are encoded up front; the file itself is
+  read in `chunk_size` pieces as the body is sent, so memory use does not
+  depend on the size of the file. The total length is known in advance and
+  sent as `Content-Length`.
+
+  Attributes
+  ----------
+  content_type : str
+    Value for the Content-Type header, including the boundary
+  """
+
+  def __init__(self, file, fields, mime_type=None, chunk_size=64 * 1024):
+
+    """
+    Parameters
+    ----------
+    file : str
+      Path to the file sent as the `file` field
+    fields : dict
+      Other form fields, sent after the file; fields set to None are left out
+    mime_type : str, optional
+      Content type of the file
+    chunk_size : int, optional
+      Number of bytes read from the file at a time
+    """
+
+    boundary = uuid.uuid4().hex
+    self.content_type = "multipart/form-data; boundary={}".format(boundary)
+    self.chunk_size = chunk_size
+
+    # the parts are laid out as requests lays out `files`, the file first and
+    # the fields after it, with quotes and newlines in the file name percent
+    # encoded
+    self._head = (
+      "--{boundary}\r\n"
+      "Content-Disposition: form-data; name=\"file\"; filename=\"{file}\"\r\n"
+      "{content_type}\r\n".format(
+        boundary = boundary,
+        file = file.translate({10: "%0A", 13: "%0D", 34: "%22"}),
+        content_type = (
+          "Content-Type: {}\r\n".format(mime_type) if mime_type else ""
+        )
+      )
+    ).encode("utf8")
+
+    tail = ["\r\n"]
+    for name, value in fields.items():
+      if value is None:
+        continue
+      tail.append(
+        "--{boundary}\r\n"
+        "Content-Disposition: form-data; name=\"{name}\"\r\n\r\n"
+        "{value}\r\n".format(boundary = boundary, name = name, value = value)
+      )
+    tail.append("--{}--\r\n".format(boundary))
+
+    self._tail = "".join(tail).encode("utf8")
+
+    self._file = open(file, "rb")
+    self._file_size = fstat(self._file.fileno()).st_size
+    # the head is sent first, then the file, then the tail once the file is
+    # exhausted
+    self._pending = self._head
+    self._reading_file = True
+
+
+  def __len__(self):
+    return len(self._head) + self._file_size + len(self._tail)
+
+
+  def __enter__(self):
+    return self
+
+
+  def __exit__(self, *exc):
+    self.close()
+
+
+  def __iter__(self):
+    while True:
+      chunk = self.read(self.chunk_size)
+      if not chunk:
+        return
+      yield chunk
+
+
+  def read(self, size=-1):
+
+    """
+    Read the next `size` bytes of the body, fewer at the end of a part.
+    """
+
+    if size is None or size < 0:
+      size = self.chunk_size
+
+    while not self._pending:
+      if not self._reading_file:
+        return b""
+
+      data = self._file.read(size)
+      if data:
+        return data
+
+      self._reading_file = False
+      self._pending = self._tail
+
+    chunk = self._pending[:size]
+    self._pending = self._pending[size:]
+
+    return chunk
+
+
+  def rewind(self):
+
+    """
+    Start the body over from the beginning, so it can be sent again.
+    """
+
+    self._file.seek(0)
+    self._pending = self._head
+    self._reading_file = True
+
+
+  def close(self):
+    self._file.close()
+
+
+def _upload_image(file, ref, base_url, transport):
   url = url_join(base_url, "images", "upload")
 
-  mime_type = MimeTypes().guess_type(file)[0]
+  mime_type = guess_mime_type(file)
   logging.debug("Using image mime type %s", mime_type)
 
-  with open(file, "rb") as image:
-    files = {"file": (file, image, mime_type), "ref": (None, ref, None)}
-    response = requests.post(url, files = files, cookies = session)
+  with MultipartFile(file, {"ref": ref}, mime_type) as body:
+    headers = {"Content-Type": body.content_type}
+    # like a create, an upload is only retried when Ghost cannot have stored
+    # it, as a repeated upload stores a second copy
+    response = transport.post(url, data = body, headers = headers)
 
   if response.status_code != 201:
     raise GhostException(
@@ -41,5 +190,26 @@ def upload_image(self, file, ref):
     A reference for the image useful for finding images after uploads
   """
 
-  response = _upload_image(file, ref, self.base_url, self.session)
+  response = _upload_image(file, ref, self.base_url, self.transport)
   return response
+
+
+def verify_images(self):
+
+  """
+  Evict image store entries whose URLs no longer exist on the site.
+
+  Deploys reuse the URL of any image whose bytes are already in the image
+  store. Run this after deleting images from Ghost so that they are uploaded
+  again on the next deploy.
+
+  Returns
+  -------
+  list
+    Digests of the evicted entries
+  """
+
+  if self.image_store is None:
+    raise AppyException("No image store configured")
+
+  return self.image_store.verify(self.transport)
@@ -0,0 +1,217 @@
+# image_store.py
+
+import json
+import hashlib
+import logging
+import threading
+from os import path, replace
+from datetime import datetime as date
+
+
+def hash_file(file, chunk_size = 1024 * 1024):
+  digest = hashlib.sha256()
+
+  with open(file, "rb") as f:
+    for chunk in iter(lambda: f.read(chunk_size), b""):
+      digest.update(chunk)
+
+  return digest.hexdigest()
+
+
+class ImageStore(object):
+
+  """
+  A persistent, content-addressed manifest of images uploaded to a Ghost site
+
+  Maps the SHA-256 of an image file to the URL Ghost returned when it was
+  uploaded, so deploys can reuse that URL instead of uploading the same bytes
+  again. One manifest file may be shared by several sites; entries are kept
+  separately for each `site_url`.
+
+  Attributes
+  ----------
+  manifest_file : str
+    Path to the JSON manifest file
+  site_url : str
+    URL of the Ghost instance the images were uploaded to
+
+  Methods
+  -------
+  lookup(file)
+    Returns the digest of a file and its uploaded URL, if any
+
+  add(digest, url, ref=None)
+    Record an uploaded image
+
+  evict(digest)
+    Remove an entry so the image is uploaded again on the next deploy
+
+  verify(transport)
+    Evict every entry whose URL no longer resolves
+
+  save()
+    Write the manifest to disk
+  """
+
+  def __init__(self, manifest_file, site_url):
+
+    """
+    Parameters
+    ----------
+    manifest_file : str
+      Path to the JSON manifest file, created on first save
+    site_url : str
+      URL of the Ghost instance the images are uploaded to
+    """
+
+    self.manifest_file = manifest_file
+    self.site_url = site_url
+    self._lock = threading.Lock()
+
+    if path.exists(manifest_file):
+      with open(manifest_file, encoding = "utf8") as m:
+        self._manifest = json.load(m)
+    else:
+      self._manifest = {}
+
+    self._images = self._manifest.setdefault(site_url, {})
+
+
+  def __len__(self):
+    return len(self._images)
+
+
+  def __contains__(self, digest):
+    return digest in self._images
+
+
+  def get(self, digest):
+    with self._lock:
+      entry = self._images.get(digest)
+
+    if entry is None:
+      return None
+
+    return entry["url"]
+
+
+  def lookup(self, file):
+
+    """
+    Returns the content digest of a file and its uploaded URL.
+
+    Parameters
+    ----------
+    file : str
+      Path to image file
+
+    Returns
+    -------
+    tuple
+      `(digest, url)` where `url` is None if the image has not been uploaded
+    """
+
+    digest = hash_file(file)
+    return digest, self.get(digest)
+
+
+  def add(self, digest, url, ref = None):
+
+    """
+    Record an uploaded image.
+
+    Parameters
+    ----------
+    digest : str
+      SHA-256 hex digest of the image file
+    url : str
+      URL returned by Ghost for the upload
+    ref : str, optional
+      Reference the image was uploaded with
+    """
+
+    with self._lock:
+      self._images[digest] = {
+        "url": url,
+        "ref": ref,
+        "uploaded_at": date.now().isoformat()
+      }
+
+
+  def evict(self, digest):
+
+    """
+    Remove an entry so the image is uploaded again on the next deploy.
+
+    Parameters
+    ----------
+    digest : str
+      SHA-256 hex digest of the image file
+    """
+
+    with self._lock:
+      return self._images.pop(digest, None) is not None
+
+
+  def clear(self):
+
+    """
+    Remove every entry for this site.
+    """
+
+    with self._lock:
+      self._images.clear()
+
+
+  def verify(self, transport):
+
+    """
+    Evict every entry whose URL no longer resolves on the site.
+
+    Each URL is checked with a HEAD request; entries answered with a 404 or
+    410 are evicted and the manifest is saved.
+
+    Parameters
+    ----------
+    transport : appyrition.transport.Transport
+      Transport used to check the image URLs
+
+    Returns
+    -------
+    list
+      Digests of the evicted entries
+    """
+
+    with self._lock:
+      entries = list(self._images.items())
+
+    evicted = []
+    for digest, entry in entries:
+      response = transport.request("HEAD", entry["url"], allow_redirects = True)
+
+      if response.status_code in (404, 410):
+        logging.info("Evicting stale image {}".format(entry["url"]))
+        self.evict(digest)
+        evicted.append(digest)
+
+    self.save()
+
+    return evicted
+
+
+  def save(self):
+
+    """
+    Write the manifest to disk.
+
+    The manifest is written to a temporary file and moved into place so that
+    an interrupted save never leaves a truncated manifest behind.
+    """
+
+    tmp_file = self.manifest_file + ".tmp"
+
+    with self._lock:
+      with open(tmp_file, "w", encoding = "utf8") as m:
+        json.dump(self._manifest, m, indent=4, sort_keys=True)
+
+      replace(tmp_file, self.manifest_file)
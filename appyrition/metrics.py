@@ -0,0 +1,209 @@
+# metrics.py
+
+import re
+import threading
+from bisect import bisect_left
+from urllib.parse import urlsplit
+
+
+# upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (
+  0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float("inf")
+)
+
+_object_id = re.compile(r"^[0-9a-f]{24}$")
+
+
+def endpoint(method, url):
+
+  """
+  Returns a low-cardinality name for a request, e.g. 'GET posts/{id}'.
+
+  Admin API paths are taken relative to `/admin/` with resource IDs, slugs
+  and emails replaced by placeholders; any other URL, such as an uploaded
+  image, is named by its first path segment.
+
+  Parameters
+  ----------
+  method : str
+    HTTP method
+  url : str
+    Request URL
+  """
+
+  request_path = urlsplit(url).path
+
+  if "/admin/" not in request_path:
+    first = request_path.strip("/").split("/")[0]
+    return "{} /{}/*".format(method, first) if first else "{} /".format(method)
+
+  segments = request_path.split("/admin/", 1)[1].strip("/").split("/")
+
+  for i, segment in enumerate(segments):
+    if i > 0 and segments[i - 1] in ("slug", "email"):
+      segments[i] = "{" + segments[i - 1] + "}"
+    elif _object_id.match(segment):
+      segments[i] = "{id}"
+
+  return "{} {}".format(method, "/".join(segments))
+
+
+class Metrics(object):
+
+  """
+  An in-process registry of per-endpoint request metrics
+
+  Records, for every endpoint, the number of requests, retries and
+  connection errors, the count of each response status, bytes sent and
+  received, and a latency histogram. Every attempt of a retried request is
+  recorded separately. Safe to share between threads and clients.
+
+  Attributes
+  ----------
+  buckets : tuple
+    Upper bounds in seconds of the latency histogram buckets
+
+  Methods
+  -------
+  record(event)
+    Record one request; used as an after-request hook
+
+  stats()
+    Returns a snapshot of every endpoint's metrics
+
+  reset()
+    Forget everything recorded so far
+  """
+
+  def __init__(self, buckets = LATENCY_BUCKETS):
+
+    """
+    Parameters
+    ----------
+    buckets : tuple, optional
+      Ascending upper bounds in seconds of the latency histogram buckets,
+      ending with infinity
+    """
+
+    self.buckets = tuple(buckets)
+    self._endpoints = {}
+    self._lock = threading.Lock()
+
+
+  def _new_endpoint(self):
+    return {
+      "requests": 0,
+      "retries": 0,
+      "errors": 0,
+      "statuses": {},
+      "bytes_sent": 0,
+      "bytes_received": 0,
+      "latency_sum": 0.0,
+      "latency_min": None,
+      "latency_max": None,
+      "histogram": [0] * len(self.buckets)
+    }
+
+
+  def record(self, event):
+
+    """
+    Record one request.
+
+    Parameters
+    ----------
+    event : dict
+      Request event passed to after-request hooks; see
+      `appyrition.transport.Transport`
+    """
+
+    elapsed = event["elapsed"]
+    bucket = min(bisect_left(self.buckets, elapsed), len(self.buckets) - 1)
+
+    with self._lock:
+      e = self._endpoints.get(event["endpoint"])
+      if e is None:
+        e = self._endpoints[event["endpoint"]] = self._new_endpoint()
+
+      e["requests"] += 1
+      if event["attempt"] > 0:
+        e["retries"] += 1
+
+      if event["error"] is not None:
+        e["errors"] += 1
+      else:
+        e["statuses"][event["status"]] = e["statuses"].get(event["status"], 0) + 1
+
+      e["bytes_sent"] += event["bytes_sent"]
+      e["bytes_received"] += event["bytes_received"]
+
+      e["latency_sum"] += elapsed
+      if e["latency_min"] is None or elapsed < e["latency_min"]:
+        e["latency_min"] = elapsed
+      if e["latency_max"] is None or elapsed > e["latency_max"]:
+        e["latency_max"] = elapsed
+      e["histogram"][bucket] += 1
+
+
+  def _quantile(self, e, q):
+    # upper bound of the bucket holding the q-th quantile, capped by the
+    # largest latency seen
+    rank = q * e["requests"]
+    seen = 0
+
+    for bound, count in zip(self.buckets, e["histogram"]):
+      seen += count
+      if seen >= rank:
+        return min(bound, e["latency_max"])
+
+    return e["latency_max"]
+
+
+  def stats(self):
+
+    """
+    Returns a snapshot of every endpoint's metrics.
+
+    Returns
+    -------
+    dict
+      Maps endpoint names such as 'GET posts/{id}' to dicts with keys
+      `requests`, `retries`, `errors`, `statuses`, `bytes_sent`,
+      `bytes_received` and `latency`. `latency` holds the `mean`, `min`,
+      `max`, estimated `p50`, `p95` and `p99` in seconds, and the `histogram`
+      as a list of `(upper_bound, count)` pairs.
+    """
+
+    with self._lock:
+      snapshot = {}
+
+      for name, e in self._endpoints.items():
+        snapshot[name] = {
+          "requests": e["requests"],
+          "retries": e["retries"],
+          "errors": e["errors"],
+          "statuses": dict(e["statuses"]),
+          "bytes_sent": e["bytes_sent"],
+          "bytes_received": e["bytes_received"],
+          "latency": {
+            "mean": e["latency_sum"] / e["requests"],
+            "min": e["latency_min"],
+            "max": e["latency_max"],
+            "p50": self._quantile(e, 0.5),
+            "p95": self._quantile(e, 0.95),
+            "p99": self._quantile(e, 0.99),
+            "histogram": list(zip(self.buckets, e["histogram"]))
+          }
+        }
+
+    return snapshot
+
+
+  def reset(self):
+
+    """
+    Forget everything recorded so far.
+    """
+
+    with self._lock:
+      self._endpoints.clear()
@@ -1,6 +1,6 @@
 # page.py
 
-from .post_and_page import _get, _create, _delete, _update
+from .post_and_page import _get, _create, _delete, _update, _iter, _list_params
 from .deploy import _deploy
 
 
@@ -30,14 +30,21 @@ def get_page(self, page=None, search_type="id", params=dict()):
     search_type,
     params,
     self.base_url,
-    self.session,
+    self.transport,
     resource_type = "pages"
   )
 
   return response
 
 
-def update_page(self, new_page_json, page, search_type="id"):
+def update_page(
+  self,
+  new_page_json,
+  page,
+  search_type="id",
+  updated_at=None,
+  diff=False
+):
 
   """
   Update a page in place.
@@ -57,6 +64,14 @@ def update_page(self, new_page_json, page, search_type="id"):
     ID or slug used to filter to a specific page
   search_type : str, optional
     Indicator for an ID search or a slug search
+  updated_at : str, optional
+    The `updated_at` of the page as last seen. If known, here or in
+    `new_page_json`, the update is sent without first fetching the page; if
+    Ghost reports a conflict, the page is fetched, merged and sent again.
+  diff : bool, optional
+    Send only the fields of `new_page_json` whose values differ from the
+    page's current ones, plus `updated_at`. No request is sent if no field
+    changed. Needs the page to be fetched first.
   """
 
   response = _update(
@@ -64,13 +79,71 @@ def update_page(self, new_page_json, page, search_type="id"):
     page,
     search_type,
     self.base_url,
-    self.session,
-    resource_type = "pages"
+    self.transport,
+    resource_type = "pages",
+    updated_at = updated_at,
+    diff = diff,
+    catalog = self.catalog
   )
 
   return response
 
 
+def iter_pages(
+  self,
+  filter=None,
+  fields=None,
+  formats=None,
+  order=None,
+  limit=100,
+  params=dict(),
+  prefetch=True
+):
+
+  """
+  Iterates over every page on the site, one page at a time.
+
+  Follows the API's pagination, fetching `limit` pages per request. With
+  `prefetch` true, the default, the next response is fetched on a
+  background thread while the pages of the current one are consumed, so at
+  most two responses are held in memory and the time spent in the loop body
+  overlaps with the next request. With `prefetch` false, each response is
+  only fetched once the previous one is exhausted, so a single response is
+  held at a time and no request is sent until the loop asks for more.
+
+  Use `filter`, `fields`, `formats` and `order` to have the server select and
+  trim pages so that only the data you need is transferred. For example,
+  `fields=["id", "slug", "updated_at"]` lists pages without their content.
+
+  Parameters
+  ----------
+  filter : str, optional
+    NQL filter, e.g. "status:published+tag:news"
+  fields : str or list, optional
+    Fields to return for each page
+  formats : str or list, optional
+    Content formats to return, e.g. "html"
+  order : str, optional
+    Sort order, e.g. "updated_at desc"
+  limit : int, optional
+    Number of pages fetched per request
+  params : dict, optional
+    Additional query params
+  prefetch : bool, optional
+    If true, fetch the next page while the current one is consumed
+  """
+
+  list_params = _list_params(filter, fields, formats, order, limit, params)
+
+  return _iter(
+    list_params,
+    self.base_url,
+    self.transport,
+    resource_type = "pages",
+    prefetch = prefetch
+  )
+
+
 def create_page(self, page_json):
 
   """
@@ -86,7 +159,7 @@ def create_page(self, page_json):
   https://ghost.org/docs/admin-api/#creating-a-post
 
   This package currently only supports uploading pages as HTML. To convert
-  from Markdown to HTML, use `from markdown import markdown`.
+  from Markdown to HTML, use `gh.renderer.render(text)`.
 
   Parameters
   ----------
@@ -97,8 +170,9 @@ def create_page(self, page_json):
   response = _create(
     page_json,
     self.base_url,
-    self.session,
-    resource_type = "pages"
+    self.transport,
+    resource_type = "pages",
+    catalog = self.catalog
   )
 
   return response
@@ -120,14 +194,22 @@ def delete_page(self, page):
   response = _delete(
     page,
     self.base_url,
-    self.session,
-    resource_type = "pages"
+    self.transport,
+    resource_type = "pages",
+    catalog = self.catalog
   )
 
   return response
 
 
-def deploy_page(self, page_dir = ".", update=False):
+def deploy_page(
+  self,
+  page_dir = ".",
+  update=False,
+  image_workers=4,
+  force=False,
+  diff=False
+):
 
   """
   Create or update a page from markdown and config files in a directory.
@@ -140,14 +222,30 @@ def deploy_page(self, page_dir = ".", update=False):
     Directory containing page files
   update : bool
     If true, update an existing page. If false, create new page.
+  image_workers : int, optional
+    Maximum number of images uploaded concurrently
+  force : bool, optional
+    If true, deploy even if nothing changed since the last deploy
+  diff : bool, optional
+    If true, an update sends only the fields that changed since the last
+    deploy from this directory; see `update_page`
+
+  Returns None without deploying if the config, markdown and images are
+  unchanged since the last deploy from this directory.
   """
 
   response = _deploy(
     page_dir,
     "pages",
     self.base_url,
-    self.session,
-    update
+    self.transport,
+    update,
+    image_workers,
+    self.image_store,
+    force,
+    self.renderer,
+    diff,
+    self.catalog
   )
 
   return response
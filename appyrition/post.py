@@ -1,6 +1,6 @@
 # post.py
 
-from .post_and_page import _get, _create, _delete, _update
+from .post_and_page import _get, _create, _delete, _update, _iter, _list_params
 from .deploy import _deploy
 
 
@@ -30,13 +30,68 @@ def get_post(self, post=None, search_type="id", params = dict()):
     search_type,
     params,
     self.base_url,
-    self.session,
+    self.transport,
     resource_type = "posts"
   )
 
   return response
 
 
+def iter_posts(
+  self,
+  filter=None,
+  fields=None,
+  formats=None,
+  order=None,
+  limit=100,
+  params=dict(),
+  prefetch=True
+):
+
+  """
+  Iterates over every post on the site, one post at a time.
+
+  Follows the API's pagination, fetching `limit` posts per request. With
+  `prefetch` true, the default, the next response is fetched on a
+  background thread while the posts of the current one are consumed, so at
+  most two responses are held in memory and the time spent in the loop body
+  overlaps with the next request. With `prefetch` false, each response is
+  only fetched once the previous one is exhausted, so a single response is
+  held at a time and no request is sent until the loop asks for more.
+
+  Use `filter`, `fields`, `formats` and `order` to have the server select and
+  trim posts so that only the data you need is transferred. For example,
+  `fields=["id", "slug", "updated_at"]` lists posts without their content.
+
+  Parameters
+  ----------
+  filter : str, optional
+    NQL filter, e.g. "status:published+tag:news"
+  fields : str or list, optional
+    Fields to return for each post
+  formats : str or list, optional
+    Content formats to return, e.g. "html"
+  order : str, optional
+    Sort order, e.g. "updated_at desc"
+  limit : int, optional
+    Number of posts fetched per request
+  params : dict, optional
+    Additional query params
+  prefetch : bool, optional
+    If true, fetch the next page while the current one is consumed
+  """
+
+  list_params = _list_params(filter, fields, formats, order, limit, params)
+
+  return _iter(
+    list_params,
+    self.base_url,
+    self.transport,
+    resource_type = "posts",
+    prefetch = prefetch
+  )
+
+
 def create_post(self, post_json):
 
   """
@@ -52,7 +107,7 @@ def create_post(self, post_json):
   https://ghost.org/docs/admin-api/#creating-a-post
 
   This package currently only supports uploading posts as HTML. To convert
-  from Markdown to HTML, use `from markdown import markdown`.
+  from Markdown to HTML, use `gh.renderer.render(text)`.
 
   Parameters
   ----------
@@ -63,8 +118,9 @@ def create_post(self, post_json):
   response = _create(
     post_json,
     self.base_url,
-    self.session,
-    resource_type = "posts"
+    self.transport,
+    resource_type = "posts",
+    catalog = self.catalog
   )
 
   
@@ -72,7 +128,14 @@ def create_post(self, post_json):
   return response
 
 
-def update_post(self, new_post_json, post, search_type="id"):
+def update_post(
+  self,
+  new_post_json,
+  post,
+  search_type="id",
+  updated_at=None,
+  diff=False
+):
 
   """
   Update a post in place.
@@ -92,6 +155,14 @@ def update_post(self, new_post_json, post, search_type="id"):
     ID or slug used to filter to a specific post
   search_type : str, optional
     Indicator for an ID search or a slug search
+  updated_at : str, optional
+    The `updated_at` of the post as last seen. If known, here or in
+    `new_post_json`, the update is sent without first fetching the post; if
+    Ghost reports a conflict, the post is fetched, merged and sent again.
+  diff : bool, optional
+    Send only the fields of `new_post_json` whose values differ from the
+    post's current ones, plus `updated_at`. No request is sent if no field
+    changed. Needs the post to be fetched first.
   """
 
   response = _update(
@@ -99,8 +170,11 @@ def update_post(self, new_post_json, post, search_type="id"):
     post,
     search_type,
     self.base_url,
-    self.session,
-    resource_type = "posts"
+    self.transport,
+    resource_type = "posts",
+    updated_at = updated_at,
+    diff = diff,
+    catalog = self.catalog
   )
 
   return response
@@ -122,14 +196,22 @@ def delete_post(self, post):
   response = _delete(
     post,
     self.base_url,
-    self.session,
-    resource_type = "posts"
+    self.transport,
+    resource_type = "posts",
+    catalog = self.catalog
   )
 
   return response
 
 
-def deploy_post(self, post_dir = ".", update=False):
+def deploy_post(
+  self,
+  post_dir = ".",
+  update=False,
+  image_workers=4,
+  force=False,
+  diff=False
+):
 
   """
   Create or update a post from markdown and config files in a directory.
@@ -142,14 +224,30 @@ def deploy_post(self, post_dir = ".", update=False):
     Directory containing post files
   update : bool
     If true, update an existing post. If false, create new post.
+  image_workers : int, optional
+    Maximum number of images uploaded concurrently
+  force : bool, optional
+    If true, deploy even if nothing changed since the last deploy
+  diff : bool, optional
+    If true, an update sends only the fields that changed since the last
+    deploy from this directory; see `update_post`
+
+  Returns None without deploying if the config, markdown and images are
+  unchanged since the last deploy from this directory.
   """
 
   response = _deploy(
     post_dir,
     "posts",
     self.base_url,
-    self.session,
-    update
+    self.transport,
+    update,
+    image_workers,
+    self.image_store,
+    force,
+    self.renderer,
+    diff,
+    self.catalog
   )
 
   return response
@@ -1,12 +1,15 @@
 # post_and_page.py
 
-import requests
+import json
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
 
 from .error import GhostException, AppyException
 from .helpers import url_join
 
 
-def _get(resource, search_type, params, base_url, session, resource_type):
+def _get_url(resource, search_type, base_url, resource_type):
   if search_type not in ("id", "slug"):
     raise ValueError("search_type must be 'id' or 'slug'")
 
@@ -25,7 +28,13 @@ def _get(resource, search_type, params, base_url, session, resource_type):
     else:
       url = url_join(url, "slug", resource)        
 
-  response = requests.get(url, params = params, cookies = session)
+  return url
+
+
+def _get(resource, search_type, params, base_url, transport, resource_type):
+  url = _get_url(resource, search_type, base_url, resource_type)
+
+  response = transport.get(url, params = params)
 
   if response.status_code != 200:
     raise GhostException(
@@ -36,17 +45,75 @@ def _get(resource, search_type, params, base_url, session, resource_type):
   return response.json()
 
 
-def _create(resource_json, base_url, session, resource_type):
+def _list_params(filter, fields, formats, order, limit, params):
+  # translate the first-class listing arguments into Ghost query params
+  list_params = dict(params)
+
+  for key, value in (
+    ("filter", filter),
+    ("fields", fields),
+    ("formats", formats),
+    ("order", order)
+  ):
+    if value is None:
+      continue
+    if not isinstance(value, str):
+      value = ",".join(value)
+    list_params[key] = value
+
+  list_params["limit"] = limit
+
+  return list_params
+
+
+def _next_page(response):
+  pagination = response.get("meta", {}).get("pagination", {})
+  return pagination.get("next")
+
+
+def _iter(list_params, base_url, transport, resource_type, prefetch = True):
+  # yield every resource page by page, fetching the next page in the
+  # background while the caller consumes the current one
+  def fetch(page):
+    page_params = dict(list_params)
+    page_params["page"] = page
+    return _get(None, "id", page_params, base_url, transport, resource_type)
+
+  executor = ThreadPoolExecutor(max_workers = 1) if prefetch else None
+
+  try:
+    response = fetch(1)
+
+    while True:
+      next_page = _next_page(response)
+      upcoming = None
+
+      if next_page is not None and executor is not None:
+        upcoming = executor.submit(fetch, next_page)
+
+      for resource_json in response[resource_type]:
+        yield resource_json
+
+      if next_page is None:
+        break
+
+      if upcoming is not None:
+        response = upcoming.result()
+      else:
+        response = fetch(next_page)
+
+  finally:
+    if executor is not None:
+      executor.shutdown(wait = True, cancel_futures = True)
+
+
+def _create(resource_json, base_url, transport, resource_type, catalog=None):
   url = url_join(base_url, resource_type)
   params = {"source": "html"}
   body = {resource_type: [resource_json]}
 
-  response = requests.post(
-    url,
-    params = params,
-    json = body,
-    cookies = session
-  )
+  response = transport.post(url, params = params, json = body)
+  transport.invalidate(resource_type)
 
   if response.status_code != 201:
     raise GhostException(
@@ -54,7 +121,39 @@ def _create(resource_json, base_url, session, resource_type):
       response.json().get("errors", [])
     )
 
-  return response.json()
+  return _record(catalog, resource_type, response.json())
+
+
+def _record(catalog, resource_type, response_json):
+  # keep the catalog in step with a successful create or update
+  if catalog is not None:
+    for resource_json in response_json[resource_type]:
+      catalog.record(resource_type, resource_json)
+
+  return response_json
+
+
+def _resolve(
+  catalog,
+  new_resource_json,
+  resource,
+  search_type,
+  resource_type,
+  updated_at
+):
+  # an id and updated_at known to the catalog spare the GET an update would
+  # otherwise need; a stale entry ends in a version conflict and a fetch
+  known = None
+  if catalog is not None:
+    known = catalog.get(resource_type, resource, search_type)
+
+  if known is None:
+    return resource, search_type, updated_at
+
+  if updated_at is None and new_resource_json.get("updated_at") is None:
+    updated_at = known["updated_at"]
+
+  return known["id"], "id", updated_at
 
 
 def _update(
@@ -62,17 +161,194 @@ def _update(
   resource,
   search_type,
   base_url,
-  session,
-  resource_type
+  transport,
+  resource_type,
+  updated_at=None,
+  diff=False,
+  baseline=None,
+  catalog=None
 ):
+  # with a known updated_at the PUT goes out straight away; a version
+  # conflict falls back to fetching, merging and retrying. With `diff`, only
+  # fields that differ from the remote state are sent: from `baseline`
+  # digests of that state if given, otherwise from the fetched resource
+  resource, search_type, updated_at = _resolve(
+    catalog,
+    new_resource_json,
+    resource,
+    search_type,
+    resource_type,
+    updated_at
+  )
+  optimistic = None
+
+  if not diff or baseline is not None:
+    optimistic = _optimistic_update(
+      new_resource_json,
+      resource,
+      search_type,
+      base_url,
+      resource_type,
+      updated_at,
+      baseline if diff else None
+    )
+
+  if optimistic is not None:
+    url, body = optimistic
+
+    if _is_empty_update(body, resource_type):
+      logging.info("No fields changed on {}; skipping update".format(resource))
+      return body
+
+    response = transport.put(url, params = {"source": "html"}, json = body)
+    transport.invalidate(resource_type, body[resource_type][0]["id"])
+
+    if response.status_code == 200:
+      return _record(catalog, resource_type, response.json())
+
+    if response.status_code != 409:
+      raise GhostException(
+        response.status_code,
+        response.json().get("errors", [])
+      )
+
+    logging.info(
+      "Update collision on {resource}; retrying with fetched {resource_type}".format(
+        resource = resource,
+        resource_type = resource_type
+      )
+    )
+    new_resource_json = dict(new_resource_json)
+    new_resource_json.pop("updated_at", None)
+
   response = _get(
     resource,
     search_type,
-    dict(),
+    _fetch_params(new_resource_json, diff),
     base_url,
-    session,
+    transport,
     resource_type
   )
+  url, body = _merge_update(
+    new_resource_json,
+    response,
+    resource,
+    search_type,
+    base_url,
+    resource_type,
+    diff
+  )
+
+  if body is None:
+    logging.info("No fields changed on {}; skipping update".format(resource))
+    return _record(catalog, resource_type, response)
+
+  response = transport.put(url, params = {"source": "html"}, json = body)
+  transport.invalidate(resource_type, body[resource_type][0]["id"])
+
+  if response.status_code != 200:
+    raise GhostException(
+      response.status_code,
+      response.json().get("errors", [])
+    )
+
+  return _record(catalog, resource_type, response.json())
+
+
+def _digest(value):
+  return hashlib.sha256(
+    json.dumps(value, sort_keys = True).encode("utf8")
+  ).hexdigest()
+
+
+def _field_digests(resource_json):
+  # digest of every field value, used to tell which fields changed without
+  # keeping the values themselves
+  return {
+    key: _digest(value)
+    for key, value in resource_json.items()
+    if key not in ("id", "updated_at")
+  }
+
+
+def _changed_fields(new_resource_json, digests):
+  return {
+    key: value
+    for key, value in new_resource_json.items()
+    if key not in ("id", "updated_at") and digests.get(key) != _digest(value)
+  }
+
+
+def _is_empty_update(body, resource_type):
+  return set(body[resource_type][0]) <= {"id", "updated_at"}
+
+
+def _fetch_params(new_resource_json, diff):
+  # html and plaintext are only returned when asked for; a diff needs them
+  # to compare against
+  if not diff:
+    return dict()
+
+  formats = [f for f in ("html", "plaintext") if f in new_resource_json]
+
+  return {"formats": ",".join(formats)} if formats else dict()
+
+
+def _strip_read_only(resource_json, resource_type):
+  resource_json.pop("mobiledoc", None)
+
+  if resource_type == "pages":
+    resource_json.pop("comment_id", None)
+    resource_json.pop("uuid", None)
+
+
+def _optimistic_update(
+  new_resource_json,
+  resource,
+  search_type,
+  base_url,
+  resource_type,
+  updated_at,
+  baseline=None
+):
+  # returns the url and body of a PUT that needs no prior GET, or None if
+  # the id or updated_at of the resource is not known; with `baseline`
+  # digests of the remote fields, only changed fields are sent
+  if updated_at is None:
+    updated_at = new_resource_json.get("updated_at")
+
+  if search_type == "id":
+    resource_id = resource
+  else:
+    resource_id = new_resource_json.get("id")
+
+  if updated_at is None or resource_id is None:
+    return None
+
+  if baseline is not None:
+    resource_json = _changed_fields(new_resource_json, baseline)
+  else:
+    resource_json = dict(new_resource_json)
+  resource_json.update({"id": resource_id, "updated_at": updated_at})
+  _strip_read_only(resource_json, resource_type)
+
+  url = url_join(base_url, resource_type, resource_id)
+  body = {resource_type: [resource_json]}
+
+  return url, body
+
+
+def _merge_update(
+  new_resource_json,
+  response,
+  resource,
+  search_type,
+  base_url,
+  resource_type,
+  diff=False
+):
+  # returns the url and body of the PUT; with `diff` the body holds only the
+  # fields that differ from the fetched resource and is None if none do
   resource_json = response[resource_type]
 
   if len(resource_json) > 1:
@@ -84,41 +360,45 @@ def _update(
     )
 
   resource_json = resource_json[0]
-  resource_json.update(new_resource_json)
-  resource_json.pop("mobiledoc", None)
+
+  if diff:
+    changes = _changed_fields(
+      new_resource_json,
+      _field_digests(resource_json)
+    )
+    changes.update({
+      "id": resource_json["id"],
+      "updated_at": resource_json["updated_at"]
+    })
+    _strip_read_only(changes, resource_type)
+
+    if _is_empty_update({resource_type: [changes]}, resource_type):
+      return url_join(base_url, resource_type, resource_json["id"]), None
+
+    resource_json = changes
+  else:
+    resource_json.update(new_resource_json)
 
   if search_type == "id":
     resource_id = resource
   else:
-    resource_id = resource_json["id"]
+    resource_id = response[resource_type][0]["id"]
 
-  if resource_type == "pages":
-    resource_json.pop("comment_id", None)
-    resource_json.pop("uuid", None)
+  _strip_read_only(resource_json, resource_type)
 
   url = url_join(base_url, resource_type, resource_id)
-  params = {"source": "html"}
   body = {resource_type: [resource_json]}
 
-  response = requests.put(
-    url,
-    params = params,
-    json = body,
-    cookies = session
-  )
+  return url, body
 
-  if response.status_code != 200:
-    raise GhostException(
-      response.status_code,
-      response.json().get("errors", [])
-    )
 
-  return response.json()
-
-
-def _delete(post, base_url, session, resource_type):
+def _delete(post, base_url, transport, resource_type, catalog=None):
   url = url_join(base_url, resource_type, post)
 
-  response = requests.delete(url, cookies = session)
+  response = transport.delete(url)
+  transport.invalidate(resource_type, post)
+
+  if catalog is not None and response.status_code in (204, 404):
+    catalog.remove(resource_type, post)
 
   return response
@@ -0,0 +1,358 @@
+# render.py
+
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from os import makedirs, path, replace
+
+# markdown and the process pool machinery are imported on first render so
+# that creating a client stays cheap
+
+
+# converters of a worker process, keyed by extension set
+_process_converters = {}
+
+
+def _convert(salt, extensions, extension_configs, text):
+  # runs in a worker process; each process builds one converter per
+  # extension set and reuses it for every document
+  md = _process_converters.get(salt)
+
+  if md is None:
+    from markdown import Markdown
+    md = Markdown(extensions = extensions, extension_configs = extension_configs)
+    _process_converters[salt] = md
+
+  try:
+    return md.convert(text)
+  finally:
+    md.reset()
+
+
+def _describe(value):
+  # a stable description of a value that is not JSON, such as the slugify
+  # function in an extension's configuration; a plain repr would include its
+  # address, which differs from one process to the next
+  if callable(value):
+    return "{}.{}".format(
+      getattr(value, "__module__", ""),
+      getattr(value, "__qualname__", type(value).__name__)
+    )
+
+  return repr(value)
+
+
+def _extension_key(extension):
+  # an extension given as an instance is identified by its class and the
+  # configuration it was built with
+  if isinstance(extension, str):
+    return extension
+
+  configs = {}
+  if hasattr(extension, "getConfigs"):
+    configs = extension.getConfigs()
+
+  return [_describe(type(extension)), configs]
+
+
+class Renderer(object):
+
+  """
+  A Markdown to HTML renderer with reusable converters and an HTML cache
+
+  Each thread keeps one `markdown.Markdown` instance, built once with the
+  configured extensions and reset between documents, instead of building a
+  new converter for every document. Rendered HTML is cached by the SHA-256 of
+  the source and the extension set, in memory and, if `cache_dir` is given,
+  on disk so that unchanged sources are never rendered twice.
+
+  With `processes` set, cache misses are rendered on a pool of worker
+  processes instead of the calling thread, so rendering is not serialized by
+  the GIL. Threads calling `render` at the same time, such as the workers of
+  `Ghost.deploy_many`, then render on separate cores while uploads and API
+  calls stay on their I/O threads.
+
+  Attributes
+  ----------
+  extensions : list
+    Markdown extensions used by every converter
+  extension_configs : dict
+    Configuration for the extensions
+  cache_dir : str
+    Directory of rendered HTML files, None to cache in memory only
+  max_entries : int
+    Maximum number of documents cached in memory
+  processes : int
+    Number of worker processes used for rendering, None to render on the
+    calling thread
+  hits : int
+    Number of documents served from the cache
+  misses : int
+    Number of documents rendered
+
+  Methods
+  -------
+  render(text)
+    Returns the HTML for a Markdown source
+
+  render_many(texts)
+    Returns the HTML for several Markdown sources, in order
+
+  clear()
+    Evict every in-memory entry
+
+  close()
+    Shut down the worker processes
+  """
+
+  def __init__(
+    self,
+    extensions = None,
+    extension_configs = None,
+    cache_dir = None,
+    max_entries = 1024,
+    processes = None
+  ):
+
+    """
+    Parameters
+    ----------
+    extensions : list, optional
+      Markdown extensions used by every converter
+    extension_configs : dict, optional
+      Configuration for the extensions
+    cache_dir : str, optional
+      Directory of rendered HTML files, created on first write
+    max_entries : int, optional
+      Maximum number of documents cached in memory
+    processes : int, optional
+      Number of worker processes used for rendering; extensions must be
+      given by name or be picklable
+    """
+
+    self.extensions = list(extensions or [])
+    self.extension_configs = dict(extension_configs or {})
+    self.cache_dir = cache_dir
+    self.max_entries = max_entries
+    self.processes = processes
+    self.hits = 0
+    self.misses = 0
+
+    # identifies the extension set and its configuration in every cache key
+    # so that changing either never serves HTML rendered with the old ones
+    self._salt = json.dumps(
+      [
+        [_extension_key(e) for e in self.extensions],
+        self.extension_configs
+      ],
+      sort_keys = True,
+      default = _describe
+    )
+
+    self._entries = OrderedDict()
+    self._lock = threading.Lock()
+    self._local = threading.local()
+    self._pool = None
+
+
+  def __len__(self):
+    return len(self._entries)
+
+
+  def _count(self, hits = 0, misses = 0):
+    # several threads render through one renderer
+    with self._lock:
+      self.hits += hits
+      self.misses += misses
+
+
+  def _converter(self):
+    md = getattr(self._local, "md", None)
+
+    if md is None:
+      from markdown import Markdown
+      md = Markdown(
+        extensions = self.extensions,
+        extension_configs = self.extension_configs
+      )
+      self._local.md = md
+      logging.debug("Created markdown converter")
+
+    return md
+
+
+  def _get_pool(self):
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    with self._lock:
+      if self._pool is None:
+        # workers are spawned rather than forked, since forking a process
+        # that runs I/O threads can copy locks they hold
+        self._pool = ProcessPoolExecutor(
+          max_workers = max(1, self.processes),
+          mp_context = multiprocessing.get_context("spawn")
+        )
+        logging.debug("Created render pool with %s processes", self.processes)
+
+      return self._pool
+
+
+  def _convert(self, text):
+    if self.processes:
+      return self._get_pool().submit(
+        _convert,
+        self._salt,
+        self.extensions,
+        self.extension_configs,
+        text
+      ).result()
+
+    md = self._converter()
+    try:
+      return md.convert(text)
+    finally:
+      md.reset()
+
+
+  def _key(self, text):
+    digest = hashlib.sha256(self._salt.encode("utf8"))
+    digest.update(b"\0")
+    digest.update(text.encode("utf8"))
+    return digest.hexdigest()
+
+
+  def _cache_file(self, key):
+    return path.join(self.cache_dir, key[:2], key + ".html")
+
+
+  def _lookup(self, key):
+    with self._lock:
+      html = self._entries.get(key)
+
+      if html is not None:
+        self._entries.move_to_end(key)
+        return html
+
+    if self.cache_dir is None:
+      return None
+
+    cache_file = self._cache_file(key)
+
+    if not path.exists(cache_file):
+      return None
+
+    with open(cache_file, encoding = "utf8") as h:
+      html = h.read()
+
+    self._store(key, html, write = False)
+
+    return html
+
+
+  def _store(self, key, html, write = True):
+    with self._lock:
+      self._entries[key] = html
+      self._entries.move_to_end(key)
+
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last = False)
+
+    if write and self.cache_dir is not None:
+      cache_file = self._cache_file(key)
+      makedirs(path.dirname(cache_file), exist_ok = True)
+
+      tmp_file = "{}.{}.tmp".format(cache_file, threading.get_ident())
+      with open(tmp_file, "w", encoding = "utf8") as h:
+        h.write(html)
+
+      replace(tmp_file, cache_file)
+
+
+  def render(self, text):
+
+    """
+    Returns the HTML for a Markdown source.
+
+    Parameters
+    ----------
+    text : str
+      Markdown source
+    """
+
+    key = self._key(text)
+    html = self._lookup(key)
+
+    if html is not None:
+      self._count(hits = 1)
+      return html
+
+    self._count(misses = 1)
+
+    html = self._convert(text)
+    self._store(key, html)
+
+    return html
+
+
+  def render_many(self, texts):
+
+    """
+    Returns the HTML for several Markdown sources, in the order given.
+
+    Cache misses are rendered concurrently when `processes` is set.
+
+    Parameters
+    ----------
+    texts : list
+      Markdown sources
+    """
+
+    keys = [self._key(text) for text in texts]
+    results = [self._lookup(key) for key in keys]
+    missing = [i for i, html in enumerate(results) if html is None]
+
+    self._count(len(texts) - len(missing), len(missing))
+
+    if self.processes:
+      n = len(missing)
+      rendered = self._get_pool().map(
+        _convert,
+        [self._salt] * n,
+        [self.extensions] * n,
+        [self.extension_configs] * n,
+        [texts[i] for i in missing]
+      )
+    else:
+      rendered = (self._convert(texts[i]) for i in missing)
+
+    for i, html in zip(missing, rendered):
+      self._store(keys[i], html)
+      results[i] = html
+
+    return results
+
+
+  def clear(self):
+
+    """
+    Evict every in-memory entry. Files in `cache_dir` are kept.
+    """
+
+    with self._lock:
+      self._entries.clear()
+
+
+  def close(self):
+
+    """
+    Shut down the worker processes, if any.
+    """
+
+    with self._lock:
+      pool, self._pool = self._pool, None
+
+    if pool is not None:
+      pool.shutdown(wait = True)
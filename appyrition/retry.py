@@ -0,0 +1,148 @@
+# retry.py
+
+import random
+import logging
+from datetime import datetime as date, timezone
+from email.utils import parsedate_to_datetime
+
+
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+
+
+class RetryPolicy(object):
+
+  """
+  When and how long to wait before retrying a failed request
+
+  Requests answered with one of `statuses`, or that fail with a connection
+  error, are retried up to `max_retries` times. The wait before retry `n` is
+  drawn uniformly from `[0, min(max_backoff, backoff_factor * 2 ** n)]`
+  ("full jitter"), unless the response carries a `Retry-After` header, which
+  is honoured up to `max_retry_after` seconds.
+
+  Only idempotent methods are retried in general. Other requests, such as the
+  POST that creates a post, are retried only when the server cannot have
+  acted on them: a 429 answer, or a connection that was never established.
+
+  Attributes
+  ----------
+  max_retries : int
+    Maximum number of retries per request
+  backoff_factor : float
+    Seconds of the first backoff step
+  max_backoff : float
+    Upper bound in seconds of a computed backoff
+  max_retry_after : float
+    Upper bound in seconds of a wait requested by `Retry-After`
+  statuses : frozenset
+    Response status codes that are retried
+  """
+
+  def __init__(
+    self,
+    max_retries = 3,
+    backoff_factor = 0.5,
+    max_backoff = 30,
+    max_retry_after = 120,
+    statuses = (429, 502, 503, 504)
+  ):
+
+    """
+    Parameters
+    ----------
+    max_retries : int, optional
+      Maximum number of retries per request
+    backoff_factor : float, optional
+      Seconds of the first backoff step
+    max_backoff : float, optional
+      Upper bound in seconds of a computed backoff
+    max_retry_after : float, optional
+      Upper bound in seconds of a wait requested by `Retry-After`
+    statuses : iterable, optional
+      Response status codes that are retried
+    """
+
+    self.max_retries = max_retries
+    self.backoff_factor = backoff_factor
+    self.max_backoff = max_backoff
+    self.max_retry_after = max_retry_after
+    self.statuses = frozenset(statuses)
+
+
+  def is_retryable(self, method, idempotent, status = None, sent = True):
+
+    """
+    Returns true if a failed request may be sent again.
+
+    Parameters
+    ----------
+    method : str
+      HTTP method
+    idempotent : bool
+      Overrides whether the request is idempotent, None to decide by method
+    status : int, optional
+      Response status code, None if the request failed without a response
+    sent : bool, optional
+      False if the request certainly never reached the server
+    """
+
+    if idempotent is None:
+      idempotent = method.upper() in IDEMPOTENT_METHODS
+
+    if status is None:
+      return idempotent or not sent
+
+    if status not in self.statuses:
+      return False
+
+    return idempotent or status == 429
+
+
+  def backoff(self, attempt, headers = None):
+
+    """
+    Returns the number of seconds to wait before retry number `attempt`.
+
+    Parameters
+    ----------
+    attempt : int
+      Zero-based number of the retry
+    headers : dict, optional
+      Headers of the failed response
+    """
+
+    retry_after = _retry_after(headers)
+
+    if retry_after is not None:
+      return min(retry_after, self.max_retry_after)
+
+    cap = min(self.max_backoff, self.backoff_factor * 2 ** attempt)
+    return random.uniform(0, cap)
+
+
+def _retry_after(headers):
+  # seconds requested by a Retry-After header given either as a number of
+  # seconds or as an HTTP date
+  if not headers:
+    return None
+
+  value = headers.get("Retry-After")
+
+  if value is None:
+    return None
+
+  try:
+    return max(0.0, float(value))
+  except ValueError:
+    pass
+
+  try:
+    when = parsedate_to_datetime(value)
+  except (TypeError, ValueError):
+    logging.debug("Ignoring invalid Retry-After header %s", value)
+    return None
+
+  if when.tzinfo is None:
+    when = when.replace(tzinfo = timezone.utc)
+
+  return max(0.0, (when - date.now(timezone.utc)).total_seconds())
@@ -1,6 +1,5 @@
 # site.py
 
-import requests
 from .error import GhostException
 from .helpers import url_join
 
@@ -13,7 +12,7 @@ def get_site(self):
 
   url = url_join(self.base_url, "site")
 
-  response = requests.get(url, cookies = self.session)
+  response = self.transport.get(url)
 
   if response.status_code != 200:
     raise GhostException(
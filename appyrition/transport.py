@@ -0,0 +1,290 @@
+# transport.py
+
+import time
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from .metrics import endpoint
+
+
+class Transport(object):
+
+  """
+  A connection-pooled HTTP transport shared by every Admin API call
+
+  Wraps a single `requests.Session` so that connections to the Ghost host are
+  kept alive and reused instead of paying a new TCP and TLS handshake for
+  every request. The session cookie created by `Ghost.login` lives in the
+  transport's cookie jar and is sent automatically on subsequent calls.
+
+  The underlying urllib3 connection pool and cookie jar are safe to share
+  between threads, so one transport can serve concurrent deploys.
+
+  Every attempt of every request runs the `before_request` hooks as
+  `hook(method, url, kwargs)`, where `kwargs` may be modified, and the
+  `after_request` hooks as `hook(event)`. `event` is a dict with keys
+  `method`, `url`, `endpoint` (see `appyrition.metrics.endpoint`), `attempt`
+  (0 for the first try), `status`, `elapsed` in seconds, `bytes_sent`,
+  `bytes_received`, `response` and `error`, the exception raised if the
+  request got no response.
+
+  Attributes
+  ----------
+  pool_size : int
+    Maximum number of pooled connections kept open per host
+  keep_alive : bool
+    If false, every request asks the server to close the connection
+  timeout : float
+    Default timeout in seconds for every request, None to wait forever
+  headers : requests.structures.CaseInsensitiveDict
+    Default headers sent with every request
+  cookies : requests.cookies.RequestsCookieJar
+    Cookies sent with every request, including the login session
+  cache : appyrition.cache.ResponseCache
+    Optional cache that answers GET requests
+  auth : appyrition.auth.TokenAuth
+    Optional authentication applied to every request
+  retry : appyrition.retry.RetryPolicy
+    Optional policy for retrying failed requests
+  before_request : list
+    Hooks called before every request is sent
+  after_request : list
+    Hooks called after every request has finished or failed
+  """
+
+  def __init__(
+    self,
+    pool_size=10,
+    keep_alive=True,
+    timeout=None,
+    cache=None,
+    auth=None,
+    retry=None
+  ):
+
+    """
+    Parameters
+    ----------
+    pool_size : int, optional
+      Maximum number of pooled connections kept open per host
+    keep_alive : bool, optional
+      If false, every request asks the server to close the connection
+    timeout : float, optional
+      Default timeout in seconds for every request
+    cache : appyrition.cache.ResponseCache, optional
+      Cache that answers GET requests, None to disable caching
+    auth : appyrition.auth.TokenAuth, optional
+      Authentication applied to every request
+    retry : appyrition.retry.RetryPolicy, optional
+      Policy for retrying failed requests, None to never retry
+    """
+
+    self.pool_size = pool_size
+    self.keep_alive = keep_alive
+    self.timeout = timeout
+    self.cache = cache
+    self.auth = auth
+    self.retry = retry
+    self.before_request = []
+    self.after_request = []
+
+    session = requests.Session()
+    adapter = HTTPAdapter(
+      pool_connections = pool_size,
+      pool_maxsize = pool_size,
+      pool_block = True
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    if not keep_alive:
+      session.headers["Connection"] = "close"
+
+    session.auth = auth
+
+    self._session = session
+    logging.debug("Created transport with pool size %s", pool_size)
+
+
+  @property
+  def headers(self):
+    return self._session.headers
+
+
+  @property
+  def cookies(self):
+    return self._session.cookies
+
+
+  def request(self, method, url, idempotent=None, **kwargs):
+
+    """
+    Send a request through the pooled session, retrying it according to the
+    retry policy.
+
+    A streamed body with a `rewind` method is rewound before every retry.
+
+    Parameters
+    ----------
+    method : str
+      HTTP method
+    url : str
+      Request URL
+    idempotent : bool, optional
+      Whether the request may be repeated safely, None to decide by method
+    **kwargs
+      Passed through to `requests.Session.request`
+    """
+
+    kwargs.setdefault("timeout", self.timeout)
+
+    if self.retry is None:
+      return self._send(method, url, 0, kwargs)
+
+    attempt = 0
+    while True:
+      try:
+        response = self._send(method, url, attempt, kwargs)
+      except (requests.ConnectionError, requests.Timeout) as e:
+        if (
+          attempt >= self.retry.max_retries or
+          not self.retry.is_retryable(method, idempotent, sent = _was_sent(e))
+        ):
+          raise
+        wait = self.retry.backoff(attempt)
+        reason = e
+      else:
+        if (
+          attempt >= self.retry.max_retries or
+          not self.retry.is_retryable(method, idempotent, response.status_code)
+        ):
+          return response
+        wait = self.retry.backoff(attempt, response.headers)
+        reason = response.status_code
+
+      logging.info(
+        "{method} {url} failed ({reason}); retrying in {wait:.2f}s".format(
+          method = method,
+          url = url,
+          reason = reason,
+          wait = wait
+        )
+      )
+      time.sleep(wait)
+
+      data = kwargs.get("data")
+      if hasattr(data, "rewind"):
+        data.rewind()
+
+      attempt += 1
+
+
+  def _send(self, method, url, attempt, kwargs):
+    for hook in self.before_request:
+      hook(method, url, kwargs)
+
+    response = None
+    error = None
+    start = time.perf_counter()
+
+    try:
+      response = self._session.request(method, url, **kwargs)
+      return response
+    except Exception as e:
+      error = e
+      raise
+    finally:
+      if self.after_request:
+        event = {
+          "method": method,
+          "url": url,
+          "endpoint": endpoint(method, url),
+          "attempt": attempt,
+          "status": response.status_code if response is not None else None,
+          "elapsed": time.perf_counter() - start,
+          "bytes_sent": 0,
+          "bytes_received": 0,
+          "response": response,
+          "error": error
+        }
+
+        if response is not None:
+          event["bytes_sent"] = _body_length(response.request.body)
+          if kwargs.get("stream"):
+            event["bytes_received"] = int(
+              response.headers.get("Content-Length", 0)
+            )
+          else:
+            event["bytes_received"] = len(response.content)
+
+        for hook in self.after_request:
+          hook(event)
+
+
+  def get(self, url, **kwargs):
+    if self.cache is not None:
+      return self.cache.get(self, url, **kwargs)
+
+    return self.request("GET", url, **kwargs)
+
+
+  def post(self, url, **kwargs):
+    return self.request("POST", url, **kwargs)
+
+
+  def put(self, url, **kwargs):
+    return self.request("PUT", url, **kwargs)
+
+
+  def delete(self, url, **kwargs):
+    return self.request("DELETE", url, **kwargs)
+
+
+  def invalidate(self, resource_type, resource_id=None):
+
+    """
+    Evict cached responses made stale by a write to a resource.
+
+    Parameters
+    ----------
+    resource_type : str
+      e.g. 'posts' or 'pages'
+    resource_id : str, optional
+      ID of the created, updated or deleted resource
+    """
+
+    if self.cache is not None:
+      self.cache.invalidate(resource_type, resource_id)
+
+
+  def close(self):
+
+    """
+    Close all pooled connections.
+    """
+
+    self._session.close()
+
+
+def _body_length(body):
+  if body is None:
+    return 0
+
+  if isinstance(body, str):
+    return len(body.encode("utf8"))
+
+  try:
+    return len(body)
+  except TypeError:
+    return 0
+
+
+def _was_sent(error):
+  # false if the request failed before a connection to the server existed
+  if isinstance(error, requests.ConnectTimeout):
+    return False
+
+  reason = getattr(error.args[0], "reason", None) if error.args else None
+  return not isinstance(reason, NewConnectionError)
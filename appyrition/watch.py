@@ -0,0 +1,381 @@
+# watch.py
+
+import os
+import time
+import logging
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from os import path
+
+from .deploy import (
+  find_resource_dirs,
+  get_dir_structure,
+  get_singular,
+  _deploy_one,
+  _read_state
+)
+from .image_store import ImageStore
+
+
+def _snapshot(resource_dir):
+  # size and modification time of every file a deploy reads, or None if the
+  # directory is gone
+  name = path.basename(resource_dir)
+  entries = []
+
+  try:
+    for file_name in (name + ".md", name + ".config"):
+      stat = os.stat(path.join(resource_dir, file_name))
+      entries.append((file_name, stat.st_mtime_ns, stat.st_size))
+  except FileNotFoundError:
+    return None
+
+  image_dir = path.join(resource_dir, "images")
+
+  # os.walk yields nothing for a missing folder
+  for dir_path, _, file_names in os.walk(image_dir):
+    for file_name in file_names:
+      if file_name.endswith(".tmp"):
+        continue
+
+      file_path = path.join(dir_path, file_name)
+
+      try:
+        stat = os.stat(file_path)
+      except FileNotFoundError:
+        continue
+
+      file_name = path.relpath(file_path, resource_dir)
+      entries.append((file_name, stat.st_mtime_ns, stat.st_size))
+
+  return tuple(sorted(entries))
+
+
+def _expected(resource_dir, before, result):
+  # the snapshot a deploy that started from `before` leaves behind if
+  # nothing else touched the directory meanwhile, None if the deploy kept an
+  # edit made while it ran
+  if not result["ok"] or result["skipped"]:
+    return before
+
+  name = path.basename(resource_dir)
+  written = _read_state(get_dir_structure(resource_dir)).get("written")
+
+  if written is None:
+    return None
+
+  # only the config and markdown are written back
+  left = {
+    name + ".config": tuple(written["config_file"]),
+    name + ".md": tuple(written["md_file"])
+  }
+
+  expected = []
+  for entry in before:
+    if entry[0] in left:
+      entry = (entry[0],) + left[entry[0]]
+    expected.append(entry)
+
+  return tuple(sorted(expected))
+
+
+class Watcher(object):
+
+  """
+  Redeploys post or page directories as they change
+
+  Polls every directory under `roots` and redeploys a directory once its
+  markdown, config or images have changed and then stayed unchanged for
+  `debounce` seconds, so a burst of saves causes a single deploy. Saves that
+  leave the content as it was last deployed are skipped without a request.
+  Every deploy reuses the client's connections, renderer and image store,
+  and sends only the fields that changed. A directory edited while it is
+  being deployed keeps the edit and is deployed again once it settles.
+
+  ```
+  watcher = Watcher(gh, ["posts"])
+  threading.Thread(target = watcher.run).start()
+  ...
+  watcher.stop()
+  ```
+
+  Attributes
+  ----------
+  ghost : appyrition.Ghost
+    Client the directories are deployed with
+  roots : list
+    Directories containing post or page directories at any depth
+  resource_type : str
+    One of 'posts' or 'pages'
+  interval : float
+    Seconds between polls
+  debounce : float
+    Seconds a directory must stay unchanged before it is deployed
+  image_store : appyrition.image_store.ImageStore
+    Manifest of uploaded images, so unchanged images are not uploaded again
+
+  Methods
+  -------
+  poll()
+    Check every directory once and deploy those that are ready
+
+  run()
+    Poll until `stop()` is called
+
+  stop()
+    Stop a running watcher
+  """
+
+  def __init__(
+    self,
+    ghost,
+    roots,
+    resource_type = "posts",
+    interval = 0.2,
+    debounce = 0.3,
+    workers = 4,
+    image_workers = 4,
+    on_deploy = None,
+    image_store = None
+  ):
+
+    """
+    Parameters
+    ----------
+    ghost : appyrition.Ghost
+      Client the directories are deployed with
+    roots : str or list
+      One or more directories containing post or page directories
+    resource_type : str, optional
+      One of 'posts' or 'pages'
+    interval : float, optional
+      Seconds between polls
+    debounce : float, optional
+      Seconds a directory must stay unchanged before it is deployed
+    workers : int, optional
+      Maximum number of directories deployed concurrently
+    image_workers : int, optional
+      Maximum number of images uploaded concurrently by each deploy
+    on_deploy : callable, optional
+      Called with the result of every deploy; see `deploy_many` for its keys
+    image_store : str or appyrition.image_store.ImageStore, optional
+      Manifest of uploaded images, or the path to one; defaults to the
+      client's image store. Without either, every deploy uploads its images
+      again
+    """
+
+    get_singular(resource_type)
+
+    self.ghost = ghost
+    self.roots = [roots] if isinstance(roots, str) else list(roots)
+    self.resource_type = resource_type
+    self.interval = interval
+    self.debounce = debounce
+    self.workers = workers
+    self.image_workers = image_workers
+    self.on_deploy = on_deploy
+
+    if image_store is None:
+      image_store = ghost.image_store
+    elif isinstance(image_store, str):
+      image_store = ImageStore(image_store, ghost.site_url)
+
+    if image_store is None:
+      logging.warn(
+        "No image store; every deploy uploads its images again"
+      )
+    self.image_store = image_store
+
+    self._snapshots = None
+    self._pending = {}
+    self._stop = threading.Event()
+
+
+  def _scan(self):
+    snapshots = {}
+
+    for root in self.roots:
+      for resource_dir in find_resource_dirs(root):
+        snapshot = _snapshot(resource_dir)
+        if snapshot is not None:
+          snapshots[resource_dir] = snapshot
+
+    return snapshots
+
+
+  def _deploy(self, resource_dir):
+    result = _deploy_one(
+      resource_dir,
+      self.resource_type,
+      self.ghost.base_url,
+      self.ghost.transport,
+      None,
+      self.image_workers,
+      self.image_store,
+      False,
+      self.ghost.renderer,
+      True,
+      self.ghost.catalog
+    )
+
+    if result["skipped"]:
+      logging.info("{} unchanged; nothing to deploy".format(resource_dir))
+    elif result["ok"]:
+      logging.info("Deployed {}".format(resource_dir))
+
+    if self.on_deploy is not None:
+      self.on_deploy(result)
+
+    return result
+
+
+  def poll(self):
+
+    """
+    Check every directory once and deploy those whose changes have settled.
+
+    The first poll only records the current state of every directory.
+
+    Returns
+    -------
+    list
+      Results of the deploys made, see `deploy_many`
+    """
+
+    now = time.monotonic()
+    snapshots = self._scan()
+
+    if self._snapshots is None:
+      self._snapshots = snapshots
+      return []
+
+    for resource_dir, snapshot in snapshots.items():
+      if snapshot != self._snapshots.get(resource_dir):
+        # restart the debounce on every change
+        self._pending[resource_dir] = now
+
+    for resource_dir in list(self._pending):
+      if resource_dir not in snapshots:
+        del self._pending[resource_dir]
+
+    self._snapshots = snapshots
+
+    ready = [
+      resource_dir
+      for resource_dir, changed_at in self._pending.items()
+      if now - changed_at >= self.debounce
+    ]
+
+    if len(ready) == 0:
+      return []
+
+    for resource_dir in ready:
+      del self._pending[resource_dir]
+
+    with ThreadPoolExecutor(max_workers = max(1, self.workers)) as executor:
+      results = list(executor.map(self._deploy, ready))
+
+    # the deploys wrote back their config and markdown, which is not another
+    # change; anything else that changed while they ran is deployed again
+    # once it settles
+    changed_at = time.monotonic()
+
+    for resource_dir, result in zip(ready, results):
+      snapshot = _snapshot(resource_dir)
+      if snapshot is None:
+        continue
+
+      if snapshot != _expected(resource_dir, snapshots[resource_dir], result):
+        logging.info("{} changed during deploy".format(resource_dir))
+        self._pending[resource_dir] = changed_at
+
+      self._snapshots[resource_dir] = snapshot
+
+    return results
+
+
+  def run(self):
+
+    """
+    Poll until `stop()` is called.
+    """
+
+    logging.info("Watching {} for changed {}".format(
+      ", ".join(self.roots),
+      self.resource_type
+    ))
+
+    self._stop.clear()
+
+    while not self._stop.is_set():
+      self.poll()
+      self._stop.wait(self.interval)
+
+
+  def stop(self):
+
+    """
+    Stop a running watcher after its current poll.
+    """
+
+    self._stop.set()
+
+
+def watch(
+  self,
+  roots = ".",
+  resource_type = "posts",
+  interval = 0.2,
+  debounce = 0.3,
+  workers = 4,
+  image_workers = 4,
+  on_deploy = None,
+  image_store = None
+):
+
+  """
+  Redeploy post or page directories under one or more roots whenever they
+  change, until interrupted.
+
+  See `appyrition.watch.Watcher` and README for more details.
+
+  Parameters
+  ----------
+  roots : str or list
+    One or more directories containing post or page directories
+  resource_type : str
+    One of 'posts' or 'pages'
+  interval : float, optional
+    Seconds between polls
+  debounce : float, optional
+    Seconds a directory must stay unchanged before it is deployed
+  workers : int, optional
+    Maximum number of directories deployed concurrently
+  image_workers : int, optional
+    Maximum number of images uploaded concurrently by each deploy
+  on_deploy : callable, optional
+    Called with the result of every deploy
+  image_store : str or appyrition.image_store.ImageStore, optional
+    Manifest of uploaded images, or the path to one; defaults to the
+    client's image store
+  """
+
+  watcher = Watcher(
+    self,
+    roots,
+    resource_type,
+    interval = interval,
+    debounce = debounce,
+    workers = workers,
+    image_workers = image_workers,
+    on_deploy = on_deploy,
+    image_store = image_store
+  )
+
+  try:
+    watcher.run()
+  except KeyboardInterrupt:
+    logging.info("Stopped watching")
+
+  return watcher
@@ -0,0 +1,406 @@
+# webhook.py
+
+import hmac
+import json
+import time
+import logging
+import hashlib
+import threading
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from .error import AppyException
+
+
+# the payload key of each resource type Ghost sends webhooks for
+_RESOURCE_KEYS = {
+  "post": "posts",
+  "page": "pages"
+}
+
+
+def _verify(secret, body, signature, tolerance):
+  # Ghost signs the body followed by the timestamp, sent as
+  # 'sha256=<hex digest>, t=<milliseconds>'
+  if not signature:
+    raise AppyException("Missing X-Ghost-Signature header")
+
+  parts = dict(
+    p.strip().split("=", 1) for p in signature.split(",") if "=" in p
+  )
+
+  if "sha256" not in parts or "t" not in parts:
+    raise AppyException("Invalid X-Ghost-Signature header")
+
+  expected = hmac.new(
+    secret.encode("utf8"),
+    body + parts["t"].encode("utf8"),
+    hashlib.sha256
+  ).hexdigest()
+
+  if not hmac.compare_digest(expected, parts["sha256"]):
+    raise AppyException("Webhook signature does not match")
+
+  if tolerance is not None:
+    try:
+      age = time.time() - int(parts["t"]) / 1000
+    except ValueError:
+      raise AppyException("Invalid X-Ghost-Signature timestamp")
+
+    if abs(age) > tolerance:
+      raise AppyException("Webhook signature expired")
+
+
+def _parse(body):
+  # the resource type, action and resource of a post.* or page.* payload;
+  # Ghost does not name the event, so deletes are told apart by their empty
+  # current state
+  try:
+    payload = json.loads(body)
+  except ValueError:
+    raise AppyException("Webhook body is not JSON")
+
+  if not isinstance(payload, dict):
+    raise AppyException("Webhook body is not a JSON object")
+
+  for key, resource_type in _RESOURCE_KEYS.items():
+    if isinstance(payload.get(key), dict):
+      break
+  else:
+    raise AppyException("Webhook is not a post or page event")
+
+  current = payload[key].get("current") or {}
+  previous = payload[key].get("previous") or {}
+
+  if current:
+    action = "added" if not previous else "edited"
+    resource_json = current
+  else:
+    action = "deleted"
+    resource_json = previous
+
+  if "id" not in resource_json:
+    raise AppyException("Webhook resource has no id")
+
+  return {
+    "resource_type": resource_type,
+    "action": action,
+    "id": resource_json["id"],
+    "slug": resource_json.get("slug"),
+    "previous_slug": previous.get("slug", resource_json.get("slug")),
+    "resource": resource_json,
+    "stale": False
+  }
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+  protocol_version = "HTTP/1.1"
+
+
+  def log_message(self, *args):
+    pass
+
+
+  def _send(self, status):
+    self.send_response(status)
+    self.send_header("Content-Length", "0")
+    self.end_headers()
+
+
+  def do_POST(self):
+    length = int(self.headers.get("Content-Length") or 0)
+    body = self.rfile.read(length) if length else b""
+
+    receiver = self.server.receiver
+
+    try:
+      receiver._check_signature(body, self.headers)
+    except AppyException as e:
+      logging.warn("Rejected webhook: {}".format(e))
+      self._send(401)
+      return
+
+    try:
+      receiver._receive(body)
+    except AppyException as e:
+      logging.warn("Rejected webhook: {}".format(e))
+      self._send(400)
+      return
+    except Exception:
+      logging.exception("Webhook handling failed")
+      self._send(500)
+      return
+
+    self._send(204)
+
+
+class WebhookReceiver(object):
+
+  """
+  Keeps a client's cached responses and catalog up to date from Ghost
+  webhooks
+
+  Add a custom integration webhook for the `post.*` and `page.*` events
+  pointing at the receiver. Every event evicts the cached responses that
+  contain the resource, whether they were fetched by id or by slug, along
+  with cached listings of its type. Creates and edits are written to the
+  catalog and deletes removed from it, so neither needs to be polled. Events
+  delivered out of order are recognised by their `updated_at` and never
+  overwrite a newer catalog entry.
+
+  The receiver can serve HTTP itself on a background thread, or `handle` can
+  be called from any web framework with the raw request body and headers.
+
+  ```
+  receiver = gh.receive_webhooks(port = 8080, secret = "WEBHOOK_SECRET")
+  ...
+  receiver.stop()
+  ```
+
+  Attributes
+  ----------
+  ghost : appyrition.Ghost or appyrition.AsyncGhost
+    Client whose cache and catalog are kept up to date
+  secret : str
+    Secret of the webhooks, used to verify their signature; None accepts
+    unsigned webhooks
+  tolerance : float
+    Seconds a signature stays valid, None to accept any age
+  on_event : callable
+    Called with every event once it has been applied
+  url : str
+    URL the receiver listens on, once started
+  counts : dict
+    Number of events applied for each action, and of rejected requests
+
+  Methods
+  -------
+  handle(body, headers=None)
+    Verify and apply a single webhook request
+
+  start(host="127.0.0.1", port=0)
+    Serve webhooks on a background thread
+
+  stop()
+    Stop serving
+  """
+
+  def __init__(self, ghost, secret = None, on_event = None, tolerance = 300):
+
+    """
+    Parameters
+    ----------
+    ghost : appyrition.Ghost or appyrition.AsyncGhost
+      Client whose cache and catalog are kept up to date
+    secret : str, optional
+      Secret of the webhooks; if given, webhooks without a valid signature
+      are rejected
+    on_event : callable, optional
+      Called with a dict with keys `resource_type`, `action`, `id`, `slug`,
+      `previous_slug`, `resource` and `stale` for every event applied
+    tolerance : float, optional
+      Seconds a signature stays valid, None to accept any age
+    """
+
+    self.ghost = ghost
+    self.secret = secret
+    self.tolerance = tolerance
+    self.on_event = on_event
+    self.url = None
+    self.counts = {"added": 0, "edited": 0, "deleted": 0, "rejected": 0}
+
+    self._counts_lock = threading.Lock()
+    self._httpd = None
+    self._thread = None
+
+
+  def _count(self, key):
+    with self._counts_lock:
+      self.counts[key] += 1
+
+
+  def _apply(self, event):
+    resource_type = event["resource_type"]
+    catalog = self.ghost.catalog
+
+    # cached slug lookups are tagged with the id of the resource they hold,
+    # so this also evicts them under the old slug after a rename
+    invalidate = getattr(self.ghost.transport, "invalidate", None)
+    if invalidate is not None:
+      invalidate(resource_type, event["id"])
+
+    if catalog is None:
+      return
+
+    if event["action"] == "deleted":
+      catalog.remove(resource_type, event["id"])
+      return
+
+    known = catalog.get(resource_type, event["id"])
+    updated_at = event["resource"].get("updated_at")
+
+    if (
+      known is not None and
+      known["updated_at"] is not None and
+      updated_at is not None and
+      known["updated_at"] > updated_at
+    ):
+      event["stale"] = True
+      logging.debug("Ignoring stale webhook for %s", event["id"])
+      return
+
+    catalog.record(resource_type, event["resource"])
+
+
+  def _check_signature(self, body, headers):
+    if self.secret is None:
+      return
+
+    signature = None
+    for key, value in (headers or {}).items():
+      if key.lower() == "x-ghost-signature":
+        signature = value
+
+    try:
+      _verify(self.secret, body, signature, self.tolerance)
+    except AppyException:
+      self._count("rejected")
+      raise
+
+
+  def _receive(self, body):
+    try:
+      event = _parse(body)
+    except AppyException:
+      self._count("rejected")
+      raise
+
+    self._apply(event)
+    self._count(event["action"])
+
+    logging.info("Webhook: {} {} {}".format(
+      event["resource_type"][:-1],
+      event["action"],
+      event["slug"] or event["id"]
+    ))
+
+    if self.on_event is not None:
+      self.on_event(event)
+
+    return event
+
+
+  def handle(self, body, headers = None):
+
+    """
+    Verify and apply a single webhook request.
+
+    Parameters
+    ----------
+    body : bytes
+      Raw request body, as signed by Ghost
+    headers : dict, optional
+      Request headers, of which only `X-Ghost-Signature` is read
+
+    Returns
+    -------
+    dict
+      The event applied, see `on_event`
+
+    Raises
+    ------
+    AppyException
+      If the signature is missing or invalid, or the body is not a post or
+      page event
+    """
+
+    if isinstance(body, str):
+      body = body.encode("utf8")
+
+    self._check_signature(body, headers)
+
+    return self._receive(body)
+
+
+  def start(self, host = "127.0.0.1", port = 0):
+
+    """
+    Serve webhooks on a background thread. Port 0 picks a free port.
+
+    Parameters
+    ----------
+    host : str, optional
+      Address to listen on
+    port : int, optional
+      Port to listen on
+    """
+
+    self._httpd = ThreadingHTTPServer((host, port), _Handler)
+    self._httpd.daemon_threads = True
+    self._httpd.receiver = self
+    self.url = "http://{}:{}".format(host, self._httpd.server_address[1])
+
+    self._thread = threading.Thread(target = self._httpd.serve_forever)
+    self._thread.daemon = True
+    self._thread.start()
+
+    logging.info("Receiving webhooks at {}".format(self.url))
+
+    return self
+
+
+  def stop(self):
+
+    """
+    Stop serving and close the listening socket.
+    """
+
+    if self._httpd is not None:
+      self._httpd.shutdown()
+      self._httpd.server_close()
+      self._httpd = None
+
+
+  def __enter__(self):
+    return self
+
+
+  def __exit__(self, *exc):
+    self.stop()
+
+
+def receive_webhooks(
+  self,
+  host = "127.0.0.1",
+  port = 0,
+  secret = None,
+  on_event = None
+):
+
+  """
+  Serve Ghost webhooks on a background thread, keeping the client's cached
+  responses and catalog up to date without polling.
+
+  See `appyrition.webhook.WebhookReceiver` and README for more details.
+
+  Parameters
+  ----------
+  host : str, optional
+    Address to listen on
+  port : int, optional
+    Port to listen on; 0 picks a free port
+  secret : str, optional
+    Secret of the webhooks; if given, unsigned webhooks are rejected
+  on_event : callable, optional
+    Called with every event once it has been applied
+
+  Returns
+  -------
+  appyrition.webhook.WebhookReceiver
+    The started receiver; call `stop()` to stop it
+  """
+
+  receiver = WebhookReceiver(self, secret = secret, on_event = on_event)
+
+  return receiver.start(host, port)
@@ -0,0 +1,351 @@
+# bench.py
+
+"""
+Benchmarks of appyrition against a local stand-in Ghost Admin API
+
+Runs each workload in a freshly spawned process against a fresh `GhostServer`
+in another process, so that the client's peak memory is its own, and reports
+throughput, per-request p50/p99 latency and the peak RSS of the process that
+ran the client.
+
+Workloads
+---------
+deploy
+  Deploy N post directories with M images each through `deploy_many`
+list
+  Iterate over every post of a site with N posts through `iter_posts`
+update
+  Update N posts concurrently through `batch` with known `updated_at`
+
+```
+python benchmarks/bench.py --posts 200 --images 3 --latency 0.01
+python benchmarks/bench.py --json results.json
+python benchmarks/bench.py --baseline results.json --tolerance 0.2
+```
+
+With `--baseline`, the run fails if any workload has more failed operations,
+or its throughput drops, or its p99 latency or peak RSS grows, by more than
+`--tolerance`.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from appyrition import Ghost
+from ghost_server import GhostServer, CLIENT_ID, CLIENT_SECRET
+
+
+# a forked child starts with a copy of the parent's memory and reports it as
+# its own peak, so every process is started from a fresh interpreter
+_context = multiprocessing.get_context("spawn")
+
+
+def _serve(conn, server_args, seeds):
+  # child process: start a stand-in server and run until told to stop
+  server = GhostServer(**server_args)
+  for resource_type, n in seeds:
+    server.seed(resource_type, n)
+  server.start()
+
+  conn.send(server.url)
+  conn.recv()
+
+  conn.send(server.counts)
+  server.stop()
+
+
+class _ServerProcess(object):
+
+  def __init__(self, server_args, seeds = ()):
+    self.server_args = server_args
+    self.seeds = seeds
+
+
+  def __enter__(self):
+    self._conn, child = _context.Pipe()
+    self._process = _context.Process(
+      target = _serve,
+      args = (child, self.server_args, list(self.seeds)),
+      daemon = True
+    )
+    self._process.start()
+    self.url = self._conn.recv()
+    return self
+
+
+  def __exit__(self, *exc):
+    self._conn.send("stop")
+    self.counts = self._conn.recv()
+    self._process.join()
+
+
+def _percentile(values, q):
+  if not values:
+    return None
+
+  values = sorted(values)
+  return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _peak_rss():
+  # bytes; VmHWM is the high-water mark of this process's own address space,
+  # while ru_maxrss also keeps the peak of the process that started it, as
+  # the exec of a spawned interpreter does not reset it
+  try:
+    with open("/proc/self/status", encoding = "utf8") as f:
+      for line in f:
+        if line.startswith("VmHWM:"):
+          return int(line.split()[1]) * 1024
+  except OSError:
+    pass
+
+  maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # bytes on macOS, kilobytes elsewhere
+  return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def _client(url, args):
+  return Ghost(
+    url,
+    "v3",
+    CLIENT_ID,
+    CLIENT_SECRET,
+    pool_size = args.workers * 2,
+    auth = "token"
+  )
+
+
+def _make_posts(root, n, m, image_size):
+  image = os.urandom(image_size)
+
+  for i in range(n):
+    name = "post-{:05d}".format(i)
+    post_dir = os.path.join(root, name)
+    os.makedirs(os.path.join(post_dir, "images"))
+
+    text = ["# Post {}".format(i), "", "Some *markdown* text. " * 50, ""]
+    for j in range(m):
+      image_name = "image-{}.jpg".format(j)
+      # unique bytes per image so the image store cannot skip uploads
+      with open(os.path.join(post_dir, "images", image_name), "wb") as f:
+        f.write(image[:-8] + i.to_bytes(4, "big") + j.to_bytes(4, "big"))
+      text.append("![Image {}](images/{})".format(j, image_name))
+
+    with open(os.path.join(post_dir, name + ".md"), "w", encoding = "utf8") as f:
+      f.write("\n".join(text))
+
+    with open(os.path.join(post_dir, name + ".config"), "w", encoding = "utf8") as f:
+      json.dump({"title": "Post {}".format(i)}, f)
+
+
+def _work_deploy(gh, args, root):
+  results = gh.deploy_many(
+    root,
+    workers = args.workers,
+    image_workers = args.image_workers
+  )
+
+  return len(results), len([r for r in results if not r["ok"]])
+
+
+def _work_list(gh, args, root):
+  return sum(1 for _ in gh.iter_posts(limit = args.page_size)), 0
+
+
+def _work_update(gh, args, root):
+  posts = list(gh.iter_posts(fields = ["id", "updated_at"], limit = "all"))
+
+  with gh.batch(workers = args.workers) as b:
+    for post in posts:
+      b.update_post(
+        {"custom_excerpt": "Updated"},
+        post["id"],
+        updated_at = post["updated_at"]
+      )
+
+  return len(posts), len([f for f in b.futures if f.exception() is not None])
+
+
+# workload name: (work, posts seeded on the server, whether post directories
+# are generated for it)
+WORKLOADS = {
+  "deploy": (_work_deploy, lambda args: 0, True),
+  "list": (_work_list, lambda args: args.site_posts, False),
+  "update": (_work_update, lambda args: args.posts, False)
+}
+
+
+def _measure(conn, name, url, args, root):
+  # child process: run one workload with a fresh client so that its peak
+  # RSS belongs to that workload alone
+  latencies = []
+
+  gh = _client(url, args)
+  gh.add_hook(after = lambda event: latencies.append(event["elapsed"]))
+
+  work = WORKLOADS[name][0]
+
+  try:
+    start = time.perf_counter()
+    operations, failed = work(gh, args, root)
+    elapsed = time.perf_counter() - start
+  except Exception as e:
+    conn.send({"error": repr(e)})
+    return
+  finally:
+    gh.close()
+
+  conn.send({
+    "workload": name,
+    "operations": operations,
+    "failed": failed,
+    "seconds": elapsed,
+    "throughput": operations / elapsed if elapsed else None,
+    "requests": len(latencies),
+    "retries": sum(s["retries"] for s in gh.stats().values()),
+    "p50": _percentile(latencies, 0.5),
+    "p99": _percentile(latencies, 0.99),
+    "peak_rss": _peak_rss()
+  })
+
+
+def run_workload(name, args, server_args):
+
+  """
+  Run one workload against a fresh stand-in server and return its results.
+  """
+
+  _, seeded, needs_posts = WORKLOADS[name]
+  root = tempfile.mkdtemp(prefix = "appyrition-bench-")
+
+  try:
+    if needs_posts:
+      _make_posts(root, args.posts, args.images, args.image_size)
+
+    with _ServerProcess(server_args, [("posts", seeded(args))]) as server:
+      conn, child = _context.Pipe()
+      process = _context.Process(
+        target = _measure,
+        args = (child, name, server.url, args, root)
+      )
+      process.start()
+      result = conn.recv()
+      process.join()
+
+    if "error" in result:
+      raise RuntimeError("{} failed: {}".format(name, result["error"]))
+
+    result["server"] = server.counts
+    return result
+  finally:
+    shutil.rmtree(root, ignore_errors = True)
+
+
+def _compare(results, baseline, tolerance):
+  # returns a description of every metric that regressed past tolerance
+  previous = {r["workload"]: r for r in baseline}
+  regressions = []
+
+  for result in results:
+    before = previous.get(result["workload"])
+    if before is None:
+      continue
+
+    checks = (
+      ("throughput", lambda new, old: new < old * (1 - tolerance)),
+      ("failed", lambda new, old: new > old),
+      ("p99", lambda new, old: new > old * (1 + tolerance)),
+      ("peak_rss", lambda new, old: new > old * (1 + tolerance))
+    )
+
+    for key, regressed in checks:
+      new, old = result.get(key), before.get(key)
+      if new is not None and old is not None and regressed(new, old):
+        regressions.append("{}: {} {:.4g} -> {:.4g}".format(
+          result["workload"], key, old, new
+        ))
+
+  return regressions
+
+
+def main(argv = None):
+  parser = argparse.ArgumentParser(description = __doc__.strip().split("\n")[0])
+  parser.add_argument("workloads", nargs = "*", default = list(WORKLOADS))
+  parser.add_argument("--posts", type = int, default = 100,
+    help = "posts deployed or updated")
+  parser.add_argument("--images", type = int, default = 2,
+    help = "images per deployed post")
+  parser.add_argument("--image-size", type = int, default = 256 * 1024,
+    help = "bytes per image")
+  parser.add_argument("--site-posts", type = int, default = 5000,
+    help = "posts on the site listed by the list workload")
+  parser.add_argument("--page-size", type = int, default = 100)
+  parser.add_argument("--workers", type = int, default = 8)
+  parser.add_argument("--image-workers", type = int, default = 4)
+  parser.add_argument("--latency", type = float, default = 0.005,
+    help = "seconds the server delays every request by")
+  parser.add_argument("--error-rate", type = float, default = 0,
+    help = "fraction of requests the server fails with a 503")
+  parser.add_argument("--rate-limit", type = float, default = None,
+    help = "requests per second the server admits before answering 429")
+  parser.add_argument("--json", help = "write results to this file")
+  parser.add_argument("--baseline", help = "results file to compare against")
+  parser.add_argument("--tolerance", type = float, default = 0.2)
+  args = parser.parse_args(argv)
+
+  server_args = {
+    "latency": args.latency,
+    "error_rate": args.error_rate,
+    "rate_limit": args.rate_limit
+  }
+
+  results = []
+  print("{:<8} {:>8} {:>7} {:>9} {:>10} {:>9} {:>9} {:>8} {:>11}".format(
+    "workload", "ops", "failed", "seconds", "ops/s", "p50 ms", "p99 ms", "retries",
+    "RSS MiB"
+  ))
+
+  for name in args.workloads:
+    result = run_workload(name, args, server_args)
+    results.append(result)
+
+    print("{:<8} {:>8} {:>7} {:>9.2f} {:>10.1f} {:>9.2f} {:>9.2f} {:>8} {:>11.1f}".format(
+      name,
+      result["operations"],
+      result["failed"],
+      result["seconds"],
+      result["throughput"],
+      result["p50"] * 1000,
+      result["p99"] * 1000,
+      result["retries"],
+      result["peak_rss"] / 2 ** 20
+    ))
+
+  if args.json:
+    with open(args.json, "w", encoding = "utf8") as f:
+      json.dump(results, f, indent = 4, sort_keys = True)
+
+  if args.baseline:
+    with open(args.baseline, encoding = "utf8") as f:
+      regressions = _compare(results, json.load(f), args.tolerance)
+
+    for regression in regressions:
+      print("REGRESSION {}".format(regression))
+
+    if regressions:
+      return 1
+
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
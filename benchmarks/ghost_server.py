@@ -0,0 +1,738 @@
+# ghost_server.py
+
+"""
+A local stand-in for the Ghost Admin API, used by the tests and the benchmarks
+
+Implements the session, posts, pages, images/upload and site endpoints in
+memory, closely enough for appyrition to deploy, list, update and delete
+resources against it. Every request can be slowed down, failed at random, or
+rate limited to reproduce a remote, busy Ghost host. Creates, updates and
+deletes of posts and pages can be sent as signed webhooks, like Ghost's
+`post.*` and `page.*` events.
+
+```
+server = GhostServer(latency = 0.02, error_rate = 0.01, rate_limit = 200)
+server.start()
+gh = Ghost(server.url, "v3", CLIENT_ID, CLIENT_SECRET, auth = "token")
+...
+server.stop()
+```
+"""
+
+import re
+import json
+import time
+import uuid
+import random
+import hmac
+import queue
+import hashlib
+import threading
+import urllib.request
+from datetime import datetime as date, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+import jwt
+
+
+# a valid Admin API key for the stand-in; any key is accepted, but tokens
+# must not have expired
+CLIENT_ID = "5f0c5e1b8f0d2a0001a1b2c3"
+CLIENT_SECRET = "0123456789abcdef" * 4
+
+_RESOURCE_TYPES = ("posts", "pages")
+
+
+def _timestamp():
+  return date.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def _compare_time(updated_at, operator, timestamp):
+  # compares at the second, as Ghost filters do
+  updated_at = updated_at.replace("T", " ")[:19]
+  timestamp = timestamp.replace("T", " ")[:19]
+
+  return updated_at >= timestamp if operator == ">=" else updated_at > timestamp
+
+
+def _slugify(title):
+  slug = "".join(c if c.isalnum() else "-" for c in title.lower())
+  return "-".join(s for s in slug.split("-") if s) or "untitled"
+
+
+class _Store(object):
+
+  # posts and pages kept in creation order, indexed by id and slug
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.resources = {resource_type: {} for resource_type in _RESOURCE_TYPES}
+    self.slugs = {resource_type: {} for resource_type in _RESOURCE_TYPES}
+    self.images = 0
+    # paths of the uploaded images under /content/images/
+    self.image_paths = set()
+
+
+  def create(self, resource_type, resource_json):
+    resource_json = dict(resource_json)
+
+    with self.lock:
+      resource_id = uuid.uuid4().hex[:24]
+      slug = resource_json.get("slug") or _slugify(resource_json.get("title", ""))
+
+      base_slug, n = slug, 1
+      while slug in self.slugs[resource_type]:
+        n += 1
+        slug = "{}-{}".format(base_slug, n)
+
+      now = _timestamp()
+      resource_json.update({
+        "id": resource_id,
+        "uuid": str(uuid.uuid4()),
+        "slug": slug,
+        "status": resource_json.get("status", "draft"),
+        "created_at": now,
+        "updated_at": now
+      })
+
+      self.resources[resource_type][resource_id] = resource_json
+      self.slugs[resource_type][slug] = resource_id
+
+    return dict(resource_json)
+
+
+  def get(self, resource_type, resource_id = None, slug = None):
+    with self.lock:
+      if slug is not None:
+        resource_id = self.slugs[resource_type].get(slug)
+
+      resource_json = self.resources[resource_type].get(resource_id)
+
+    return dict(resource_json) if resource_json is not None else None
+
+
+  def update(self, resource_type, resource_id, resource_json):
+    # returns (status, resource, previous) like the Admin API: 404 if
+    # missing, 409 if updated_at does not match the stored version
+    with self.lock:
+      current = self.resources[resource_type].get(resource_id)
+
+      if current is None:
+        return 404, None, None
+
+      if resource_json.get("updated_at") != current["updated_at"]:
+        return 409, None, None
+
+      updated = dict(current)
+      updated.update(resource_json)
+      updated["id"] = resource_id
+      updated["updated_at"] = _timestamp()
+
+      # keep updated_at strictly increasing within a millisecond
+      if updated["updated_at"] <= current["updated_at"]:
+        updated["updated_at"] = current["updated_at"][:-1] + "1Z"
+
+      if updated["slug"] != current["slug"]:
+        self.slugs[resource_type].pop(current["slug"], None)
+        self.slugs[resource_type][updated["slug"]] = resource_id
+
+      self.resources[resource_type][resource_id] = updated
+
+    return 200, dict(updated), dict(current)
+
+
+  def delete(self, resource_type, resource_id):
+    # returns the deleted resource, None if missing
+    with self.lock:
+      resource_json = self.resources[resource_type].pop(resource_id, None)
+
+      if resource_json is not None:
+        self.slugs[resource_type].pop(resource_json["slug"], None)
+
+    return resource_json
+
+
+  def page(
+    self,
+    resource_type,
+    page,
+    limit,
+    since = None,
+    order = None,
+    ids = None
+  ):
+    # `since` is an (operator, timestamp) pair filtering on updated_at and
+    # `ids` a set of ids to filter on
+    with self.lock:
+      resources = list(self.resources[resource_type].values())
+
+    if ids is not None:
+      resources = [r for r in resources if r["id"] in ids]
+
+    if since is not None:
+      operator, timestamp = since
+      resources = [
+        r for r in resources
+        if _compare_time(r["updated_at"], operator, timestamp)
+      ]
+
+    if order is not None:
+      key, _, direction = order.partition(" ")
+      resources.sort(key = lambda r: r.get(key) or "", reverse = direction == "desc")
+
+    total = len(resources)
+
+    if limit == "all":
+      limit = max(total, 1)
+      page = 1
+
+    pages = max(1, -(-total // limit))
+    selected = resources[(page - 1) * limit:page * limit]
+
+    pagination = {
+      "page": page,
+      "limit": limit,
+      "pages": pages,
+      "total": total,
+      "next": page + 1 if page < pages else None,
+      "prev": page - 1 if page > 1 else None
+    }
+
+    return [dict(r) for r in selected], pagination
+
+
+class _RateLimiter(object):
+
+  # token bucket refilled at `rate` requests per second
+
+  def __init__(self, rate, burst):
+    self.rate = rate
+    self.burst = burst
+    self.tokens = burst
+    self.updated = time.monotonic()
+    self.lock = threading.Lock()
+
+
+  def acquire(self):
+    # returns 0 if the request may proceed, else seconds until it may
+    with self.lock:
+      now = time.monotonic()
+      self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+      self.updated = now
+
+      if self.tokens >= 1:
+        self.tokens -= 1
+        return 0
+
+      return (1 - self.tokens) / self.rate
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+  protocol_version = "HTTP/1.1"
+  # headers and body are written separately; without TCP_NODELAY every
+  # response waits for the client's delayed ACK
+  disable_nagle_algorithm = True
+
+
+  def log_message(self, *args):
+    pass
+
+
+  def setup(self):
+    BaseHTTPRequestHandler.setup(self)
+    self.ghost._count("connections")
+
+
+  @property
+  def ghost(self):
+    return self.server.ghost
+
+
+  def _send(self, status, body = None, headers = None):
+    payload = b"" if body is None else json.dumps(body).encode("utf8")
+    headers = dict(headers or {})
+
+    if status == 200 and self.command == "GET" and body is not None:
+      etag = '"{}"'.format(hashlib.sha1(payload).hexdigest())
+      headers["ETag"] = etag
+
+      if self.headers.get("If-None-Match") == etag:
+        status, payload = 304, b""
+
+    self.send_response(status)
+
+    if payload:
+      self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(payload)))
+    for key, value in headers.items():
+      self.send_header(key, value)
+    self.end_headers()
+
+    if self.command != "HEAD":
+      self.wfile.write(payload)
+
+
+  def _error(self, status, error_type, message):
+    self._send(status, {"errors": [{"type": error_type, "message": message}]})
+
+
+  def _read_body(self):
+    length = int(self.headers.get("Content-Length") or 0)
+    return self.rfile.read(length) if length else b""
+
+
+  def _handle(self):
+    ghost = self.ghost
+    ghost._count()
+
+    split = urlsplit(self.path)
+    query = {k: v[-1] for k, v in parse_qs(split.query).items()}
+
+    # the body is always drained so a rejected request leaves a clean
+    # keep-alive connection
+    body = self._read_body() if self.command in ("POST", "PUT") else b""
+
+    if ghost.latency:
+      time.sleep(ghost.latency)
+
+    if ghost._rate_limiter is not None:
+      wait = ghost._rate_limiter.acquire()
+      if wait:
+        ghost._count("rate_limited")
+        self._send(
+          429,
+          {"errors": [{"type": "TooManyRequestsError", "message": "Slow down"}]},
+          {"Retry-After": "{:.3f}".format(wait)}
+        )
+        return
+
+    if ghost.error_rate and ghost._random.random() < ghost.error_rate:
+      ghost._count("errors")
+      self._error(503, "InternalServerError", "Injected failure")
+      return
+
+    if split.path.startswith("/content/images/"):
+      if self.command not in ("GET", "HEAD"):
+        self._send(405)
+        return
+
+      if split.path not in self.ghost.store.image_paths:
+        self._send(404)
+        return
+
+      # 4 KiB of bytes derived from the path stand in for the image
+      image = hashlib.sha256(split.path.encode("utf8")).digest() * 128
+      self.send_response(200)
+      self.send_header("Content-Type", "image/jpeg")
+      self.send_header("Content-Length", str(len(image)))
+      self.end_headers()
+      if self.command == "GET":
+        self.wfile.write(image)
+      return
+
+    prefix = "/ghost/api/v3/admin/"
+    if not split.path.startswith(prefix):
+      self._error(404, "NotFoundError", "Unknown path")
+      return
+
+    segments = [s for s in split.path[len(prefix):].split("/") if s]
+
+    if segments not in (["session"], ["site"]) and not self._authenticated():
+      self._error(401, "UnauthorizedError", "Missing or expired credentials")
+      return
+
+    try:
+      body_json = json.loads(body) if body and self._is_json() else {}
+    except ValueError:
+      self._error(400, "BadRequestError", "Invalid JSON")
+      return
+
+    self._route(segments, query, body, body_json)
+
+
+  def _authenticated(self):
+    # a session cookie, or an Admin API token that has not expired; any key
+    # is accepted, so the signature is not checked
+    if "ghost-admin-api-session=" in (self.headers.get("Cookie") or ""):
+      return True
+
+    scheme, _, token = (self.headers.get("Authorization") or "").partition(" ")
+    if scheme != "Ghost":
+      return False
+
+    try:
+      jwt.decode(
+        token,
+        options = {
+          "verify_signature": False,
+          "verify_exp": True,
+          "require": ["exp"]
+        }
+      )
+    except jwt.InvalidTokenError:
+      return False
+
+    return True
+
+
+  def _is_json(self):
+    return "json" in (self.headers.get("Content-Type") or "")
+
+
+  def _route(self, segments, query, body, body_json):
+    store = self.ghost.store
+    method = self.command
+
+    if segments == ["session"] and method == "POST":
+      self._send(201, None, {"Set-Cookie": "ghost-admin-api-session=stand-in; Path=/"})
+      return
+
+    if segments == ["site"] and method == "GET":
+      self._send(200, {"site": {
+        "title": "Stand-in Ghost",
+        "url": self.ghost.url,
+        "version": "3.0"
+      }})
+      return
+
+    if segments == ["images", "upload"] and method == "POST":
+      name = uuid.uuid4().hex
+      with store.lock:
+        store.images += 1
+        store.image_paths.add("/content/images/{}.jpg".format(name))
+      # Ghost echoes the `ref` form field back
+      ref = re.search(rb'name="ref"\r\n\r\n(.*?)\r\n', body)
+      self._send(201, {"images": [{
+        "url": "{}/content/images/{}.jpg".format(self.ghost.url, name),
+        "ref": ref.group(1).decode("utf8") if ref else None
+      }]})
+      return
+
+    if not segments or segments[0] not in _RESOURCE_TYPES:
+      self._error(404, "NotFoundError", "Unknown resource")
+      return
+
+    resource_type = segments[0]
+    rest = segments[1:]
+
+    if method == "GET" and not rest:
+      limit = query.get("limit", "15")
+      limit = "all" if limit == "all" else max(1, int(limit))
+      page = max(1, int(query.get("page", "1")))
+      # of Ghost's filter syntax, only updated_at:>'...', >= and id:[...]
+      # are known
+      since, ids = None, None
+      match = re.match(r"^updated_at:(>=|>)'([^']+)'$", query.get("filter", ""))
+      if match:
+        since = match.groups()
+      match = re.match(r"^id:\[([^\]]*)\]$", query.get("filter", ""))
+      if match:
+        ids = set(match.group(1).split(","))
+      resources, pagination = store.page(
+        resource_type,
+        page,
+        limit,
+        since,
+        query.get("order"),
+        ids
+      )
+      resources = [self._fields(r, query) for r in resources]
+      self._send(200, {
+        resource_type: resources,
+        "meta": {"pagination": pagination}
+      })
+      return
+
+    if method == "GET":
+      if rest[0] == "slug" and len(rest) == 2:
+        resource_json = store.get(resource_type, slug = rest[1])
+      else:
+        resource_json = store.get(resource_type, rest[0])
+
+      if resource_json is None:
+        self._error(404, "NotFoundError", "Resource not found")
+      else:
+        self._send(200, {resource_type: [self._fields(resource_json, query)]})
+      return
+
+    if method == "POST" and not rest:
+      resources = body_json.get(resource_type) or [{}]
+      resource_json = store.create(resource_type, resources[0])
+      self.ghost._notify(resource_type, resource_json, {})
+      self._send(201, {resource_type: [resource_json]})
+      return
+
+    if method == "PUT" and len(rest) == 1:
+      resources = body_json.get(resource_type) or [{}]
+      status, resource_json, previous = store.update(
+        resource_type,
+        rest[0],
+        resources[0]
+      )
+
+      if status == 404:
+        self._error(404, "NotFoundError", "Resource not found")
+      elif status == 409:
+        self._error(409, "UpdateCollisionError", "Saving failed! Someone else is editing this post.")
+      else:
+        # like Ghost, previous holds only the attributes that changed
+        self.ghost._notify(resource_type, resource_json, {
+          k: v for k, v in previous.items() if resource_json.get(k) != v
+        })
+        self._send(200, {resource_type: [resource_json]})
+      return
+
+    if method == "DELETE" and len(rest) == 1:
+      resource_json = store.delete(resource_type, rest[0])
+
+      if resource_json is not None:
+        self.ghost._notify(resource_type, {}, resource_json)
+        self._send(204)
+      else:
+        self._error(404, "NotFoundError", "Resource not found")
+      return
+
+    self._error(405, "MethodNotAllowedError", "Method not allowed")
+
+
+  @staticmethod
+  def _fields(resource_json, query):
+    fields = query.get("fields")
+
+    if not fields:
+      return resource_json
+
+    return {k: v for k, v in resource_json.items() if k in fields.split(",")}
+
+
+  do_GET = _handle
+  do_HEAD = _handle
+  do_POST = _handle
+  do_PUT = _handle
+  do_DELETE = _handle
+
+
+class GhostServer(object):
+
+  """
+  An in-memory stand-in for the Ghost Admin API served on localhost
+
+  Attributes
+  ----------
+  url : str
+    Site URL to pass to `Ghost`, available once started
+  latency : float
+    Seconds every request is delayed by
+  error_rate : float
+    Fraction of requests answered with a 503
+  rate_limit : float
+    Requests per second admitted before answering 429, None for no limit
+  store : object
+    The posts and pages held by the server
+  counts : dict
+    Number of connections accepted, requests, injected errors and
+    rate-limited requests
+  webhooks : list
+    (target URL, secret) of every webhook sent on writes
+  """
+
+  def __init__(
+    self,
+    latency = 0,
+    error_rate = 0,
+    rate_limit = None,
+    burst = None,
+    seed = 0
+  ):
+
+    """
+    Parameters
+    ----------
+    latency : float, optional
+      Seconds every request is delayed by
+    error_rate : float, optional
+      Fraction of requests answered with a 503
+    rate_limit : float, optional
+      Requests per second admitted before answering 429
+    burst : int, optional
+      Requests admitted at once before the rate limit applies, defaults to
+      one second's worth
+    seed : int, optional
+      Seed of the random error injection, for repeatable runs
+    """
+
+    self.latency = latency
+    self.error_rate = error_rate
+    self.rate_limit = rate_limit
+    self.store = _Store()
+    self.counts = {
+      "connections": 0,
+      "requests": 0,
+      "errors": 0,
+      "rate_limited": 0,
+      "webhooks": 0,
+      "webhook_errors": 0
+    }
+    self.url = None
+    self.webhooks = []
+
+    self._random = random.Random(seed)
+    self._rate_limiter = None
+    if rate_limit:
+      self._rate_limiter = _RateLimiter(rate_limit, burst or max(1, rate_limit))
+
+    self._counts_lock = threading.Lock()
+    self._httpd = None
+    self._thread = None
+
+    # webhooks are sent one at a time, in the order of the writes
+    self._deliveries = queue.Queue()
+    self._deliverer = None
+
+
+  def _count(self, key = "requests"):
+    with self._counts_lock:
+      self.counts[key] += 1
+
+
+  def add_webhook(self, target_url, secret = None):
+
+    """
+    Send `post.*`/`page.*` webhooks for every write to `target_url`, signed
+    with `secret` as Ghost does.
+    """
+
+    self.webhooks.append((target_url, secret))
+
+    if self._deliverer is None:
+      self._deliverer = threading.Thread(target = self._deliver)
+      self._deliverer.daemon = True
+      self._deliverer.start()
+
+
+  def wait_for_webhooks(self):
+
+    """
+    Block until every queued webhook has been sent.
+    """
+
+    self._deliveries.join()
+
+
+  def _notify(self, resource_type, current, previous):
+    # queued before the response, so a client sees the webhook sent by
+    # `wait_for_webhooks` once its write returns
+    if not self.webhooks:
+      return
+
+    body = json.dumps({
+      resource_type[:-1]: {"current": current, "previous": previous}
+    }).encode("utf8")
+
+    for target_url, secret in self.webhooks:
+      self._deliveries.put((target_url, secret, body))
+
+
+  def _deliver(self):
+    while True:
+      target_url, secret, body = self._deliveries.get()
+      headers = {
+        "Content-Type": "application/json",
+        "User-Agent": "Ghost/3.0.0 (https://github.com/TryGhost/Ghost)"
+      }
+
+      if secret is not None:
+        timestamp = str(int(time.time() * 1000))
+        signature = hmac.new(
+          secret.encode("utf8"),
+          body + timestamp.encode("utf8"),
+          hashlib.sha256
+        ).hexdigest()
+        headers["X-Ghost-Signature"] = "sha256={}, t={}".format(
+          signature,
+          timestamp
+        )
+
+      try:
+        request = urllib.request.Request(target_url, body, headers)
+        urllib.request.urlopen(request, timeout = 5).close()
+        self._count("webhooks")
+      except Exception:
+        self._count("webhook_errors")
+      finally:
+        self._deliveries.task_done()
+
+
+  def seed(self, resource_type, n, html = "<p>Seeded</p>"):
+
+    """
+    Create `n` resources directly in the store, without requests.
+    """
+
+    for i in range(n):
+      self.store.create(resource_type, {
+        "title": "Seeded {} {}".format(resource_type, i),
+        "html": html
+      })
+
+
+  def start(self, host = "127.0.0.1", port = 0):
+
+    """
+    Start serving on a background thread. Port 0 picks a free port.
+    """
+
+    self._httpd = ThreadingHTTPServer((host, port), _Handler)
+    self._httpd.daemon_threads = True
+    self._httpd.ghost = self
+    self.url = "http://{}:{}".format(host, self._httpd.server_address[1])
+
+    self._thread = threading.Thread(target = self._httpd.serve_forever)
+    self._thread.daemon = True
+    self._thread.start()
+
+    return self
+
+
+  def stop(self):
+
+    """
+    Stop serving and close the listening socket.
+    """
+
+    if self._httpd is not None:
+      self._httpd.shutdown()
+      self._httpd.server_close()
+      self._httpd = None
+
+
+  def __enter__(self):
+    return self.start()
+
+
+  def __exit__(self, *exc):
+    self.stop()
+
+
+if __name__ == "__main__":
+  import argparse
+
+  parser = argparse.ArgumentParser(description = __doc__.strip().split("\n")[0])
+  parser.add_argument("--port", type = int, default = 2368)
+  parser.add_argument("--latency", type = float, default = 0)
+  parser.add_argument("--error-rate", type = float, default = 0)
+  parser.add_argument("--rate-limit", type = float, default = None)
+  parser.add_argument("--posts", type = int, default = 0)
+  args = parser.parse_args()
+
+  server = GhostServer(args.latency, args.error_rate, args.rate_limit)
+  server.seed("posts", args.posts)
+  server.start(port = args.port)
+  print("Serving stand-in Ghost Admin API at {}".format(server.url))
+
+  try:
+    server._thread.join()
+  except KeyboardInterrupt:
+    server.stop()
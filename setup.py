@@ -19,5 +19,8 @@ setuptools.setup(
         "PyJWT>=2.0.0",
         "requests>=2.25.1",
         "Markdown>=3.3.3"
-    ]
+    ],
+    extras_require={
+        "async": ["aiohttp>=3.7.0"]
+    }
 )
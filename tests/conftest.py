@@ -0,0 +1,95 @@
+import sys
+import json
+from os import makedirs, path
+
+import pytest
+
+root = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path.insert(0, path.join(root, "benchmarks"))
+
+from ghost_server import GhostServer, CLIENT_ID, CLIENT_SECRET
+
+
+@pytest.fixture
+def server():
+  with GhostServer() as server:
+    yield server
+
+
+@pytest.fixture
+def client(server):
+  # a client of the stand-in server, authenticated with the Admin API key
+  from appyrition import Ghost
+
+  clients = []
+
+  def client(**kwargs):
+    kwargs.setdefault("auth", "token")
+    gh = Ghost(server.url, "v3", CLIENT_ID, CLIENT_SECRET, **kwargs)
+    clients.append(gh)
+    return gh
+
+  yield client
+
+  for gh in clients:
+    gh.close()
+
+
+@pytest.fixture
+def gh(client):
+  return client()
+
+
+@pytest.fixture
+def spy():
+  # wrap a client's transport so `before(method, url, kwargs)` runs before
+  # every request and `after(event)` after it, with the response None when
+  # the request raised
+  def spy(gh, before = None, after = None):
+    request = gh.transport.request
+
+    def spied(method, url, **kwargs):
+      if before:
+        before(method, url, kwargs)
+      response = None
+      try:
+        response = request(method, url, **kwargs)
+        return response
+      finally:
+        if after:
+          after({
+            "method": method,
+            "url": url,
+            "status": response.status_code if response is not None else None,
+            "response": response
+          })
+
+    gh.transport.request = spied
+
+  return spy
+
+
+@pytest.fixture
+def write_post():
+  # write a post directory: <root>/<name>/<name>.config, <name>.md and
+  # images/, whose values are the image bytes
+  def write_post(root, name, text = "Some text", config = None, images = None):
+    resource_dir = path.join(str(root), name)
+    makedirs(resource_dir, exist_ok = True)
+
+    with open(path.join(resource_dir, name + ".config"), "w") as c:
+      json.dump(config if config is not None else {"title": name}, c)
+
+    with open(path.join(resource_dir, name + ".md"), "w") as m:
+      m.write(text)
+
+    for image, data in (images or {}).items():
+      image_file = path.join(resource_dir, "images", image)
+      makedirs(path.dirname(image_file), exist_ok = True)
+
+      with open(image_file, "wb") as i:
+        i.write(data)
+
+    return resource_dir
+
+  return write_post
@@ -0,0 +1,320 @@
+import asyncio
+import json
+import threading
+from os import path
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from yarl import URL
+
+from ghost_server import CLIENT_ID, CLIENT_SECRET
+from appyrition import AsyncGhost
+from appyrition.catalog import Catalog
+from appyrition.error import GhostException
+from appyrition.render import Renderer
+from appyrition.retry import RetryPolicy
+
+
+def run(server, work, **kwargs):
+  # run `work(gh)` with an AsyncGhost of the stand-in server logged in with a
+  # session cookie
+  async def main():
+    async with AsyncGhost(
+      server.url,
+      "v3",
+      CLIENT_ID,
+      CLIENT_SECRET,
+      **kwargs
+    ) as gh:
+      await gh.login("user@example.com", "password")
+      return await work(gh)
+
+  return asyncio.run(main())
+
+
+def test_login_keeps_the_session_cookie(server):
+  async def work(gh):
+    return gh.transport.cookies.filter_cookies(URL(gh.base_url))
+
+  cookies = run(server, work)
+
+  assert cookies["ghost-admin-api-session"].value == "stand-in"
+
+
+def test_posts_round_trip(server):
+  async def work(gh):
+    created = (await gh.create_post({"title": "First"}))["posts"][0]
+    by_slug = await gh.get_post("first", "slug")
+
+    await gh.update_post({"title": "Renamed"}, created["id"])
+    renamed = (await gh.get_post(created["id"]))["posts"][0]
+
+    deleted = await gh.delete_post(created["id"])
+    with pytest.raises(GhostException) as e:
+      await gh.get_post(created["id"])
+
+    return created, by_slug, renamed, deleted, e.value
+
+  created, by_slug, renamed, deleted, error = run(server, work)
+
+  assert by_slug["posts"][0]["id"] == created["id"]
+  assert renamed["title"] == "Renamed"
+  assert deleted.status == 204
+  assert error.args[0] == 404
+  assert server.store.resources["posts"] == {}
+
+
+def test_concurrent_creates(server):
+  async def work(gh):
+    return await asyncio.gather(*[
+      gh.create_post({"title": "Post {}".format(i)}) for i in range(20)
+    ])
+
+  responses = run(server, work)
+
+  ids = set(response["posts"][0]["id"] for response in responses)
+  assert len(ids) == 20
+  assert set(server.store.resources["posts"]) == ids
+
+
+def test_upload_image(server, tmp_path):
+  image = tmp_path / "image.jpg"
+  image.write_bytes(b"image bytes")
+
+  async def work(gh):
+    response = await gh.upload_image(str(image), "images/image.jpg")
+    return response.status, (await response.json())["images"][0]["url"]
+
+  status, url = run(server, work)
+
+  assert status == 201
+  assert url.startswith(server.url + "/content/images/")
+  assert server.store.images == 1
+
+
+def test_deploy_post(server, tmp_path, write_post):
+  resource_dir = write_post(
+    tmp_path,
+    "post",
+    "![image](images/image.jpg)",
+    images = {"image.jpg": b"image bytes"}
+  )
+
+  async def work(gh):
+    return await gh.deploy_post(resource_dir)
+
+  post = run(server, work)["posts"][0]
+
+  assert post["html"].startswith('<p><img alt="image" src="{}'.format(server.url))
+  with open(path.join(resource_dir, "post.config")) as c:
+    assert json.load(c)["id"] == post["id"]
+
+
+@pytest.mark.parametrize("prefetch", [True, False])
+def test_iter_posts(server, prefetch):
+  server.seed("posts", 25)
+
+  async def work(gh):
+    posts = gh.iter_posts(limit = 10, fields = ["id"], prefetch = prefetch)
+    return [post["id"] async for post in posts]
+
+  assert run(server, work) == list(server.store.resources["posts"])
+
+
+def test_update_with_known_updated_at(server):
+  async def work(gh):
+    post = (await gh.create_post({"title": "First"}))["posts"][0]
+
+    requests = server.counts["requests"]
+    updated = await gh.update_post(
+      {"title": "Renamed"},
+      post["id"],
+      updated_at = post["updated_at"]
+    )
+    optimistic = server.counts["requests"] - requests
+
+    # a write elsewhere makes the next optimistic update conflict
+    server.store.update("posts", post["id"], {
+      "custom_excerpt": "Changed elsewhere",
+      "updated_at": updated["posts"][0]["updated_at"]
+    })
+    requests = server.counts["requests"]
+    merged = await gh.update_post(
+      {"title": "Again"},
+      post["id"],
+      updated_at = updated["posts"][0]["updated_at"]
+    )
+
+    return optimistic, server.counts["requests"] - requests, merged
+
+  optimistic, fallback, merged = run(server, work)
+
+  assert optimistic == 1
+  assert fallback == 3
+  assert merged["posts"][0]["title"] == "Again"
+  assert merged["posts"][0]["custom_excerpt"] == "Changed elsewhere"
+
+
+def test_token_auth_needs_no_login(server):
+  server.seed("posts", 1)
+
+  async def main():
+    async with AsyncGhost(
+      server.url,
+      "v3",
+      CLIENT_ID,
+      CLIENT_SECRET,
+      auth = "token"
+    ) as gh:
+      return await gh.get_post()
+
+  assert asyncio.run(main())["posts"]
+
+
+def test_reads_are_retried_but_not_creates(server):
+  server.error_rate = 1
+
+  async def work(gh):
+    with pytest.raises(GhostException):
+      await gh.get_post()
+    reads = server.counts["requests"]
+
+    with pytest.raises(GhostException):
+      await gh.create_post({"title": "Once"})
+
+    return reads, server.counts["requests"] - reads
+
+  policy = RetryPolicy(max_retries = 2, backoff_factor = 0)
+
+  async def main():
+    async with AsyncGhost(
+      server.url,
+      "v3",
+      CLIENT_ID,
+      CLIENT_SECRET,
+      auth = "token",
+      retry = policy
+    ) as gh:
+      return await work(gh)
+
+  assert asyncio.run(main()) == (3, 1)
+
+
+class ThreadRecordingRenderer(Renderer):
+
+  def __init__(self):
+    super().__init__()
+    self.threads = set()
+
+
+  def render(self, text):
+    self.threads.add(threading.get_ident())
+    return super().render(text)
+
+
+def test_deploys_run_file_work_off_the_event_loop(
+  server,
+  write_post,
+  tmp_path
+):
+  resource_dirs = [
+    write_post(
+      tmp_path,
+      "post-{}".format(i),
+      "![image](images/image.jpg)",
+      images = {"image.jpg": b"image bytes"}
+    )
+    for i in range(5)
+  ]
+  renderer = ThreadRecordingRenderer()
+
+  async def deploy():
+    async with AsyncGhost(
+      server.url,
+      "v3",
+      CLIENT_ID,
+      CLIENT_SECRET,
+      auth = "token",
+      renderer = renderer
+    ) as gh:
+      responses = await asyncio.gather(
+        *[gh.deploy_post(resource_dir) for resource_dir in resource_dirs]
+      )
+
+      return responses, threading.get_ident()
+
+  responses, loop_thread = asyncio.run(deploy())
+
+  assert len(server.store.resources["posts"]) == 5
+  assert server.store.images == 5
+  assert loop_thread not in renderer.threads
+
+  for response, resource_dir in zip(responses, resource_dirs):
+    post = response["posts"][0]
+    assert post["html"].startswith('<p><img alt="image" src="http')
+
+    name = path.basename(resource_dir)
+    with open(path.join(resource_dir, name + ".md")) as m:
+      assert "/content/images/" in m.read()
+
+
+class ThreadRecordingCatalog(Catalog):
+  # a catalog noting the threads its lookups and writes ran on
+  def __init__(self, *args):
+    super().__init__(*args)
+    self.threads = set()
+
+  def get(self, *args, **kwargs):
+    self.threads.add(threading.get_ident())
+    return super().get(*args, **kwargs)
+
+  def record(self, *args):
+    self.threads.add(threading.get_ident())
+    return super().record(*args)
+
+  def remove(self, *args):
+    self.threads.add(threading.get_ident())
+    return super().remove(*args)
+
+
+def test_catalog_work_runs_off_the_event_loop(server, tmp_path):
+  catalog = ThreadRecordingCatalog(str(tmp_path / "catalog.db"), server.url)
+
+  async def work(gh):
+    post = (await gh.create_post({"title": "First"}))["posts"][0]
+
+    # the slug and updated_at are resolved from the catalog, so the update
+    # goes out as a single optimistic PUT
+    requests = server.counts["requests"]
+    renamed = (await gh.update_post({"title": "Renamed"}, "first", "slug"))
+    updates = server.counts["requests"] - requests
+
+    await gh.delete_post(post["id"])
+
+    return post, renamed["posts"][0], updates, threading.get_ident()
+
+  post, renamed, updates, loop_thread = run(server, work, catalog = catalog)
+
+  assert renamed["id"] == post["id"]
+  assert renamed["title"] == "Renamed"
+  assert updates == 1
+  assert len(catalog) == 0
+  assert catalog.threads and loop_thread not in catalog.threads
+
+
+def test_refresh_catalog(server):
+  server.seed("posts", 250)
+  for i, post in enumerate(server.store.resources["posts"].values()):
+    post["updated_at"] = "2020-01-01T00:{:02d}:{:02d}.000Z".format(i // 60, i % 60)
+
+  async def work(gh):
+    pulled = await gh.refresh_catalog(["posts"])
+    return pulled, len(gh.catalog), gh.catalog.synced_at("posts")
+
+  pulled, entries, synced_at = run(server, work, catalog = ":memory:")
+
+  assert pulled == {"posts": 250}
+  assert entries == 250
+  assert synced_at == "2020-01-01T00:04:09.000Z"
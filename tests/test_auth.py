@@ -0,0 +1,110 @@
+import threading
+from datetime import datetime, timedelta
+
+import jwt
+import pytest
+
+from ghost_server import CLIENT_ID, CLIENT_SECRET
+from appyrition import auth
+from appyrition.auth import TokenAuth, generate_auth_header, generate_auth_token
+
+
+@pytest.fixture
+def clock(monkeypatch):
+  # a settable `now` for appyrition.auth
+  now = [datetime(2020, 1, 1, 12, 0, 0)]
+
+  class Clock(object):
+    @staticmethod
+    def now():
+      return now[0]
+
+  monkeypatch.setattr(auth, "date", Clock)
+  return now
+
+
+@pytest.fixture
+def minted(monkeypatch):
+  # iat of every token minted
+  iats = []
+
+  def generate(*args, **kwargs):
+    iats.append(kwargs["iat"])
+    return generate_auth_token(*args, **kwargs)
+
+  monkeypatch.setattr(auth, "generate_auth_token", generate)
+  return iats
+
+
+def claims(token):
+  return jwt.decode(token, options = {"verify_signature": False})
+
+
+def test_iat_defaults_to_the_time_of_the_call(clock):
+  first = generate_auth_header(CLIENT_ID)[1]
+  clock[0] += timedelta(minutes = 10)
+  second = generate_auth_header(CLIENT_ID)[1]
+
+  assert second["iat"] - first["iat"] == 600
+  assert second["exp"] - second["iat"] == 300
+
+
+def test_token_is_minted_lazily_and_cached(clock, minted):
+  token_auth = TokenAuth(CLIENT_ID, CLIENT_SECRET, refresh_margin = 30)
+  assert minted == []
+
+  token = token_auth.token()
+  clock[0] += timedelta(seconds = 269)
+  assert token_auth.token() == token
+  assert len(minted) == 1
+
+  # within `refresh_margin` of expiry a new token is minted
+  clock[0] += timedelta(seconds = 1)
+  refreshed = token_auth.token()
+
+  assert refreshed != token
+  assert claims(refreshed)["iat"] == claims(token)["iat"] + 270
+  assert claims(refreshed)["aud"] == "/v3/admin/"
+  assert jwt.get_unverified_header(refreshed)["kid"] == CLIENT_ID
+
+
+def test_concurrent_callers_share_one_refresh(clock, minted):
+  token_auth = TokenAuth(CLIENT_ID, CLIENT_SECRET)
+  barrier = threading.Barrier(16)
+  tokens = []
+
+  def call():
+    barrier.wait()
+    tokens.append(token_auth.token())
+
+  threads = [threading.Thread(target = call) for i in range(16)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+
+  assert len(minted) == 1
+  assert len(set(tokens)) == 1
+
+
+def test_requests_are_authenticated_without_login(gh, server, spy):
+  statuses = []
+  spy(gh, after = lambda event: statuses.append(event["status"]))
+  server.seed("posts", 1)
+
+  gh.get_post()
+
+  assert statuses == [200]
+
+
+def test_an_expired_token_is_refreshed_before_it_is_sent(gh, server):
+  server.seed("posts", 1)
+  token_auth = gh.transport.auth
+
+  # a token that expired a minute ago
+  iat = int(datetime.now().timestamp()) - 360
+  token_auth._token = generate_auth_token(CLIENT_ID, CLIENT_SECRET, iat = iat)
+  token_auth._expires_at = iat + token_auth.lifetime
+
+  assert gh.get_post()["posts"]
+  assert claims(token_auth._token)["exp"] > datetime.now().timestamp()
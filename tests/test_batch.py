@@ -0,0 +1,69 @@
+import time
+
+import pytest
+
+from appyrition.error import AppyException, GhostException
+
+
+def test_futures_as_arguments_are_replaced_by_results(gh, server):
+  with gh.batch(workers = 4) as b:
+    created = b.create_post({"title": "Draft"})
+    updated = b.call(
+      lambda response: gh.update_post(
+        {"title": "Published"},
+        response["posts"][0]["id"]
+      ),
+      created
+    )
+
+  assert updated.result()["posts"][0]["title"] == "Published"
+  assert len(server.store.resources["posts"]) == 1
+
+
+def test_calls_wait_for_their_dependencies(gh):
+  order = []
+
+  def step(name, seconds = 0):
+    time.sleep(seconds)
+    order.append(name)
+    return name
+
+  with gh.batch(workers = 4) as b:
+    first = b.call(step, "first", 0.1)
+    second = b.call(step, "second", after = [first])
+    b.call(step, "independent")
+
+  assert second.result() == "second"
+  assert order.index("first") < order.index("second")
+  assert order[0] == "independent"
+
+
+def test_failures_propagate_to_dependent_calls(gh, server):
+  called = []
+
+  with gh.batch() as b:
+    missing = b.delete_post("000000000000000000000000")
+    failing = b.update_post({"title": "Nope"}, "000000000000000000000000")
+    dependent = b.call(called.append, "dependent", after = [failing])
+    chained = b.call(called.append, "chained", after = [dependent])
+    unrelated = b.create_post({"title": "Unrelated"})
+
+  assert missing.result().status_code == 404
+  assert isinstance(failing.exception(), GhostException)
+  assert dependent.exception() is failing.exception()
+  assert chained.exception() is failing.exception()
+  assert called == []
+  assert unrelated.result()["posts"][0]["title"] == "Unrelated"
+
+
+def test_an_error_in_the_block_cancels_the_queue(gh, server):
+  with pytest.raises(RuntimeError):
+    with gh.batch() as b:
+      queued = [b.create_post({"title": str(i)}) for i in range(3)]
+      raise RuntimeError("stop")
+
+  assert all(future.cancelled() for future in queued)
+  assert server.counts["requests"] == 0
+
+  with pytest.raises(AppyException):
+    b.create_post({"title": "Too late"})
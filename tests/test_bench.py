@@ -0,0 +1,49 @@
+import json
+
+from bench import _compare, main
+
+
+def test_workloads_run_and_compare_with_a_baseline(tmp_path, capsys):
+  results_file = str(tmp_path / "results.json")
+  args = [
+    "deploy",
+    "list",
+    "update",
+    "--posts", "4",
+    "--images", "1",
+    "--image-size", "1024",
+    "--site-posts", "25",
+    "--page-size", "10",
+    "--latency", "0"
+  ]
+
+  assert main(args + ["--json", results_file]) == 0
+
+  with open(results_file) as f:
+    results = json.load(f)
+
+  assert [r["workload"] for r in results] == ["deploy", "list", "update"]
+  assert [r["operations"] for r in results] == [4, 25, 4]
+  assert all(r["failed"] == 0 and r["peak_rss"] > 0 for r in results)
+
+  # a second run differs from the first only by noise, well within a wide
+  # tolerance
+  assert main(args + ["--baseline", results_file, "--tolerance", "10"]) == 0
+  assert "REGRESSION" not in capsys.readouterr().out
+
+
+def test_regressions_past_the_tolerance_are_reported():
+  baseline = [
+    {"workload": "list", "throughput": 100, "failed": 0, "p99": 0.01,
+      "peak_rss": 100}
+  ]
+  results = [
+    {"workload": "list", "throughput": 85, "failed": 1, "p99": 0.02,
+      "peak_rss": 110},
+    {"workload": "deploy", "throughput": 1}
+  ]
+
+  assert _compare(results, baseline, 0.2) == [
+    "list: failed 0 -> 1",
+    "list: p99 0.01 -> 0.02"
+  ]
@@ -0,0 +1,103 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from appyrition.cache import ResponseCache
+from appyrition.error import GhostException
+
+
+def cached_client(client, **kwargs):
+  gh = client(cache = ResponseCache(**kwargs))
+  return gh, gh.transport.cache
+
+
+def test_unchanged_responses_are_revalidated(client, server, spy):
+  gh, cache = cached_client(client)
+  statuses = []
+  spy(gh, after = lambda event: statuses.append(event["status"]))
+  server.seed("posts", 1)
+
+  first = gh.get_post()
+  second = gh.get_post()
+
+  assert statuses == [200, 304]
+  assert second == first
+  assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_fresh_responses_are_served_without_a_request(client, server):
+  gh, cache = cached_client(client, max_age = 60)
+  server.seed("posts", 1)
+  requests = server.counts["requests"]
+
+  gh.get_post()
+  gh.get_post()
+
+  assert server.counts["requests"] == requests + 1
+  assert cache.hits == 1
+
+
+def test_entries_expire_after_ttl(client, server):
+  gh, cache = cached_client(client, ttl = 0.05)
+  server.seed("posts", 1)
+
+  gh.get_post()
+  time.sleep(0.1)
+  gh.get_post()
+
+  assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_least_recently_used_entries_are_evicted(client, server):
+  gh, cache = cached_client(client, max_entries = 2, max_age = 60)
+  server.seed("posts", 3)
+  ids = list(server.store.resources["posts"])
+
+  for post_id in ids:
+    gh.get_post(post_id)
+  assert len(cache) == 2
+
+  requests = server.counts["requests"]
+  gh.get_post(ids[2])
+  assert server.counts["requests"] == requests
+
+  gh.get_post(ids[0])
+  assert server.counts["requests"] == requests + 1
+
+
+def test_writes_evict_the_entries_of_their_resource(client, server):
+  gh, cache = cached_client(client, max_age = 60)
+  server.seed("posts", 2)
+  first, second = list(server.store.resources["posts"].values())
+
+  gh.get_post()
+  gh.get_post(first["id"])
+  gh.get_post(first["slug"], "slug")
+  gh.get_post(second["id"])
+  assert len(cache) == 4
+
+  # a create evicts listings only
+  gh.create_post({"title": "Third"})
+  assert len(cache) == 3
+
+  # an update evicts every entry holding the post, by id or slug
+  gh.update_post({"title": "Renamed"}, first["id"])
+  assert len(cache) == 1
+  assert gh.get_post(first["slug"], "slug")["posts"][0]["title"] == "Renamed"
+
+  gh.delete_post(second["id"])
+  assert len(cache) == 1
+  with pytest.raises(GhostException):
+    gh.get_post(second["id"])
+
+
+def test_counters_are_exact_under_concurrency(client, server):
+  gh, cache = cached_client(client, max_age = 60)
+  server.seed("posts", 1)
+  gh.get_post()
+
+  with ThreadPoolExecutor(max_workers = 8) as executor:
+    list(executor.map(lambda i: gh.get_post(), range(800)))
+
+  assert (cache.hits, cache.misses) == (800, 1)
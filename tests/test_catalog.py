@@ -0,0 +1,106 @@
+from appyrition.catalog import Catalog
+
+
+def post(i, updated_at = "2020-01-01T00:00:00.000Z"):
+  return {
+    "id": "{:024x}".format(i),
+    "uuid": "uuid-{}".format(i),
+    "slug": "post-{}".format(i),
+    "status": "draft",
+    "updated_at": updated_at,
+    "html": "<p>{}</p>".format(i)
+  }
+
+
+def test_catalog_resolves_ids_and_slugs(tmp_path):
+  catalog = Catalog(str(tmp_path / "catalog.db"), "https://ghost.example.com")
+  catalog.record("posts", post(1))
+  catalog.record("posts", post(2))
+
+  assert catalog.get("posts", "post-1", "slug")["id"] == post(1)["id"]
+  assert catalog.get("posts", post(2)["id"])["slug"] == "post-2"
+  assert catalog.get("pages", "post-1", "slug") is None
+  assert catalog.ids("posts", ["post-1", "post-2", "post-3"]) == {
+    "post-1": post(1)["id"],
+    "post-2": post(2)["id"]
+  }
+
+  catalog.remove("posts", post(1)["id"])
+  assert catalog.get("posts", "post-1", "slug") is None
+  assert len(catalog) == 1
+
+
+def test_catalog_is_kept_per_site(tmp_path):
+  db_file = str(tmp_path / "catalog.db")
+  Catalog(db_file, "https://a.example.com").record("posts", post(1))
+
+  assert len(Catalog(db_file, "https://a.example.com")) == 1
+  assert len(Catalog(db_file, "https://b.example.com")) == 0
+
+
+def test_full_refresh_drops_missing_and_advances_watermark(tmp_path):
+  catalog = Catalog(str(tmp_path / "catalog.db"), "https://ghost.example.com")
+  catalog.record("posts", post(1))
+
+  ids, latest = catalog._apply(
+    "posts",
+    [post(2, "2020-01-02T00:00:00.000Z"), post(3, "2020-01-03T00:00:00.000Z")]
+  )
+  catalog._finish("posts", latest, set(ids))
+
+  assert catalog.get("posts", post(1)["id"]) is None
+  assert len(catalog) == 2
+  assert catalog.synced_at("posts") == "2020-01-03T00:00:00.000Z"
+
+  params = catalog._cursor("posts", full = False).params()
+  assert params["filter"] == "updated_at:>='2020-01-03 00:00:00'"
+
+
+def spread(server, resource_type):
+  # give the seeded resources one updated_at per minute, in creation order
+  for i, resource_json in enumerate(server.store.resources[resource_type].values()):
+    resource_json["updated_at"] = "2020-01-01T{:02d}:{:02d}:00.000Z".format(
+      i // 60,
+      i % 60
+    )
+
+
+def test_refresh_does_not_skip_resources_edited_meanwhile(server, client, spy):
+  server.seed("posts", 250)
+  spread(server, "posts")
+  first = next(iter(server.store.resources["posts"].values()))
+
+  gh = client(catalog = ":memory:")
+  listings = []
+
+  def after(event):
+    # once the first listing is in, an edit elsewhere moves the first post
+    # to the end of the listing
+    listings.append(event["url"])
+    if len(listings) == 1:
+      server.store.update("posts", first["id"], {
+        "title": "Edited elsewhere",
+        "updated_at": first["updated_at"]
+      })
+
+  spy(gh, after = after)
+
+  assert gh.refresh_catalog(["posts"]) == {"posts": 251}
+  assert len(gh.catalog) == 250
+
+  edited = server.store.resources["posts"][first["id"]]["updated_at"]
+  assert gh.catalog.get("posts", first["id"])["updated_at"] == edited
+  assert gh.catalog.synced_at("posts") == edited
+
+
+def test_refresh_pages_through_resources_updated_in_one_second(server, client):
+  server.seed("posts", 250)
+  for resource_json in server.store.resources["posts"].values():
+    resource_json["updated_at"] = "2020-01-01T00:00:00.000Z"
+
+  gh = client(catalog = ":memory:")
+
+  # each resource is pulled once, though every request filters from the
+  # same second
+  assert gh.refresh_catalog(["posts"]) == {"posts": 250}
+  assert len(gh.catalog) == 250
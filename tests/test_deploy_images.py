@@ -0,0 +1,198 @@
+import logging
+
+from appyrition.deploy import (
+  get_dir_structure,
+  _find_images,
+  _replace_images
+)
+
+
+TEXT = """\
+![Nested](images/diagrams/flow.png)
+<img src="./images/photo.jpg" alt="Photo">
+See images/chart.svg, then carry on.
+A remote https://example.com/images/photo.jpg stays.
+A missing images/missing.png stays.
+"""
+
+CONFIG = {
+  "title": "Images",
+  "feature_image": "images/photo.jpg",
+  "og_image": "./images/diagrams/flow.png",
+  "twitter_image": "images/card.png"
+}
+
+IMAGES = {
+  "photo.jpg": b"photo",
+  "chart.svg": b"chart",
+  "card.png": b"card",
+  "diagrams/flow.png": b"flow",
+  "unused.gif": b"unused"
+}
+
+
+def found(tmp_path, write_post, caplog):
+  resource_dir = write_post(tmp_path, "images", TEXT, dict(CONFIG), IMAGES)
+  dir_str = get_dir_structure(resource_dir)
+  resource = dict(CONFIG)
+
+  with caplog.at_level(logging.WARNING):
+    images = _find_images(dir_str, resource, TEXT, "post")
+
+  return resource, images
+
+
+def test_every_reference_form_is_found(tmp_path, write_post, caplog):
+  resource, images = found(tmp_path, write_post, caplog)
+  by_image = {image["image"]: image for image in images}
+
+  assert sorted(by_image) == [
+    "card.png",
+    "chart.svg",
+    "diagrams/flow.png",
+    "photo.jpg"
+  ]
+
+  assert by_image["diagrams/flow.png"]["in_text"]
+  assert by_image["diagrams/flow.png"]["in_config"] == ["og_image"]
+  assert by_image["diagrams/flow.png"]["ref"] == "images/images/diagrams/flow.png"
+  assert by_image["photo.jpg"]["in_text"]
+  assert by_image["photo.jpg"]["in_config"] == ["feature_image"]
+  assert by_image["chart.svg"]["in_text"]
+  assert not by_image["card.png"]["in_text"]
+  assert by_image["card.png"]["in_config"] == ["twitter_image"]
+
+
+def test_unreferenced_image_is_skipped_with_a_warning(
+  tmp_path,
+  write_post,
+  caplog
+):
+  resource, images = found(tmp_path, write_post, caplog)
+
+  assert "unused.gif" not in [image["image"] for image in images]
+  assert "images/unused.gif in directory but not referenced" in caplog.text
+
+
+def test_references_are_replaced_in_one_pass(tmp_path, write_post, caplog):
+  resource, images = found(tmp_path, write_post, caplog)
+  urls = [
+    "https://ghost.example.com/content/images/" + image["image"]
+    for image in images
+  ]
+
+  text = _replace_images(images, urls, resource, TEXT)
+  site = "https://ghost.example.com/content/images/"
+
+  assert text == """\
+![Nested]({site}diagrams/flow.png)
+<img src="{site}photo.jpg" alt="Photo">
+See {site}chart.svg, then carry on.
+A remote https://example.com/images/photo.jpg stays.
+A missing images/missing.png stays.
+""".format(site = site)
+
+  assert resource["feature_image"] == site + "photo.jpg"
+  assert resource["og_image"] == site + "diagrams/flow.png"
+  assert resource["twitter_image"] == site + "card.png"
+
+
+def test_deploy_uploads_nested_images(gh, server, write_post, tmp_path):
+  resource_dir = write_post(
+    tmp_path,
+    "nested",
+    "![A](images/a/one.png) and ![B](./images/b/two.png).",
+    images = {"a/one.png": b"one", "b/two.png": b"two"}
+  )
+
+  post = gh.deploy_post(resource_dir)["posts"][0]
+
+  assert server.store.images == 2
+  assert "images/" not in post["html"].replace("/content/images/", "")
+
+
+def test_names_with_spaces_and_parentheses(tmp_path, write_post, caplog):
+  text = """\
+<img src="images/my pic.png">
+![One](images/photo (1).png)
+![Two](<images/photo.png>) and ![Three](images/my%20pic.png).
+A backup images/photo.png.bak stays.
+"""
+  config = {"title": "Names", "feature_image": "images/photo (1).png"}
+  resource_dir = write_post(
+    tmp_path,
+    "names",
+    text,
+    config,
+    {"my pic.png": b"pic", "photo (1).png": b"one", "photo.png": b"photo"}
+  )
+  resource = dict(config)
+
+  with caplog.at_level(logging.WARNING):
+    images = _find_images(
+      get_dir_structure(resource_dir),
+      resource,
+      text,
+      "post"
+    )
+
+  assert [(i["image"], i["in_text"], i["in_config"]) for i in images] == [
+    ("my pic.png", True, []),
+    ("photo (1).png", True, ["feature_image"]),
+    ("photo.png", True, [])
+  ]
+  assert "not referenced" not in caplog.text
+
+  site = "https://ghost.example.com/content/images/"
+  urls = [site + str(n) + ".png" for n in range(len(images))]
+  text = _replace_images(images, urls, resource, text)
+
+  assert text == """\
+<img src="{site}0.png">
+![One]({site}1.png)
+![Two](<{site}2.png>) and ![Three]({site}0.png).
+A backup images/photo.png.bak stays.
+""".format(site = site)
+  assert resource["feature_image"] == site + "1.png"
+
+
+def test_config_fields_must_be_the_whole_reference(
+  tmp_path,
+  write_post,
+  caplog
+):
+  config = {
+    "title": "Fields",
+    "feature_image": "images/photo.png?v=2",
+    "og_image": "https://example.com/images/photo.png"
+  }
+  resource_dir = write_post(tmp_path, "fields", "No images", config, {
+    "photo.png": b"photo"
+  })
+
+  with caplog.at_level(logging.WARNING):
+    images = _find_images(
+      get_dir_structure(resource_dir),
+      dict(config),
+      "No images",
+      "post"
+    )
+
+  assert images == []
+  assert "images/photo.png in directory but not referenced" in caplog.text
+
+
+def test_deploy_publishes_no_local_path(gh, server, write_post, tmp_path):
+  resource_dir = write_post(
+    tmp_path,
+    "spaces",
+    '<img src="images/my pic.png">',
+    {"title": "Spaces", "feature_image": "images/photo (1).png"},
+    {"my pic.png": b"pic", "photo (1).png": b"one"}
+  )
+
+  post = gh.deploy_post(resource_dir)["posts"][0]
+
+  assert server.store.images == 2
+  assert post["feature_image"].startswith(server.url + "/content/images/")
+  assert "images/my pic.png" not in post["html"]
@@ -0,0 +1,100 @@
+import json
+import threading
+from os import path
+
+from appyrition.deploy import find_resource_dirs
+
+
+def write_tree(root, write_post):
+  # three posts at different depths, a draft folder that is not a post and a
+  # post nested in another post, which is not searched
+  write_post(root, "first")
+  write_post(root / "2020", "second")
+  write_post(root / "2020" / "03", "third", images = {"a.png": b"a"})
+  write_post(root / "first", "inner")
+  (root / "drafts").mkdir()
+  (root / "drafts" / "notes.md").write_text("Not a post")
+
+  return [
+    str(root / "2020" / "03" / "third"),
+    str(root / "2020" / "second"),
+    str(root / "first")
+  ]
+
+
+def test_resource_dirs_are_found_in_path_order(tmp_path, write_post):
+  resource_dirs = write_tree(tmp_path, write_post)
+
+  assert find_resource_dirs(str(tmp_path)) == resource_dirs
+
+
+def test_every_directory_is_deployed_concurrently(
+  gh,
+  server,
+  spy,
+  tmp_path,
+  write_post
+):
+  resource_dirs = write_tree(tmp_path, write_post)
+  server.latency = 0.05
+  state = {"in_flight": 0, "most": 0}
+  lock = threading.Lock()
+
+  def before(method, url, kwargs):
+    with lock:
+      state["in_flight"] += 1
+      state["most"] = max(state["most"], state["in_flight"])
+
+  def after(event):
+    with lock:
+      state["in_flight"] -= 1
+
+  spy(gh, before = before, after = after)
+
+  results = gh.deploy_many(str(tmp_path), workers = 3)
+
+  assert [result["dir"] for result in results] == resource_dirs
+  assert all(result["ok"] and not result["skipped"] for result in results)
+  assert all(result["error"] is None for result in results)
+  assert state["most"] > 1
+  assert len(server.store.resources["posts"]) == 3
+
+  # every config got the id of its own post
+  for result in results:
+    post = result["response"]["posts"][0]
+    name = path.basename(result["dir"])
+    with open(path.join(result["dir"], name + ".config")) as c:
+      assert json.load(c)["id"] == post["id"]
+    assert post["title"] == name
+
+
+def test_a_failed_directory_does_not_stop_the_others(
+  gh,
+  server,
+  tmp_path,
+  write_post
+):
+  resource_dirs = write_tree(tmp_path, write_post)
+  (tmp_path / "2020" / "second" / "second.config").write_text("{not json")
+
+  results = gh.deploy_many(str(tmp_path))
+
+  assert [result["ok"] for result in results] == [True, False, True]
+  failed = results[1]
+  assert failed["dir"] == resource_dirs[1]
+  assert failed["response"] is None
+  assert isinstance(failed["error"], ValueError)
+  assert len(server.store.resources["posts"]) == 2
+
+
+def test_directories_with_an_id_are_updated(gh, server, tmp_path, write_post):
+  write_tree(tmp_path, write_post)
+  post_id = gh.deploy_many(str(tmp_path))[2]["response"]["posts"][0]["id"]
+
+  write_post(tmp_path, "first", "Changed", {"title": "first", "id": post_id})
+
+  results = gh.deploy_many(str(tmp_path))
+
+  assert [result["skipped"] for result in results] == [True, True, False]
+  assert results[2]["response"]["posts"][0]["html"] == "<p>Changed</p>"
+  assert len(server.store.resources["posts"]) == 3
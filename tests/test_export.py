@@ -0,0 +1,142 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def image_url(gh, tmp_path):
+  image_file = tmp_path / "photo.jpg"
+  image_file.write_bytes(b"photo")
+  return gh.upload_image(str(image_file), None).json()["images"][0]["url"]
+
+
+@pytest.fixture
+def listings(gh):
+  # query params of every listing and batch request
+  sent = []
+
+  def before(method, url, kwargs):
+    if method == "GET" and url.endswith("/posts/"):
+      sent.append(dict(kwargs.get("params") or {}))
+
+  gh.add_hook(before = before)
+  return sent
+
+
+def create(gh, title, html):
+  return gh.create_post({"title": title, "html": html})["posts"][0]
+
+
+def read(tmp_path, slug):
+  post_dir = tmp_path / "backup" / "posts" / slug
+  config = json.loads((post_dir / (slug + ".config")).read_text())
+  return config, (post_dir / (slug + ".md")).read_text()
+
+
+def export(gh, tmp_path, **kwargs):
+  results = gh.export_site(str(tmp_path / "backup"), ["posts"], **kwargs)
+  return {result["id"]: result for result in results}
+
+
+def test_posts_and_their_images_are_exported(gh, server, tmp_path, image_url):
+  post = gh.create_post({
+    "title": "Photo",
+    "html": '<p><img src="{}"></p>'.format(image_url),
+    "feature_image": image_url
+  })["posts"][0]
+
+  results = export(gh, tmp_path)
+
+  assert results[post["id"]]["ok"] and not results[post["id"]]["skipped"]
+  config, text = read(tmp_path, "photo")
+  name = image_url.rsplit("/", 1)[1]
+  assert text == '<p><img src="images/{}"></p>'.format(name)
+  assert config["feature_image"] == "images/" + name
+  assert config["id"] == post["id"]
+  assert (tmp_path / "backup" / "posts" / "photo" / "images" / name).exists()
+
+
+def test_urls_sharing_a_prefix_are_replaced_whole(gh, tmp_path, image_url):
+  html = '<img src="{0}"><img src="{0}?v=2">'.format(image_url)
+  create(gh, "Variants", html)
+
+  export(gh, tmp_path)
+
+  name = image_url.rsplit("/", 1)[1]
+  image_dir = tmp_path / "backup" / "posts" / "variants" / "images"
+  variant = [p.name for p in image_dir.iterdir() if p.name != name]
+
+  assert len(variant) == 1
+  assert read(tmp_path, "variants")[1] == (
+    '<img src="images/{}"><img src="images/{}">'.format(name, variant[0])
+  )
+
+
+def test_only_changed_posts_are_exported_again(gh, server, tmp_path, listings):
+  first = create(gh, "First", "<p>One</p>")
+  second = create(gh, "Second", "<p>Two</p>")
+  export(gh, tmp_path)
+
+  del listings[:]
+  results = export(gh, tmp_path)
+  assert all(r["ok"] and r["skipped"] for r in results.values())
+  assert len(listings) == 1
+
+  gh.update_post({"html": "<p>Changed</p>"}, second["id"])
+  results = export(gh, tmp_path)
+
+  assert results[first["id"]]["skipped"]
+  assert not results[second["id"]]["skipped"]
+  assert read(tmp_path, "second")[1] == "<p>Changed</p>"
+
+
+def test_slug_change_moves_the_directory(gh, server, tmp_path, image_url):
+  post = create(gh, "Old", '<img src="{}">'.format(image_url))
+  export(gh, tmp_path)
+
+  gh.update_post({"slug": "new"}, post["id"])
+  requests = server.counts["requests"]
+  export(gh, tmp_path)
+
+  assert not (tmp_path / "backup" / "posts" / "old").exists()
+  assert read(tmp_path, "new")[0]["slug"] == "new"
+  assert (tmp_path / "backup" / "posts" / "new" / "new.deployed").exists()
+  # the listing and the batch, but not the image again
+  assert server.counts["requests"] - requests == 2
+
+
+def test_listing_is_paginated(gh, server, tmp_path, listings):
+  server.seed("posts", 150)
+
+  results = export(gh, tmp_path)
+
+  assert len(results) == 150
+  pages = [p for p in listings if "filter" not in p]
+  assert [(p["limit"], p["page"]) for p in pages] == [(100, 1), (100, 2)]
+  assert all(p["limit"] != "all" for p in listings)
+
+
+def test_posts_deleted_after_the_listing_are_reported(
+  gh,
+  server,
+  tmp_path,
+  listings
+):
+  kept = create(gh, "Kept", "<p>Kept</p>")
+  deleted = create(gh, "Deleted", "<p>Deleted</p>")
+
+  def delete(method, url, kwargs):
+    # between the listing and the batch fetch
+    if "id:[" in (kwargs.get("params") or {}).get("filter", ""):
+      server.store.delete("posts", deleted["id"])
+
+  gh.add_hook(before = delete)
+  results = export(gh, tmp_path, workers = 1)
+
+  assert results[kept["id"]]["ok"]
+  result = results[deleted["id"]]
+  assert (result["ok"], result["skipped"], result["dir"]) == (False, True, None)
+  assert "not returned" in str(result["error"])
+
+  index = json.loads((tmp_path / "backup" / "posts" / ".export.json").read_text())
+  assert list(index) == [kept["id"]]
@@ -0,0 +1,74 @@
+import shutil
+import subprocess
+from os import path
+
+import pytest
+
+pytestmark = pytest.mark.skipif(
+  shutil.which("git") is None,
+  reason = "git is not installed"
+)
+
+
+def git(repo, *args):
+  subprocess.run(
+    ["git", "-C", str(repo)] + list(args),
+    check = True,
+    capture_output = True
+  )
+
+
+@pytest.fixture
+def repo(tmp_path, write_post):
+  git(tmp_path, "init", "-q")
+  git(tmp_path, "config", "user.email", "author@example.com")
+  git(tmp_path, "config", "user.name", "Author")
+
+  for name in ("first", "second", "third"):
+    write_post(tmp_path / "posts", name, "Text of " + name)
+
+  git(tmp_path, "add", "-A")
+  git(tmp_path, "commit", "-qm", "Add posts")
+
+  return tmp_path
+
+
+def deployed(gh, repo):
+  results = gh.deploy_many(str(repo / "posts"), git = True)
+  return sorted(path.basename(r["dir"]) for r in results if r["ok"])
+
+
+def test_write_back_is_not_a_change(gh, repo):
+  assert deployed(gh, repo) == ["first", "second", "third"]
+
+  # the ids written back to the configs are left uncommitted
+  assert deployed(gh, repo) == []
+
+
+def test_changes_are_deployed_once(gh, repo):
+  deployed(gh, repo)
+  md_file = repo / "posts" / "second" / "second.md"
+
+  md_file.write_text("Edited")
+  assert deployed(gh, repo) == ["second"]
+  assert deployed(gh, repo) == []
+
+  # committing what was deployed changes nothing
+  git(repo, "add", "-A")
+  git(repo, "commit", "-qm", "Edit second")
+  assert deployed(gh, repo) == []
+
+  md_file.write_text("Edited again")
+  assert deployed(gh, repo) == ["second"]
+
+  # reverting to the committed text undoes a deployed change
+  git(repo, "checkout", "--", "posts/second/second.md")
+  assert deployed(gh, repo) == ["second"]
+  assert deployed(gh, repo) == []
+
+
+def test_new_directories_are_deployed(gh, repo, write_post):
+  deployed(gh, repo)
+
+  write_post(repo / "posts", "fourth")
+  assert deployed(gh, repo) == ["fourth"]
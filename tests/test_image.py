@@ -0,0 +1,124 @@
+import uuid
+
+import pytest
+import requests
+import urllib3.filepost
+
+from ghost_server import GhostServer, CLIENT_ID, CLIENT_SECRET
+from appyrition import Ghost
+from appyrition import image as image_module
+from appyrition.error import GhostException
+from appyrition.image import MultipartFile
+from appyrition.retry import RetryPolicy
+
+
+@pytest.fixture
+def image(tmp_path):
+  image_file = tmp_path / "image.jpg"
+  image_file.write_bytes(bytes(range(256)) * 1000)
+  return str(image_file)
+
+
+def test_upload_is_not_resent_after_it_may_have_been_stored(
+  client,
+  server,
+  image
+):
+  gh = client(retry = RetryPolicy(backoff_factor = 0))
+  server.error_rate = 1
+
+  with pytest.raises(GhostException):
+    gh.upload_image(image, "images/image.jpg")
+
+  assert server.counts["requests"] == 1
+
+
+def test_body_is_read_in_chunks(image):
+  with open(image, "rb") as f:
+    data = f.read()
+
+  with MultipartFile(image, {"ref": "image.jpg"}, "image/jpeg", 1000) as body:
+    chunks = list(body)
+
+  assert all(len(chunk) <= 1000 for chunk in chunks)
+  sent = b"".join(chunks)
+  assert data in sent
+  assert b'name="ref"\r\n\r\nimage.jpg\r\n' in sent
+  assert sent.endswith(body.content_type.split("boundary=")[1].encode() + b"--\r\n")
+
+
+def test_content_length_is_exact(image):
+  with MultipartFile(image, {"ref": "image.jpg"}, "image/jpeg") as body:
+    request = requests.Request(
+      "POST",
+      "http://localhost/",
+      data = body,
+      headers = {"Content-Type": body.content_type}
+    ).prepare()
+
+    assert request.headers["Content-Length"] == str(len(b"".join(body)))
+
+
+def test_upload_streams_the_file(gh, server, image):
+  response = gh.upload_image(image, "images/image.jpg")
+
+  assert response.status_code == 201
+  assert response.json()["images"][0]["ref"] == "images/image.jpg"
+  assert server.store.images == 1
+
+
+def test_rate_limited_upload_is_retried(image):
+  with GhostServer(rate_limit = 50, burst = 1) as server:
+    gh = Ghost(server.url, "v3", CLIENT_ID, CLIENT_SECRET, auth = "token")
+
+    for i in range(3):
+      assert gh.upload_image(image, "images/image.jpg").status_code == 201
+
+    gh.close()
+
+  assert server.counts["rate_limited"] > 0
+  assert server.store.images == 3
+
+
+@pytest.fixture
+def boundary(monkeypatch):
+  # the same boundary for MultipartFile and for requests
+  value = uuid.UUID(int = 1)
+  monkeypatch.setattr(image_module.uuid, "uuid4", lambda: value)
+  monkeypatch.setattr(urllib3.filepost, "choose_boundary", lambda: value.hex)
+
+
+def requests_body(file, fields, mime_type):
+  with open(file, "rb") as f:
+    files = {"file": (file, f, mime_type)}
+    files.update((name, (None, value, None)) for name, value in fields.items())
+    return requests.Request(
+      "POST",
+      "http://localhost/",
+      files = files
+    ).prepare()
+
+
+@pytest.mark.parametrize("mime_type", ["image/jpeg", None])
+@pytest.mark.parametrize("fields", [{"ref": "images/image.jpg"}, {}])
+def test_body_matches_requests(boundary, image, mime_type, fields):
+  expected = requests_body(image, fields, mime_type)
+
+  with MultipartFile(image, fields, mime_type, chunk_size = 1000) as body:
+    assert body.content_type == expected.headers["Content-Type"]
+    assert b"".join(body) == expected.body
+    assert len(body) == len(expected.body)
+
+
+def test_rewound_body_is_sent_again(boundary, image):
+  expected = requests_body(image, {"ref": "image.jpg"}, "image/jpeg").body
+
+  with MultipartFile(image, {"ref": "image.jpg"}, "image/jpeg", 4096) as body:
+    # an attempt that failed halfway through the file
+    body.read()
+    body.read()
+    body.rewind()
+    assert b"".join(body) == expected
+
+    body.rewind()
+    assert b"".join(body) == expected
@@ -0,0 +1,99 @@
+from urllib.parse import urlsplit
+
+import pytest
+
+from appyrition.image_store import ImageStore, hash_file
+
+
+LOGO = b"logo bytes"
+
+
+@pytest.fixture
+def manifest_file(tmp_path):
+  return str(tmp_path / "images.manifest.json")
+
+
+def deploy(gh, root, write_post, name, **kwargs):
+  resource_dir = write_post(
+    root,
+    name,
+    "![Logo](images/logo.png)",
+    images = {"logo.png": LOGO}
+  )
+  return gh.deploy_post(resource_dir, **kwargs)["posts"][0]
+
+
+def test_images_are_uploaded_once_per_site(
+  client,
+  server,
+  manifest_file,
+  tmp_path,
+  write_post
+):
+  gh = client(image_store = manifest_file)
+
+  first = deploy(gh, tmp_path, write_post, "first")
+  second = deploy(gh, tmp_path, write_post, "second")
+
+  assert server.store.images == 1
+  assert first["html"] == second["html"]
+
+  # the manifest outlives the client, and is kept apart for each site
+  store = ImageStore(manifest_file, server.url)
+  digest, url = store.lookup(str(tmp_path / "first" / "images" / "logo.png"))
+  assert digest == hash_file(str(tmp_path / "second" / "images" / "logo.png"))
+  assert url in first["html"]
+
+  assert ImageStore(manifest_file, "https://other.example.com").get(digest) is None
+
+
+def test_redeploys_reuse_uploaded_images(
+  client,
+  server,
+  manifest_file,
+  tmp_path,
+  write_post
+):
+  gh = client(image_store = manifest_file)
+  post = deploy(gh, tmp_path, write_post, "first")
+
+  # a fresh checkout of the source still refers to the local image
+  resource_dir = write_post(
+    tmp_path,
+    "first",
+    "![Logo](images/logo.png) again",
+    {"title": "first", "id": post["id"]}
+  )
+  again = gh.deploy_post(resource_dir, update = True)["posts"][0]
+
+  assert server.store.images == 1
+  assert again["html"] == post["html"].replace("</p>", " again</p>")
+
+
+def test_stale_entries_are_evicted(
+  client,
+  server,
+  manifest_file,
+  tmp_path,
+  write_post
+):
+  gh = client(image_store = manifest_file)
+  post = deploy(gh, tmp_path, write_post, "first")
+  store = gh.image_store
+
+  # the image was deleted on the site
+  server.store.image_paths.clear()
+
+  assert len(store.verify(gh.transport)) == 1
+  assert len(ImageStore(manifest_file, server.url)) == 0
+
+  again = deploy(gh, tmp_path, write_post, "second")
+  assert server.store.images == 2
+  assert again["html"] != post["html"]
+
+  # an evicted digest is uploaded again; one that is still live is kept
+  digest, url = store.lookup(str(tmp_path / "second" / "images" / "logo.png"))
+  assert urlsplit(url).path in server.store.image_paths
+  assert store.verify(gh.transport) == []
+  assert store.evict(digest)
+  assert not store.evict(digest)
@@ -0,0 +1,52 @@
+import sys
+import subprocess
+from os import path
+
+root = path.dirname(path.dirname(path.abspath(__file__)))
+
+# cumulative microseconds `import appyrition` may take, as reported by
+# python -X importtime
+IMPORT_BUDGET_US = 50000
+
+HEAVY_MODULES = ["markdown", "jwt", "cryptography", "aiohttp", "multiprocessing"]
+
+
+def run(code, *flags):
+  return subprocess.run(
+    [sys.executable, *flags, "-c", code],
+    cwd = root,
+    capture_output = True,
+    text = True,
+    check = True
+  )
+
+
+def test_import_time_budget():
+  result = run("import appyrition", "-X", "importtime")
+
+  line = [
+    l for l in result.stderr.splitlines()
+    if l.split("|")[-1].strip() == "appyrition"
+  ][0]
+  cumulative = int(line.split("|")[1])
+
+  assert cumulative < IMPORT_BUDGET_US
+
+
+def test_import_loads_no_dependencies():
+  result = run(
+    "import sys, appyrition;"
+    "print([m for m in ('requests', 'aiohttp', 'markdown', 'jwt')"
+    " if m in sys.modules])"
+  )
+  assert result.stdout.strip() == "[]"
+
+
+def test_client_loads_heavy_dependencies_lazily():
+  result = run(
+    "import sys;"
+    "from appyrition import Ghost;"
+    "gh = Ghost('https://ghost.example.com', 'v3', 'id', '00' * 32);"
+    "print([m for m in {} if m in sys.modules])".format(HEAVY_MODULES)
+  )
+  assert result.stdout.strip() == "[]"
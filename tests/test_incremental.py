@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from appyrition.error import GhostException
+
+
+@pytest.fixture
+def post_dir(gh, tmp_path, write_post):
+  resource_dir = write_post(
+    tmp_path,
+    "post",
+    "![A](images/a.png)",
+    images = {"a.png": b"a", "b.png": b"b"}
+  )
+  gh.deploy_post(resource_dir)
+  return resource_dir
+
+
+def redeploy(gh, server, resource_dir, **kwargs):
+  # the response of an update and the number of requests it sent
+  requests = server.counts["requests"]
+  response = gh.deploy_post(resource_dir, update = True, **kwargs)
+  return response, server.counts["requests"] - requests
+
+
+def test_unchanged_directory_is_skipped(gh, server, post_dir):
+  assert redeploy(gh, server, post_dir) == (None, 0)
+
+
+def test_force_deploys_an_unchanged_directory(gh, server, post_dir):
+  response, requests = redeploy(gh, server, post_dir, force = True)
+
+  assert response["posts"][0]["title"] == "post"
+  assert requests > 0
+
+  # and records it again
+  assert redeploy(gh, server, post_dir) == (None, 0)
+
+
+@pytest.mark.parametrize("change", [
+  ("post.md", b"Changed text"),
+  ("post.config", b'{"title": "Renamed"}'),
+  ("images/b.png", b"changed bytes"),
+  ("images/c.png", b"new image")
+])
+def test_any_change_is_deployed(gh, server, post_dir, tmp_path, change):
+  name, data = change
+  file = tmp_path / "post" / name
+
+  if name == "post.config":
+    # keep the id the first deploy wrote back
+    post_id = json.loads(file.read_text())["id"]
+    data = data.replace(b"}", b', "id": "%s"}' % post_id.encode())
+  file.write_bytes(data)
+
+  response, requests = redeploy(gh, server, post_dir)
+
+  assert response is not None and requests > 0
+  assert redeploy(gh, server, post_dir) == (None, 0)
+
+
+def test_failed_deploy_is_retried_next_time(gh, server, post_dir, tmp_path):
+  (tmp_path / "post" / "post.md").write_text("Changed text")
+  server.error_rate = 1
+
+  with pytest.raises(GhostException):
+    redeploy(gh, server, post_dir)
+
+  server.error_rate = 0
+  response, requests = redeploy(gh, server, post_dir)
+
+  assert response["posts"][0]["html"] == "<p>Changed text</p>"
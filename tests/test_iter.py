@@ -0,0 +1,80 @@
+import time
+
+import pytest
+
+
+@pytest.fixture
+def pages(gh, server, spy):
+  # query params of every listing request sent
+  sent = []
+  spy(gh, before = lambda method, url, kwargs: sent.append(
+    dict(kwargs.get("params") or {})
+  ))
+  server.seed("posts", 25)
+  return sent
+
+
+def wait_for(condition, timeout = 2):
+  deadline = time.monotonic() + timeout
+  while not condition() and time.monotonic() < deadline:
+    time.sleep(0.01)
+  return condition()
+
+
+def test_every_post_is_listed_page_by_page(gh, server, pages):
+  posts = list(gh.iter_posts(limit = 10, fields = ["id", "slug"]))
+
+  assert [post["id"] for post in posts] == list(server.store.resources["posts"])
+  assert all(set(post) == {"id", "slug"} for post in posts)
+
+  assert [(p["page"], p["limit"], p["fields"]) for p in pages] == [
+    (1, 10, "id,slug"),
+    (2, 10, "id,slug"),
+    (3, 10, "id,slug")
+  ]
+
+
+def test_arguments_are_pushed_down(gh, pages):
+  posts = gh.iter_posts(
+    filter = "status:published",
+    formats = ["html", "plaintext"],
+    order = "title desc",
+    limit = 5,
+    params = {"include": "tags"}
+  )
+  titles = [post["title"] for post in posts]
+
+  assert titles == sorted(titles, reverse = True)
+  assert pages[0] == {
+    "filter": "status:published",
+    "formats": "html,plaintext",
+    "order": "title desc",
+    "include": "tags",
+    "limit": 5,
+    "page": 1
+  }
+
+
+def test_next_page_is_prefetched(gh, pages):
+  posts = gh.iter_posts(limit = 10)
+  next(posts)
+
+  assert wait_for(lambda: len(pages) == 2)
+
+  # closing early fetches nothing more
+  posts.close()
+  time.sleep(0.05)
+  assert len(pages) == 2
+
+
+def test_prefetch_can_be_turned_off(gh, pages):
+  posts = gh.iter_posts(limit = 10, prefetch = False)
+
+  for i in range(10):
+    next(posts)
+  time.sleep(0.05)
+  assert len(pages) == 1
+
+  next(posts)
+  assert len(pages) == 2
+  posts.close()
@@ -0,0 +1,121 @@
+import pytest
+import requests
+
+from ghost_server import CLIENT_ID, CLIENT_SECRET
+from appyrition import Ghost
+from appyrition.error import AppyException
+from appyrition.metrics import Metrics, endpoint
+from appyrition.retry import RetryPolicy
+
+
+def event(elapsed, status = 200, attempt = 0, name = "GET posts"):
+  return {
+    "endpoint": name,
+    "elapsed": elapsed,
+    "status": status,
+    "attempt": attempt,
+    "error": None,
+    "bytes_sent": 0,
+    "bytes_received": 10
+  }
+
+
+def test_endpoints_have_low_cardinality_names():
+  base = "https://ghost.example.com/ghost/api/v3/admin/"
+
+  assert endpoint("GET", base + "posts/") == "GET posts"
+  assert endpoint("PUT", base + "posts/5f0c5e1b8f0d2a0001a1b2c4/") == (
+    "PUT posts/{id}"
+  )
+  assert endpoint("GET", base + "posts/slug/hello-world/") == (
+    "GET posts/slug/{slug}"
+  )
+  assert endpoint("HEAD", "https://ghost.example.com/content/images/a.jpg") == (
+    "HEAD /content/*"
+  )
+
+
+def test_latency_histogram_and_quantiles():
+  metrics = Metrics(buckets = (0.1, 1, float("inf")))
+
+  for elapsed in [0.05] * 90 + [0.5] * 9 + [2]:
+    metrics.record(event(elapsed))
+
+  latency = metrics.stats()["GET posts"]["latency"]
+
+  assert latency["histogram"] == [(0.1, 90), (1, 9), (float("inf"), 1)]
+  assert (latency["p50"], latency["p95"], latency["p99"]) == (0.1, 1, 1)
+  assert (latency["min"], latency["max"]) == (0.05, 2)
+  assert latency["mean"] == pytest.approx((4.5 + 4.5 + 2) / 100)
+
+
+def test_requests_are_recorded_per_endpoint(gh, server):
+  server.seed("posts", 1)
+  post = next(iter(server.store.resources["posts"].values()))
+
+  gh.get_post()
+  gh.get_post(post["id"])
+  gh.get_post(post["slug"], "slug")
+  gh.create_post({"title": "New"})
+
+  stats = gh.stats()
+
+  assert sorted(stats) == [
+    "GET posts",
+    "GET posts/slug/{slug}",
+    "GET posts/{id}",
+    "POST posts"
+  ]
+  assert stats["POST posts"]["statuses"] == {201: 1}
+  assert stats["POST posts"]["bytes_sent"] > 0
+  assert all(s["requests"] == 1 for s in stats.values())
+  assert all(s["bytes_received"] > 0 for s in stats.values())
+
+
+def test_snapshots_do_not_change(gh, server):
+  server.seed("posts", 1)
+  gh.get_post()
+
+  snapshot = gh.stats()
+  gh.get_post()
+
+  assert snapshot["GET posts"]["requests"] == 1
+  assert gh.stats()["GET posts"]["requests"] == 2
+
+  gh.metrics.reset()
+  assert gh.stats() == {}
+
+
+def test_retries_and_errors_are_counted(client, server):
+  gh = client(retry = RetryPolicy(max_retries = 2, backoff_factor = 0))
+  server.seed("posts", 1)
+  server.error_rate = 1
+
+  with pytest.raises(Exception):
+    gh.get_post()
+
+  stats = gh.stats()["GET posts"]
+  assert (stats["requests"], stats["retries"]) == (3, 2)
+  assert stats["statuses"] == {503: 3}
+
+  # a request that never reached a server
+  unreachable = Ghost(
+    "http://127.0.0.1:9",
+    "v3",
+    CLIENT_ID,
+    CLIENT_SECRET,
+    retry = False
+  )
+  with pytest.raises(requests.ConnectionError):
+    unreachable.get_post()
+
+  stats = unreachable.stats()["GET posts"]
+  assert (stats["errors"], stats["statuses"]) == (1, {})
+  unreachable.close()
+
+
+def test_metrics_can_be_disabled(client):
+  gh = client(metrics = False)
+
+  with pytest.raises(AppyException):
+    gh.stats()
@@ -0,0 +1,149 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from markdown.extensions.toc import TocExtension
+
+from appyrition.render import Renderer
+
+
+def test_converter_is_reused_and_reset():
+  renderer = Renderer(extensions = ["toc"])
+  md = renderer._converter()
+
+  # a converter left dirty would number the second heading `title_1`
+  assert renderer.render("# Title\n\nOne") == (
+    '<h1 id="title">Title</h1>\n<p>One</p>'
+  )
+  assert renderer.render("# Title\n\nTwo") == (
+    '<h1 id="title">Title</h1>\n<p>Two</p>'
+  )
+  assert renderer._converter() is md
+
+  # every thread gets its own
+  other = []
+  thread = threading.Thread(target = lambda: other.append(renderer._converter()))
+  thread.start()
+  thread.join()
+  assert other[0] is not md
+
+
+def test_unchanged_sources_are_rendered_once():
+  renderer = Renderer()
+
+  assert renderer.render("Some *text*") == "<p>Some <em>text</em></p>"
+  assert renderer.render("Some *text*") == "<p>Some <em>text</em></p>"
+  assert renderer.render("Other") == "<p>Other</p>"
+  assert renderer.render("Some *text*") == "<p>Some <em>text</em></p>"
+
+  assert (renderer.hits, renderer.misses) == (2, 2)
+
+
+def test_extensions_are_part_of_the_key():
+  plain = Renderer()
+  tables = Renderer(extensions = ["tables"])
+  text = "a | b\n--- | ---\n1 | 2"
+
+  assert plain._key(text) != tables._key(text)
+  assert "<table>" in tables.render(text)
+  assert "<table>" not in plain.render(text)
+
+
+def test_extension_configuration_is_part_of_the_key(tmp_path):
+  # both renderers share a disk cache, so equal keys would serve the HTML of
+  # the first to the second
+  cache_dir = str(tmp_path / "html")
+  first = Renderer([TocExtension(baselevel = 1)], cache_dir = cache_dir)
+  second = Renderer([TocExtension(baselevel = 2)], cache_dir = cache_dir)
+
+  assert first.render("# Title").startswith("<h1")
+  assert second.render("# Title").startswith("<h2")
+
+  # the same configuration in another renderer, or another process, shares
+  # the key
+  same = Renderer([TocExtension(baselevel = 1)], cache_dir = cache_dir)
+  assert same._key("# Title") == first._key("# Title")
+
+
+def test_counters_are_exact_under_concurrency():
+  renderer = Renderer()
+  renderer.render("Some *text*")
+
+  with ThreadPoolExecutor(max_workers = 8) as executor:
+    list(executor.map(lambda i: renderer.render("Some *text*"), range(800)))
+
+  assert (renderer.hits, renderer.misses) == (800, 1)
+
+
+def test_least_recently_used_entries_are_evicted():
+  renderer = Renderer(max_entries = 2)
+
+  renderer.render("one")
+  renderer.render("two")
+  renderer.render("one")
+  renderer.render("three")
+
+  assert len(renderer) == 2
+  renderer.render("one")
+  assert renderer.hits == 2
+  renderer.render("two")
+  assert renderer.misses == 4
+
+
+def test_disk_cache_outlives_the_renderer(tmp_path):
+  cache_dir = str(tmp_path / "html")
+  Renderer(cache_dir = cache_dir).render("Some *text*")
+
+  renderer = Renderer(cache_dir = cache_dir)
+  assert renderer.render("Some *text*") == "<p>Some <em>text</em></p>"
+  assert (renderer.hits, renderer.misses) == (1, 0)
+
+  # a cleared renderer falls back to disk
+  renderer.clear()
+  renderer.render("Some *text*")
+  assert (renderer.hits, renderer.misses) == (2, 0)
+
+
+def test_deploys_render_through_the_client(gh, tmp_path, write_post):
+  for name in ("first", "second"):
+    resource_dir = write_post(tmp_path, name, "The same *text*")
+    post = gh.deploy_post(resource_dir)["posts"][0]
+    assert post["html"] == "<p>The same <em>text</em></p>"
+
+  assert (gh.renderer.hits, gh.renderer.misses) == (1, 1)
+
+
+def test_misses_are_rendered_on_a_process_pool():
+  renderer = Renderer(extensions = ["tables"], processes = 2)
+  texts = ["Text *{}*".format(i) for i in range(20)]
+
+  try:
+    assert renderer.render("a | b\n--- | ---\n1 | 2").startswith("<table>")
+    assert renderer.render(texts[3]) == "<p>Text <em>3</em></p>"
+
+    # misses are rendered concurrently and returned in input order, with
+    # the cached one in its place
+    assert renderer.render_many(texts) == [
+      "<p>Text <em>{}</em></p>".format(i) for i in range(20)
+    ]
+    assert (renderer.hits, renderer.misses) == (1, 21)
+
+    pool = renderer._pool
+  finally:
+    renderer.close()
+
+  assert renderer._pool is None
+  with pytest.raises(RuntimeError):
+    pool.submit(str, "shut down")
+
+
+def test_deploys_render_on_the_client_pool(client, tmp_path, write_post):
+  gh = client(renderer = Renderer(processes = 2))
+  resource_dir = write_post(tmp_path, "post", "Some *text*")
+
+  post = gh.deploy_post(resource_dir)["posts"][0]
+  assert post["html"] == "<p>Some <em>text</em></p>"
+  assert gh.renderer._pool is not None
+
+  gh.close()
+  assert gh.renderer._pool is None
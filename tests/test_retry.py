@@ -0,0 +1,84 @@
+import random
+from datetime import datetime as date, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from appyrition.error import GhostException
+from appyrition.retry import RetryPolicy
+
+
+def test_backoff_is_full_jitter_up_to_the_cap(monkeypatch):
+  policy = RetryPolicy(backoff_factor = 0.5, max_backoff = 3)
+  bounds = []
+
+  monkeypatch.setattr(
+    random,
+    "uniform",
+    lambda low, high: bounds.append((low, high)) or high
+  )
+
+  waits = [policy.backoff(attempt) for attempt in range(5)]
+
+  assert bounds == [(0, 0.5), (0, 1), (0, 2), (0, 3), (0, 3)]
+  assert waits == [0.5, 1, 2, 3, 3]
+
+
+def test_backoff_stays_within_bounds():
+  random.seed(0)
+  policy = RetryPolicy(backoff_factor = 1, max_backoff = 4)
+
+  for attempt in range(8):
+    cap = min(4, 2 ** attempt)
+    assert all(0 <= policy.backoff(attempt) <= cap for i in range(100))
+
+
+def test_retry_after_in_seconds_is_honoured_up_to_its_limit():
+  policy = RetryPolicy(max_retry_after = 60)
+
+  assert policy.backoff(0, {"Retry-After": "7"}) == 7
+  assert policy.backoff(5, {"Retry-After": "0.25"}) == 0.25
+  assert policy.backoff(0, {"Retry-After": "600"}) == 60
+
+
+def test_retry_after_as_an_http_date():
+  policy = RetryPolicy(max_backoff = 0)
+  later = date.now(timezone.utc) + timedelta(seconds = 30)
+  earlier = date.now(timezone.utc) - timedelta(seconds = 30)
+
+  assert 28 < policy.backoff(0, {"Retry-After": format_datetime(later)}) <= 30
+  assert policy.backoff(0, {"Retry-After": format_datetime(earlier)}) == 0
+
+  # an invalid header falls back to the computed backoff
+  assert policy.backoff(0, {"Retry-After": "soon"}) == 0
+
+
+def test_which_requests_are_retried():
+  policy = RetryPolicy()
+
+  for method in ("GET", "PUT", "DELETE"):
+    assert policy.is_retryable(method, None, 503)
+    assert policy.is_retryable(method, None, sent = True)
+    assert not policy.is_retryable(method, None, 404)
+
+  # a POST is only retried when the server cannot have acted on it
+  assert policy.is_retryable("POST", None, 429)
+  assert policy.is_retryable("POST", None, sent = False)
+  assert not policy.is_retryable("POST", None, 503)
+  assert not policy.is_retryable("POST", None, sent = True)
+
+  assert policy.is_retryable("POST", True, 503)
+  assert not policy.is_retryable("GET", False, 503)
+
+
+def test_transport_retries_reads_but_not_creates(client, server):
+  gh = client(retry = RetryPolicy(max_retries = 2, backoff_factor = 0))
+  server.error_rate = 1
+
+  with pytest.raises(GhostException):
+    gh.get_post()
+  assert server.counts["requests"] == 3
+
+  with pytest.raises(GhostException):
+    gh.create_post({"title": "Once"})
+  assert server.counts["requests"] == 4
@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+def test_connections_are_reused(gh, server):
+  server.seed("posts", 1)
+
+  for i in range(20):
+    gh.get_post()
+
+  assert server.counts["connections"] == 1
+
+
+def test_connections_are_closed_without_keep_alive(client, server):
+  gh = client(keep_alive = False)
+  server.seed("posts", 1)
+  connections = server.counts["connections"]
+
+  for i in range(5):
+    gh.get_post()
+
+  assert server.counts["connections"] - connections == 5
+
+
+def test_pool_size_bounds_concurrent_connections(client, server):
+  gh = client(pool_size = 2)
+  server.seed("posts", 1)
+  server.latency = 0.01
+  requests = server.counts["requests"]
+
+  with ThreadPoolExecutor(max_workers = 8) as executor:
+    list(executor.map(lambda i: gh.get_post(), range(40)))
+
+  assert server.counts["requests"] - requests == 40
+  assert server.counts["connections"] <= 2
+
+
+def test_hooks_see_and_change_every_request(gh, server):
+  server.seed("posts", 1)
+  post = next(iter(server.store.resources["posts"].values()))
+  events = []
+
+  def before(method, url, kwargs):
+    kwargs.setdefault("params", {})["fields"] = "id,title"
+
+  gh.add_hook(before = before, after = events.append)
+
+  response = gh.get_post(post["id"])
+  assert set(response["posts"][0]) == {"id", "title"}
+
+  gh.transport.before_request.remove(before)
+  gh.update_post({"title": "Renamed"}, post["id"])
+
+  assert [(e["method"], e["endpoint"], e["status"]) for e in events] == [
+    ("GET", "GET posts/{id}", 200),
+    ("GET", "GET posts/{id}", 200),
+    ("PUT", "PUT posts/{id}", 200)
+  ]
+  assert all(e["error"] is None and e["attempt"] == 0 for e in events)
+  assert events[-1]["bytes_sent"] > 0 and events[-1]["bytes_received"] > 0
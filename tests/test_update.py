@@ -0,0 +1,131 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def sent(gh, spy):
+  # (method, endpoint, body) of every request the client sends
+  requests = []
+
+  def record(method, url, kwargs):
+    body = kwargs.get("json")
+    requests.append((
+      method,
+      url.split("/admin/")[-1],
+      list(body.values())[0][0] if body else None
+    ))
+
+  spy(gh, before = record)
+  return requests
+
+
+@pytest.fixture
+def post(gh):
+  return gh.create_post({
+    "title": "Title",
+    "custom_excerpt": "Excerpt",
+    "html": "<p>Text</p>"
+  })["posts"][0]
+
+
+def test_known_updated_at_updates_in_one_request(gh, post, sent):
+  response = gh.update_post(
+    {"title": "New"},
+    post["id"],
+    updated_at = post["updated_at"]
+  )
+
+  assert [(m, e) for m, e, b in sent] == [("PUT", "posts/" + post["id"] + "/")]
+  assert response["posts"][0]["title"] == "New"
+
+
+def test_conflict_falls_back_to_fetch_merge_and_retry(gh, server, post, sent):
+  server.store.update("posts", post["id"], {
+    "custom_excerpt": "Changed elsewhere",
+    "updated_at": post["updated_at"]
+  })
+
+  response = gh.update_post(
+    {"title": "New"},
+    post["id"],
+    updated_at = post["updated_at"]
+  )
+
+  assert [m for m, e, b in sent] == ["PUT", "GET", "PUT"]
+  assert response["posts"][0]["title"] == "New"
+  assert response["posts"][0]["custom_excerpt"] == "Changed elsewhere"
+
+
+def test_pages_update_in_one_request(gh, sent):
+  page = gh.create_page({"title": "Page"})["pages"][0]
+
+  response = gh.update_page(
+    {"title": "New"},
+    page["id"],
+    updated_at = page["updated_at"]
+  )
+
+  assert [m for m, e, b in sent] == ["POST", "PUT"]
+  assert response["pages"][0]["title"] == "New"
+
+
+def test_diff_sends_only_changed_fields(gh, post, sent):
+  response = gh.update_post(
+    {"title": "New", "custom_excerpt": "Excerpt", "html": "<p>Text</p>"},
+    post["id"],
+    diff = True
+  )
+
+  assert [m for m, e, b in sent] == ["GET", "PUT"]
+  assert set(sent[1][2]) == {"id", "updated_at", "title"}
+  assert response["posts"][0]["title"] == "New"
+
+
+def test_diff_without_changes_sends_no_update(gh, post, sent):
+  response = gh.update_post(
+    {"title": "Title", "html": "<p>Text</p>"},
+    post["id"],
+    diff = True
+  )
+
+  assert [m for m, e, b in sent] == ["GET"]
+  assert response["posts"][0]["updated_at"] == post["updated_at"]
+
+
+def test_deploy_diffs_against_the_deploy_record(
+  gh,
+  server,
+  write_post,
+  tmp_path,
+  sent
+):
+  resource_dir = write_post(tmp_path, "post", "Text", {"title": "Title"})
+  gh.deploy_post(resource_dir)
+
+  config_file = tmp_path / "post" / "post.config"
+  config = json.loads(config_file.read_text())
+  config["title"] = "New"
+  config_file.write_text(json.dumps(config))
+
+  del sent[:]
+  gh.deploy_post(resource_dir, update = True, diff = True)
+
+  assert [m for m, e, b in sent] == ["PUT"]
+  assert set(sent[0][2]) == {"id", "updated_at", "title"}
+
+  # a change made on the site in the meantime ends in a conflict, a fetch
+  # and a diff against the fetched post
+  server.store.update("posts", config["id"], {
+    "title": "Changed elsewhere",
+    "updated_at": server.store.get("posts", config["id"])["updated_at"]
+  })
+  config["title"] = "Newer"
+  config_file.write_text(json.dumps(config))
+
+  del sent[:]
+  response = gh.deploy_post(resource_dir, update = True, diff = True)
+
+  assert [m for m, e, b in sent] == ["PUT", "GET", "PUT"]
+  assert set(sent[2][2]) == {"id", "updated_at", "title"}
+  assert response["posts"][0]["title"] == "Newer"
@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+
+from appyrition.error import GhostException
+
+
+IMAGES = {"image{:02}.png".format(i): b"image %d" % i for i in range(12)}
+
+TEXT = "\n".join("![{0}](images/{0})".format(image) for image in IMAGES)
+
+
+@pytest.fixture
+def uploads(gh, spy):
+  # ref sent with every upload, the url it got back and the most uploads
+  # seen in flight at once
+  state = {"urls": {}, "in_flight": 0, "most": 0}
+  lock = threading.Lock()
+
+  def before(method, url, kwargs):
+    if url.endswith("/images/upload/"):
+      with lock:
+        state["in_flight"] += 1
+        state["most"] = max(state["most"], state["in_flight"])
+
+  def after(event):
+    if event["url"].endswith("/images/upload/"):
+      with lock:
+        state["in_flight"] -= 1
+        if event["status"] == 201:
+          image = event["response"].json()["images"][0]
+          state["urls"][image["ref"]] = image["url"]
+
+  spy(gh, before = before, after = after)
+  return state
+
+
+def test_images_upload_concurrently_on_a_bounded_pool(
+  gh,
+  server,
+  uploads,
+  tmp_path,
+  write_post
+):
+  server.latency = 0.05
+  config = {"title": "Gallery", "feature_image": "images/image03.png"}
+  resource_dir = write_post(tmp_path, "gallery", TEXT, config, IMAGES)
+
+  response = gh.deploy_post(resource_dir, image_workers = 4)
+
+  assert server.store.images == len(IMAGES)
+  assert 1 < uploads["most"] <= 4
+
+  # every reference gets the url of its own image, whatever order the
+  # uploads finished in
+  post = response["posts"][0]
+  for image in IMAGES:
+    url = uploads["urls"]["images/gallery/" + image]
+    assert '<img alt="{}" src="{}"'.format(image, url) in post["html"]
+  assert post["feature_image"] == uploads["urls"]["images/gallery/image03.png"]
+
+
+def test_a_failed_upload_cancels_the_rest(
+  gh,
+  server,
+  uploads,
+  tmp_path,
+  write_post
+):
+  server.latency = 0.05
+  server.error_rate = 1
+  resource_dir = write_post(tmp_path, "gallery", TEXT, None, IMAGES)
+
+  with pytest.raises(GhostException):
+    gh.deploy_post(resource_dir, image_workers = 2)
+
+  # only the uploads already running when the first one failed, or picked up
+  # by a worker before the queue was cancelled, were sent
+  assert server.counts["requests"] <= 4
+  assert uploads["in_flight"] == 0
+  assert server.store.resources["posts"] == {}
@@ -0,0 +1,76 @@
+import time
+from os import path
+
+from appyrition.watch import Watcher
+
+
+def test_a_burst_of_saves_deploys_once(gh, server, write_post, tmp_path):
+  watcher = Watcher(gh, str(tmp_path), debounce = 0.2)
+  assert watcher.poll() == []
+
+  resource_dir = write_post(tmp_path, "first", "One")
+  assert watcher.poll() == []
+
+  with open(path.join(resource_dir, "first.md"), "a") as m:
+    m.write(" and two")
+  assert watcher.poll() == []
+
+  time.sleep(0.25)
+  results = watcher.poll()
+  assert [r["ok"] for r in results] == [True]
+
+  posts = server.store.resources["posts"]
+  assert len(posts) == 1
+  assert list(posts.values())[0]["html"] == "<p>One and two</p>"
+
+  # the write-back of the id is not another change
+  time.sleep(0.25)
+  assert watcher.poll() == []
+
+
+def test_an_edit_during_a_deploy_is_kept_and_deployed(
+  gh,
+  server,
+  write_post,
+  tmp_path
+):
+  watcher = Watcher(gh, str(tmp_path), debounce = 0)
+  watcher.poll()
+
+  resource_dir = write_post(tmp_path, "first", "Before")
+  md_file = path.join(resource_dir, "first.md")
+
+  def edit(method, url, kwargs):
+    if method == "POST" and url.endswith("/posts/"):
+      with open(md_file, "w") as m:
+        m.write("Edited during the deploy")
+
+  gh.add_hook(before = edit)
+
+  assert [r["ok"] for r in watcher.poll()] == [True]
+  gh.transport.before_request.remove(edit)
+
+  with open(md_file) as m:
+    assert m.read() == "Edited during the deploy"
+
+  results = watcher.poll()
+  assert [r["ok"] and not r["skipped"] for r in results] == [True]
+
+  posts = list(server.store.resources["posts"].values())
+  assert len(posts) == 1
+  assert posts[0]["html"] == "<p>Edited during the deploy</p>"
+
+  assert watcher.poll() == []
+
+
+def test_no_image_manifest_is_written_into_the_root(
+  gh,
+  write_post,
+  tmp_path
+):
+  watcher = Watcher(gh, str(tmp_path), debounce = 0)
+  watcher.poll()
+  write_post(tmp_path, "first", "![A](images/a.png)", images = {"a.png": b"a"})
+
+  assert [r["ok"] for r in watcher.poll()] == [True]
+  assert not (tmp_path / "images.manifest.json").exists()
@@ -0,0 +1,125 @@
+import hmac
+import json
+import time
+import hashlib
+
+import pytest
+
+from appyrition import Ghost
+from appyrition.cache import ResponseCache
+from appyrition.error import AppyException, GhostException
+from appyrition.webhook import WebhookReceiver
+
+
+def ghost(tmp_path):
+  return Ghost(
+    "https://ghost.example.com",
+    "v3",
+    "5f0c5e1b8f0d2a0001a1b2c3",
+    "0123456789abcdef" * 4,
+    catalog = str(tmp_path / "catalog.db")
+  )
+
+
+def post(slug, updated_at):
+  return {
+    "id": "5f0c5e1b8f0d2a0001a1b2c4",
+    "slug": slug,
+    "status": "published",
+    "updated_at": updated_at
+  }
+
+
+def payload(current, previous):
+  return json.dumps({"post": {"current": current, "previous": previous}})
+
+
+def test_events_patch_the_catalog(tmp_path):
+  gh = ghost(tmp_path)
+  receiver = WebhookReceiver(gh)
+
+  first = post("first", "2020-01-01T00:00:00.000Z")
+  assert receiver.handle(payload(first, {}))["action"] == "added"
+
+  renamed = post("renamed", "2020-01-02T00:00:00.000Z")
+  event = receiver.handle(payload(renamed, {"slug": "first"}))
+  assert event["action"] == "edited"
+  assert event["previous_slug"] == "first"
+  assert gh.catalog.get("posts", "renamed", "slug")["id"] == first["id"]
+  assert gh.catalog.get("posts", "first", "slug") is None
+
+  # a delivery older than the catalog entry is ignored
+  event = receiver.handle(payload(first, {"slug": "renamed"}))
+  assert event["stale"]
+  assert gh.catalog.get("posts", first["id"])["slug"] == "renamed"
+
+  assert receiver.handle(payload({}, renamed))["action"] == "deleted"
+  assert gh.catalog.get("posts", first["id"]) is None
+
+
+def test_signature_is_verified(tmp_path):
+  receiver = WebhookReceiver(ghost(tmp_path), secret = "secret")
+  body = payload(post("first", "2020-01-01T00:00:00.000Z"), {}).encode("utf8")
+
+  timestamp = str(int(time.time() * 1000))
+  signature = hmac.new(
+    b"secret",
+    body + timestamp.encode("utf8"),
+    hashlib.sha256
+  ).hexdigest()
+  headers = {"X-Ghost-Signature": "sha256={}, t={}".format(signature, timestamp)}
+
+  assert receiver.handle(body, headers)["action"] == "added"
+
+  with pytest.raises(AppyException):
+    receiver.handle(body)
+  with pytest.raises(AppyException):
+    receiver.handle(body + b" ", headers)
+
+  assert receiver.counts["rejected"] == 2
+
+
+def test_webhooks_from_the_server_keep_a_client_current(server, client, tmp_path):
+  reader = client(
+    cache = ResponseCache(max_age = 60),
+    catalog = str(tmp_path / "catalog.db")
+  )
+  writer = client()
+
+  receiver = reader.receive_webhooks(secret = "secret")
+  server.add_webhook(receiver.url, "secret")
+
+  try:
+    post_id = writer.create_post({"title": "First"})["posts"][0]["id"]
+    server.wait_for_webhooks()
+    assert reader.catalog.get("posts", "first", "slug")["id"] == post_id
+
+    # cached by id and by slug, then renamed through the other client
+    assert reader.get_post(post_id)["posts"][0]["title"] == "First"
+    assert reader.get_post("first", "slug")["posts"][0]["id"] == post_id
+    writer.update_post({"title": "Renamed", "slug": "renamed"}, post_id)
+    server.wait_for_webhooks()
+
+    assert reader.get_post(post_id)["posts"][0]["title"] == "Renamed"
+    with pytest.raises(GhostException):
+      reader.get_post("first", "slug")
+    assert reader.catalog.get("posts", "renamed", "slug")["id"] == post_id
+    assert reader.catalog.get("posts", "first", "slug") is None
+
+    writer.delete_post(post_id)
+    server.wait_for_webhooks()
+
+    with pytest.raises(GhostException):
+      reader.get_post(post_id)
+    assert reader.catalog.get("posts", post_id) is None
+  finally:
+    receiver.stop()
+
+  assert server.counts["webhooks"] == 3
+  assert server.counts["webhook_errors"] == 0
+  assert receiver.counts == {
+    "added": 1,
+    "edited": 1,
+    "deleted": 1,
+    "rejected": 0
+  }